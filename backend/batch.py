@@ -0,0 +1,91 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+
+from counters import record_created
+from idempotency import submit_once
+from notifications import enqueue_notifications
+from validators import format_error_message
+from metrics import timed
+
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '500'))
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    inserted: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+def validation_message(error: ValidationError) -> str:
+    message = format_error_message(error.errors())
+    if message:
+        return message
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+async def create_batch(db, collection: str, service: str, items: List[Dict[str, Any]],
+                       create_model: Type[BaseModel], build: Callable[[BaseModel], BaseModel]) -> BatchResult:
+    # Same validation as the single-item route, one insert_many for the valid items
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {MAX_BATCH_SIZE} items")
+
+    results: List[BatchItemResult] = []
+    docs: List[dict] = []
+    doc_results: List[BatchItemResult] = []
+    for index, item in enumerate(items):
+        try:
+            with timed("batch_validation"):
+                obj = build(create_model(**item))
+        except ValidationError as e:
+            results.append(BatchItemResult(index=index, success=False, error=validation_message(e)))
+            continue
+        except HTTPException as e:
+            results.append(BatchItemResult(index=index, success=False, error=str(e.detail)))
+            continue
+        except TypeError:
+            results.append(BatchItemResult(index=index, success=False, error="Item must be a JSON object"))
+            continue
+        result = BatchItemResult(index=index, success=True, id=obj.id)
+        results.append(result)
+        docs.append(obj.dict())
+        doc_results.append(result)
+
+    inserted = docs
+    if docs:
+        try:
+            await db[collection].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = set()
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                doc_results[write_error["index"]].success = False
+                doc_results[write_error["index"]].id = None
+                doc_results[write_error["index"]].error = write_error.get("errmsg", "Write failed")
+            inserted = [doc for i, doc in enumerate(docs) if i not in failed]
+        await record_created(db, service, inserted)
+        await enqueue_notifications(db, service, inserted)
+
+    return BatchResult(inserted=len(inserted), failed=len(items) - len(inserted), results=results)
+
+
+async def create_batch_once(db, collection: str, service: str, items: List[Dict[str, Any]],
+                            create_model: Type[BaseModel], build: Callable[[BaseModel], BaseModel],
+                            idempotency_key: Optional[str] = None) -> Tuple[dict, bool]:
+    # A re-sent batch (flaky tablet sync) with the same Idempotency-Key replays the first result
+    async def create():
+        return (await create_batch(db, collection, service, items, create_model, build)).dict()
+
+    return await submit_once(db, f"{service}:batch", {"items": items}, create, idempotency_key)
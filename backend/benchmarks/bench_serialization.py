@@ -0,0 +1,82 @@
+"""Per-document cost of list responses: Pydantic round-trip vs direct orjson.
+
+The "before" path is what list routes used to do: build a model per document,
+then let FastAPI validate and serialize the list through response_model.
+
+Run from backend/:  python benchmarks/bench_serialization.py [documents]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+import orjson  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from pagination import encode_documents  # noqa: E402
+from server import IMSSSemanasRequest  # noqa: E402
+
+
+def make_documents(count: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [{
+        "id": str(uuid.uuid4()),
+        "nss": "12345678901",
+        "curp": "HEGG560427MVZRRL04",
+        "user_name": "Gloria Hernández García",
+        "birth_date": "27/04/1956",
+        "phone": "5555551234",
+        "status": "pending",
+        "timestamp": start + timedelta(seconds=i, microseconds=123000),
+    } for i in range(count)]
+
+
+async def pydantic_path(field, docs: List[dict]) -> bytes:
+    models = [IMSSSemanasRequest(**doc) for doc in docs]
+    content = await serialize_response(field=field, response_content=models, is_coroutine=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_path(docs: List[dict]) -> bytes:
+    return orjson.dumps(encode_documents(IMSSSemanasRequest, docs))
+
+
+def measure(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    docs = make_documents(count)
+    field = create_response_field(name="response", type_=List[IMSSSemanasRequest])
+    loop = asyncio.new_event_loop()
+
+    before_bytes = loop.run_until_complete(pydantic_path(field, docs))
+    after_bytes = orjson_path(docs)
+    assert json.loads(before_bytes) == json.loads(after_bytes), "outputs differ"
+
+    before = measure(lambda: loop.run_until_complete(pydantic_path(field, docs)))
+    after = measure(lambda: orjson_path(docs))
+    print(f"documents: {count}")
+    print(f"pydantic round-trip   {before / count * 1e6:8.2f} µs/doc")
+    print(f"orjson direct         {after / count * 1e6:8.2f} µs/doc")
+    print(f"speed-up              {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
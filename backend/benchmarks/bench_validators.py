@@ -0,0 +1,70 @@
+"""Micro-benchmark: inline re.match literals vs the shared compiled validators.
+
+Run from backend/:  python benchmarks/bench_validators.py [iterations]
+"""
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import BaseModel  # noqa: E402
+
+from validators import CURP, NSS, BirthDate, validate_birth_date, validate_curp, validate_nss  # noqa: E402
+
+PAYLOAD = {
+    "nss": "12345678901",
+    "curp": "hegg560427mvzrrl04",
+    "user_name": "Gloria Hernández",
+    "birth_date": "27/04/1956",
+    "phone": "5555551234",
+}
+
+
+class InlineCreate(BaseModel):
+    nss: str
+    curp: str
+    user_name: str
+    birth_date: str
+    phone: str
+
+
+class ValidatedCreate(BaseModel):
+    nss: NSS
+    curp: CURP
+    user_name: str
+    birth_date: BirthDate
+    phone: str
+
+
+def inline_checks():
+    # What create_imss_semanas_request used to do per request
+    request = InlineCreate(**PAYLOAD)
+    re.match(r'^\d{11}$', request.nss)
+    re.match(r'^[A-Z]{4}[0-9]{6}[HM][A-Z]{5}[0-9A-Z][0-9]$', request.curp.upper())
+    re.match(r'^\d{2}/\d{2}/\d{4}$', request.birth_date)
+    return request
+
+
+def compiled_checks():
+    validate_nss(PAYLOAD["nss"])
+    validate_curp(PAYLOAD["curp"])
+    validate_birth_date(PAYLOAD["birth_date"])
+
+
+def model_validation():
+    return ValidatedCreate(**PAYLOAD)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for name, func in [("inline re.match + model", inline_checks),
+                       ("compiled validators only", compiled_checks),
+                       ("model with field validators", model_validation)]:
+        seconds = min(timeit.repeat(func, number=iterations, repeat=3))
+        print(f"{name:30s} {seconds / iterations * 1e6:8.2f} µs/op")
+
+
+if __name__ == "__main__":
+    main()
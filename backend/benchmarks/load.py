@@ -0,0 +1,255 @@
+"""Latency and throughput benchmark for every API route.
+
+Boots server.app in-process (no network) against mongomock-motor, or a local
+mongod with --mongo-url, and drives each route with realistic payloads.
+
+Run from backend/:
+    python benchmarks/load.py run --requests 500 --concurrency 20 --output bench.json
+    python benchmarks/load.py compare baseline.json bench.json --threshold 0.15
+"""
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+cli = typer.Typer(help="Benchmark the HUMANIDAD UNIDA API in-process")
+
+SAMPLE_CFDI = """<?xml version="1.0" encoding="UTF-8"?>
+<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital"
+ Version="4.0" Fecha="2024-03-01T10:00:00" Sello="U0VMTE8=" NoCertificado="00001000000500000001" Total="1160.00" Moneda="MXN">
+<cfdi:Emisor Rfc="AAA010101AAA" Nombre="Ferretería del Centro"/>
+<cfdi:Receptor Rfc="XAXX010101000" Nombre="Público en general"/>
+<cfdi:Conceptos><cfdi:Concepto Cantidad="1" Descripcion="Material" Importe="1000.00"/></cfdi:Conceptos>
+<cfdi:Complemento><tfd:TimbreFiscalDigital Version="1.1" UUID="{uuid}" FechaTimbrado="2024-03-01T10:01:00"
+ SelloCFD="U0VMTE8=" NoCertificadoSAT="00001000000504465028" SelloSAT="U0FU"/></cfdi:Complemento>
+</cfdi:Comprobante>"""
+
+
+def random_curp() -> str:
+    from validators import curp_check_digit
+    letters = "".join(random.choices(string.ascii_uppercase, k=4))
+    birth = f"{random.randint(40, 99):02d}{random.randint(1, 12):02d}{random.randint(1, 28):02d}"
+    rest = random.choice("HM") + "DF" + "".join(random.choices(string.ascii_uppercase, k=3)) + "0"
+    partial = letters + birth + rest
+    return partial + str(curp_check_digit(partial))
+
+
+def phone() -> str:
+    return "55" + "".join(random.choices(string.digits, k=8))
+
+
+def cfe_payload():
+    return {"service_number": "".join(random.choices(string.digits, k=12)), "user_name": "María González",
+            "phone": phone(), "is_first_time": random.random() < 0.5}
+
+
+def imss_payload():
+    return {"nss": "".join(random.choices(string.digits, k=11)), "curp": random_curp(),
+            "user_name": "José Hernández", "birth_date": "15/06/1955", "phone": phone()}
+
+
+def email_payload():
+    return {"email_to_recover": f"usuario{random.randint(1, 10**6)}@gmail.com", "user_name": "Rosa Martínez",
+            "birth_date": "02/11/1948", "phone": phone(), "curp": random_curp(), "email_provider": "Gmail",
+            "additional_info": "Recuerdo que la abrí en 2010"}
+
+
+def scenarios() -> Dict[str, tuple]:
+    # name -> (method, path, payload factory or None)
+    return {
+        "GET /api/": ("GET", "/api/", None),
+        "POST /api/status": ("POST", "/api/status", lambda: {"client_name": "bench"}),
+        "GET /api/status": ("GET", "/api/status", None),
+        "POST /api/cfe/request": ("POST", "/api/cfe/request", cfe_payload),
+        "POST /api/cfe/requests:batch": ("POST", "/api/cfe/requests:batch", lambda: [cfe_payload() for _ in range(50)]),
+        "GET /api/cfe/requests": ("GET", "/api/cfe/requests", None),
+        "POST /api/certificates/request": ("POST", "/api/certificates/request", lambda: {
+            "user_name": "Ana López", "phone": phone(), "certificate_type": random.choice(["SEP", "INEA", "CDMX", "Puebla"])}),
+        "GET /api/certificates/requests": ("GET", "/api/certificates/requests", None),
+        "GET /api/certificates/links": ("GET", "/api/certificates/links", None),
+        "POST /api/fiscal/request": ("POST", "/api/fiscal/request", lambda: {
+            "curp": random_curp(), "user_name": "Luis Pérez", "phone": phone()}),
+        "GET /api/fiscal/requests": ("GET", "/api/fiscal/requests", None),
+        "GET /api/fiscal/sat-guide": ("GET", "/api/fiscal/sat-guide", None),
+        "POST /api/cfdi/verify": ("POST", "/api/cfdi/verify", lambda: {
+            "xml_content": SAMPLE_CFDI.format(uuid=random.choice(["A", "B", "C"]) + "-0000-4000-8000-000000000000")}),
+        "GET /api/cfdi/fraud-guide": ("GET", "/api/cfdi/fraud-guide", None),
+        "POST /api/tramites/download": ("POST", "/api/tramites/download", lambda: {
+            "document_type": random.choice(["CURP", "NSS", "ACTA", "AFORE", "SEMANAS"])}),
+        "GET /api/tramites/documents": ("GET", "/api/tramites/documents", None),
+        "POST /api/contact/message": ("POST", "/api/contact/message", lambda: {
+            "name": "Carmen Ruiz", "email": "carmen@example.com", "phone": phone(), "message": "Necesito ayuda"}),
+        "GET /api/contact/info": ("GET", "/api/contact/info", None),
+        "POST /api/imss/semanas/request": ("POST", "/api/imss/semanas/request", imss_payload),
+        "GET /api/imss/semanas/guide": ("GET", "/api/imss/semanas/guide", None),
+        "GET /api/imss/semanas/requests": ("GET", "/api/imss/semanas/requests", None),
+        "POST /api/email/recovery/request": ("POST", "/api/email/recovery/request", email_payload),
+        "GET /api/email/recovery/guide": ("GET", "/api/email/recovery/guide", None),
+        "GET /api/email/recovery/requests": ("GET", "/api/email/recovery/requests", None),
+        "GET /api/analytics/dashboard": ("GET", "/api/analytics/dashboard", None),
+    }
+
+
+def load_app(mongo_url: Optional[str]):
+    os.environ.setdefault("DB_NAME", f"bench_{int(time.time())}")
+    # Every simulated user shares one client address; per-IP limits would cap the benchmark itself
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    if mongo_url:
+        os.environ["MONGO_URL"] = mongo_url
+    else:
+        # Swap the driver for mongomock-motor before the lifespan builds its client
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("ENSURE_INDEXES", "false")
+    import server
+    return server
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def drive(client, method: str, path: str, payload: Optional[Callable], requests: int,
+                concurrency: int, trace_alloc: bool) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            body = payload() if payload else None
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    if trace_alloc:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+    if trace_alloc:
+        _, peak = tracemalloc.get_traced_memory()
+        result["alloc_peak_kib"] = round((peak - baseline) / 1024, 1)
+    return result
+
+
+async def run_benchmark(mongo_url: Optional[str], requests: int, concurrency: int, seed: int,
+                        only: Optional[str], trace_alloc: bool) -> dict:
+    import httpx
+
+    server = load_app(mongo_url)
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Seed so list and dashboard routes have realistic volumes to read
+            for path, factory in [("/api/cfe/requests:batch", cfe_payload),
+                                  ("/api/imss/semanas/requests:batch", imss_payload),
+                                  ("/api/email/recovery/requests:batch", email_payload)]:
+                for start in range(0, seed, 500):
+                    await client.post(path, json=[factory() for _ in range(min(500, seed - start))])
+
+            if trace_alloc:
+                tracemalloc.start()
+            results = {}
+            for name, (method, path, payload) in scenarios().items():
+                if only and only not in name:
+                    continue
+                results[name] = await drive(client, method, path, payload, requests, concurrency, trace_alloc)
+                typer.echo(f"{name:40s} p50={results[name]['p50_ms']:8.2f}ms "
+                           f"p99={results[name]['p99_ms']:8.2f}ms {results[name]['throughput_rps']:8.1f} rps")
+            if trace_alloc:
+                tracemalloc.stop()
+        if mongo_url:
+            await server.resources.client.drop_database(os.environ["DB_NAME"])
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "backend": mongo_url or "mongomock-motor",
+            "requests_per_endpoint": requests,
+            "concurrency": concurrency,
+            "seeded_per_collection": seed,
+            "python": sys.version.split()[0],
+        },
+        "endpoints": results,
+    }
+
+
+@cli.command()
+def run(
+    requests: int = typer.Option(200, help="Requests per endpoint"),
+    concurrency: int = typer.Option(10, help="Concurrent clients per endpoint"),
+    seed: int = typer.Option(1000, help="Documents seeded per request collection"),
+    mongo_url: Optional[str] = typer.Option(None, help="Use a real mongod instead of mongomock-motor"),
+    only: Optional[str] = typer.Option(None, help="Only run endpoints whose name contains this text"),
+    trace_alloc: bool = typer.Option(False, help="Report peak allocations per endpoint (slower)"),
+    output: Optional[Path] = typer.Option(None, help="Write the JSON report here"),
+):
+    """Drive every route and report latency percentiles and throughput."""
+    report = asyncio.run(run_benchmark(mongo_url, requests, concurrency, seed, only, trace_alloc))
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    else:
+        typer.echo(text)
+
+
+@cli.command()
+def compare(
+    baseline: Path,
+    candidate: Path,
+    threshold: float = typer.Option(0.15, help="Allowed relative regression"),
+):
+    """Fail when p95 latency or throughput regressed beyond the threshold."""
+    before = json.loads(baseline.read_text())["endpoints"]
+    after = json.loads(candidate.read_text())["endpoints"]
+    regressions = []
+    for name, new in after.items():
+        old = before.get(name)
+        if not old:
+            continue
+        p95_change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        rps_change = (old["throughput_rps"] - new["throughput_rps"]) / old["throughput_rps"] if old["throughput_rps"] else 0.0
+        flag = "REGRESSION" if p95_change > threshold or rps_change > threshold else "ok"
+        typer.echo(f"{flag:10s} {name:40s} p95 {old['p95_ms']:8.2f} -> {new['p95_ms']:8.2f}ms "
+                   f"({p95_change:+.0%})  rps {old['throughput_rps']:8.1f} -> {new['throughput_rps']:8.1f}")
+        if flag != "ok":
+            regressions.append(name)
+    if regressions:
+        typer.echo(f"{len(regressions)} endpoint(s) regressed more than {threshold:.0%}", err=True)
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
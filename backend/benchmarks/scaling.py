@@ -0,0 +1,184 @@
+"""Throughput scaling from 1 to N uvicorn workers.
+
+One Python worker tops out at a single core: the event loop, pydantic
+validation and JSON encoding all share it. Each worker started from
+server:create_app builds its own Mongo client, caches, write buffers and
+CFDI process pool inside the lifespan, so workers scale horizontally and
+share only MongoDB.
+
+Deploying with N workers (serve.py wraps `uvicorn server:create_app --factory`):
+    python serve.py --host 0.0.0.0 --port 8001 --workers 4 --timeout-graceful-shutdown 30
+
+On SIGTERM the worker marks itself draining: keep-alive requests that
+still arrive get 503 + Retry-After and /api/events long-polls return at
+once. uvicorn stops accepting connections, waits up to
+--timeout-graceful-shutdown seconds for running requests (cancelling the
+rest), and only then runs the lifespan shutdown, which flushes the
+write-behind buffers and closes the client. Each worker opens
+up to MONGO_MAX_POOL_SIZE connections and CFDI_POOL_WORKERS processes, so
+size both per worker: N x pool must fit the server's connection limit and
+N x CFDI processes should not exceed the cores.
+
+Measuring (needs a real mongod; mongomock cannot be shared across processes):
+    python benchmarks/scaling.py --mongo-url mongodb://localhost:27017 --workers 1,2,4 --output scaling.json
+
+Requests are generated by separate client processes so the load generator
+is not the bottleneck. Efficiency is rps(N) / (N * rps(1)); expect it to
+drop once workers outnumber free cores or MongoDB becomes the limit.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from load import cfe_payload, percentile  # noqa: E402
+
+# Mix of cached guides, telemetry writes, submissions and admin list pages
+MIX = [
+    ("GET", "/api/fiscal/sat-guide", None),
+    ("GET", "/api/contact/info", None),
+    ("POST", "/api/status", lambda: {"client_name": "scaling"}),
+    ("POST", "/api/cfe/request", cfe_payload),
+    ("GET", "/api/cfe/requests?limit=50", None),
+    ("GET", "/api/analytics/dashboard", None),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, mongo_url: str, db_name: str) -> subprocess.Popen:
+    # Load generators share one client address, so per-IP limits stay off
+    env = {"RATE_LIMIT_ENABLED": "false", **os.environ, "MONGO_URL": mongo_url, "DB_NAME": db_name}
+    return subprocess.Popen(
+        [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+
+
+def wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+async def generate(base_url: str, duration: float, concurrency: int) -> List[float]:
+    import httpx
+
+    latencies: List[float] = []
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        while time.perf_counter() < deadline:
+            method, path, payload = random.choice(MIX)
+            started = time.perf_counter()
+            response = await client.request(method, path, json=payload() if payload else None)
+            if response.status_code < 400:
+                latencies.append(time.perf_counter() - started)
+            else:
+                latencies.append(-1.0)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    return latencies
+
+
+def client_process(args) -> List[float]:
+    base_url, duration, concurrency = args
+    return asyncio.run(generate(base_url, duration, concurrency))
+
+
+def measure(workers: int, mongo_url: str, duration: float, clients: int, concurrency: int) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    db_name = f"scaling_{workers}_{int(time.time())}"
+    server = start_server(workers, port, mongo_url, db_name)
+    try:
+        wait_ready(base_url)
+        # Warm every worker's pool and caches before measuring
+        client_process((base_url, 2.0, concurrency))
+        with multiprocessing.Pool(clients) as pool:
+            samples = pool.map(client_process, [(base_url, duration, concurrency)] * clients)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+        from pymongo import MongoClient
+        MongoClient(mongo_url).drop_database(db_name)
+
+    latencies = sorted(value for sample in samples for value in sample if value >= 0)
+    errors = sum(1 for sample in samples for value in sample if value < 0)
+    return {
+        "workers": workers,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def main(
+    mongo_url: str = typer.Option(..., help="mongod shared by all workers"),
+    workers: str = typer.Option("1,2,4", help="Comma-separated worker counts to measure"),
+    duration: float = typer.Option(15.0, help="Seconds of load per worker count"),
+    clients: int = typer.Option(0, help="Load generator processes (default: one per core)"),
+    concurrency: int = typer.Option(32, help="Concurrent connections per load generator"),
+    output: Optional[Path] = typer.Option(None, help="Write the JSON report here"),
+):
+    """Measure throughput for each worker count and report scaling efficiency."""
+    clients = clients or (os.cpu_count() or 1)
+    results = []
+    for count in (int(value) for value in workers.split(",")):
+        result = measure(count, mongo_url, duration, clients, concurrency)
+        if results:
+            result["efficiency"] = round(result["throughput_rps"] / (count * results[0]["throughput_rps"] / results[0]["workers"]), 2)
+        else:
+            result["efficiency"] = 1.0
+        results.append(result)
+        typer.echo(f"workers={count:3d} {result['throughput_rps']:9.1f} rps p50={result['p50_ms']:8.2f}ms "
+                   f"p99={result['p99_ms']:8.2f}ms efficiency={result['efficiency']:.2f} errors={result['errors']}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "cpu_count": os.cpu_count(),
+            "load_generators": clients,
+            "concurrency_per_generator": concurrency,
+            "duration_seconds": duration,
+            "python": sys.version.split()[0],
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    else:
+        typer.echo(text)
+
+
+if __name__ == "__main__":
+    typer.run(main)
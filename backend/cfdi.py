@@ -0,0 +1,205 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional
+from xml.etree.ElementTree import ParseError, iterparse
+
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+MAX_CFDI_BYTES = int(os.environ.get('CFDI_MAX_BYTES', str(5 * 1024 * 1024)))
+CFDI_CACHE_SIZE = int(os.environ.get('CFDI_CACHE_SIZE', '4096'))
+
+CFDI_NAMESPACES = {"http://www.sat.gob.mx/cfd/3", "http://www.sat.gob.mx/cfd/4"}
+TFD_NAMESPACE = "http://www.sat.gob.mx/TimbreFiscalDigital"
+
+
+class CFDIError(ValueError):
+    pass
+
+
+def split_tag(tag: str) -> tuple:
+    if tag.startswith("{"):
+        namespace, _, local = tag[1:].partition("}")
+        return namespace, local
+    return "", tag
+
+
+def extract_cfdi_nodes(data: bytes) -> tuple:
+    """Read the attributes of the CFDI nodes without building the full tree.
+
+    Parsing stops as soon as the TimbreFiscalDigital closes, so addenda after
+    the Complemento are never read; every finished element is cleared.
+    """
+    if len(data) > MAX_CFDI_BYTES:
+        raise CFDIError(f"El CFDI excede el tamaño máximo de {MAX_CFDI_BYTES} bytes")
+    # CFDIs never carry a DTD; refusing one rules out entity expansion attacks
+    if b"<!DOCTYPE" in data or b"<!ENTITY" in data:
+        raise CFDIError("El CFDI no puede contener DTD ni entidades")
+
+    # An XML declaration must be the very first thing in the document
+    data = data.lstrip()
+    comprobante = None
+    emisor = {}
+    receptor = {}
+    timbre = None
+    try:
+        for event, elem in iterparse(io.BytesIO(data), events=("start", "end")):
+            namespace, local = split_tag(elem.tag)
+            if event == "start":
+                if namespace in CFDI_NAMESPACES:
+                    if local == "Comprobante" and comprobante is None:
+                        comprobante = dict(elem.attrib)
+                    elif local == "Emisor" and not emisor:
+                        emisor = dict(elem.attrib)
+                    elif local == "Receptor" and not receptor:
+                        receptor = dict(elem.attrib)
+                elif namespace == TFD_NAMESPACE and local == "TimbreFiscalDigital":
+                    timbre = dict(elem.attrib)
+                continue
+            elem.clear()
+            if timbre is not None and local == "TimbreFiscalDigital":
+                break
+    except ParseError as e:
+        raise CFDIError(f"XML inválido: {e}")
+    return comprobante, emisor, receptor, timbre
+
+
+def certificate_number(cert: x509.Certificate) -> str:
+    # SAT serial numbers are the ASCII digits of NoCertificado
+    serial = format(cert.serial_number, "x")
+    return bytes.fromhex(serial.zfill(len(serial) + len(serial) % 2)).decode("ascii", "replace")
+
+
+def check_certificate(comprobante: dict) -> List[str]:
+    """Check the emisor certificate against the comprobante.
+
+    The seal itself is signed over the SAT "cadena original", which needs
+    the SAT XSLT to rebuild, so only the certificate number, its validity at
+    the issue date and the seal length against the key are checked here.
+    """
+    if not comprobante.get("Certificado"):
+        return []
+    try:
+        cert = x509.load_der_x509_certificate(base64.b64decode(comprobante["Certificado"]))
+    except (ValueError, binascii.Error):
+        return ["El certificado del emisor no se puede leer"]
+
+    problems = []
+    if comprobante.get("NoCertificado") and certificate_number(cert) != comprobante["NoCertificado"]:
+        problems.append("NoCertificado no corresponde al certificado incluido")
+    try:
+        issued = datetime.fromisoformat(comprobante.get("Fecha", "")).replace(tzinfo=timezone.utc)
+    except ValueError:
+        problems.append("La fecha de emisión no es válida")
+    else:
+        if not cert.not_valid_before_utc <= issued <= cert.not_valid_after_utc:
+            problems.append("El certificado no estaba vigente en la fecha de emisión")
+    public_key = cert.public_key()
+    if isinstance(public_key, rsa.RSAPublicKey) and comprobante.get("Sello"):
+        try:
+            seal = base64.b64decode(comprobante["Sello"])
+        except (ValueError, binascii.Error):
+            seal = b""
+        if len(seal) != public_key.key_size // 8:
+            problems.append("El sello no corresponde a la llave del certificado")
+    return problems
+
+
+def parse_cfdi(data: bytes) -> dict:
+    # Pure function of the document bytes, safe to run in a worker process
+    comprobante, emisor, receptor, timbre = extract_cfdi_nodes(data)
+    result = build_result(comprobante, emisor, receptor, timbre)
+    if comprobante is not None:
+        problems = check_certificate(comprobante)
+        if problems:
+            result["is_valid"] = False
+            result["warnings"] = problems + result["warnings"]
+    return result
+
+
+def build_result(comprobante: Optional[dict], emisor: dict, receptor: dict, timbre: Optional[dict]) -> dict:
+    if comprobante is None:
+        return {
+            "is_valid": False,
+            "status": "No es un CFDI",
+            "rfc_emisor": None,
+            "rfc_receptor": None,
+            "fecha_emision": None,
+            "warnings": ["El documento no contiene un nodo cfdi:Comprobante"],
+        }
+
+    problems = []
+    if not emisor.get("Rfc"):
+        problems.append("Falta el RFC del emisor")
+    if not receptor.get("Rfc"):
+        problems.append("Falta el RFC del receptor")
+    if not comprobante.get("Sello"):
+        problems.append("El comprobante no tiene sello digital")
+    if not comprobante.get("Certificado"):
+        problems.append("El comprobante no incluye el certificado del emisor")
+    if timbre is None:
+        problems.append("El CFDI no está timbrado (falta TimbreFiscalDigital)")
+    elif timbre.get("SelloCFD") and timbre.get("SelloCFD") != comprobante.get("Sello"):
+        problems.append("El SelloCFD del timbre no coincide con el sello del comprobante")
+
+    timbre = timbre or {}
+    return {
+        "is_valid": not problems,
+        "status": "Timbrado" if timbre else "Sin timbrar",
+        "version": comprobante.get("Version") or comprobante.get("version"),
+        "uuid": timbre.get("UUID", "").upper() or None,
+        "rfc_emisor": emisor.get("Rfc"),
+        "nombre_emisor": emisor.get("Nombre"),
+        "rfc_receptor": receptor.get("Rfc"),
+        "nombre_receptor": receptor.get("Nombre"),
+        "total": comprobante.get("Total"),
+        "moneda": comprobante.get("Moneda"),
+        "fecha_emision": comprobante.get("Fecha"),
+        "fecha_timbrado": timbre.get("FechaTimbrado"),
+        "no_certificado": comprobante.get("NoCertificado"),
+        "no_certificado_sat": timbre.get("NoCertificadoSAT"),
+        "sello_cfd": comprobante.get("Sello"),
+        "sello_sat": timbre.get("SelloSAT"),
+        "warnings": problems + ["Confirma el estatus de cancelación en el portal del SAT"],
+    }
+
+
+class CFDIResultCache:
+    """LRU of verification results keyed by the SHA-256 of the raw document."""
+
+    def __init__(self, max_entries: int = CFDI_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[dict]:
+        result = self._entries.get(digest)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return result
+
+    def put(self, digest: str, result: dict) -> None:
+        self._entries[digest] = result
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses}
+
+
+cfdi_cache = CFDIResultCache()
+
+
+def document_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import os
+import zipfile
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Tuple
+
+from fastapi import HTTPException, Request
+
+from cfdi import MAX_CFDI_BYTES, CFDIError
+from cfdi_pool import CFDIWorkerPool, PoolSaturated
+
+CFDI_BATCH_MAX_FILES = int(os.environ.get('CFDI_BATCH_MAX_FILES', '1000'))
+CFDI_BATCH_MAX_BYTES = int(os.environ.get('CFDI_BATCH_MAX_BYTES', str(200 * 1024 * 1024)))
+CFDI_BATCH_CONCURRENCY = int(os.environ.get('CFDI_BATCH_CONCURRENCY', '8'))
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class Upload:
+    def __init__(self, name: str, file):
+        self.name = name
+        self.file = file
+
+
+async def read_uploads(request: Request) -> Tuple[List[Upload], Callable[[], Awaitable[None]]]:
+    """Collect uploaded files without loading them into memory.
+
+    Accepts multipart form uploads (any number of XML or ZIP parts) or a raw
+    application/zip / XML body. Returns the uploads and a close callback the
+    caller must await once the response has been streamed.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=CFDI_BATCH_MAX_FILES)
+        uploads = [Upload(value.filename or key, value.file)
+                   for key, value in form.multi_items() if hasattr(value, "file")]
+        if not uploads:
+            await form.close()
+            raise HTTPException(status_code=400, detail="No se recibieron archivos")
+        return uploads, form.close
+
+    spool = SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > CFDI_BATCH_MAX_BYTES:
+            spool.close()
+            raise HTTPException(status_code=413, detail="El archivo excede el tamaño permitido")
+        spool.write(chunk)
+    spool.seek(0)
+
+    async def close():
+        spool.close()
+    return [Upload("upload.zip" if "zip" in content_type else "upload.xml", spool)], close
+
+
+def truncated() -> CFDIError:
+    return CFDIError(f"Se alcanzó el límite de {CFDI_BATCH_MAX_FILES} CFDI por lote; "
+                     "este archivo y los siguientes no se verificaron")
+
+
+def iter_documents(uploads: List[Upload]) -> Iterator[Tuple[str, object]]:
+    # Yields (name, bytes) per CFDI, or (name, CFDIError) for members that can't be read.
+    # Past CFDI_BATCH_MAX_FILES it yields one error naming the first skipped file and stops.
+    count = 0
+    for upload in uploads:
+        if zipfile.is_zipfile(upload.file):
+            upload.file.seek(0)
+            with zipfile.ZipFile(upload.file) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not member.filename.lower().endswith(".xml"):
+                        continue
+                    count += 1
+                    name = f"{upload.name}/{member.filename}"
+                    if count > CFDI_BATCH_MAX_FILES:
+                        yield name, truncated()
+                        return
+                    if member.file_size > MAX_CFDI_BYTES:
+                        yield name, CFDIError(f"El CFDI excede el tamaño máximo de {MAX_CFDI_BYTES} bytes")
+                        continue
+                    with archive.open(member) as stream:
+                        # Declared sizes can lie; never read past the limit
+                        data = stream.read(MAX_CFDI_BYTES + 1)
+                    if len(data) > MAX_CFDI_BYTES:
+                        yield name, CFDIError(f"El CFDI excede el tamaño máximo de {MAX_CFDI_BYTES} bytes")
+                        continue
+                    yield name, data.lstrip()
+        else:
+            count += 1
+            if count > CFDI_BATCH_MAX_FILES:
+                yield upload.name, truncated()
+                return
+            upload.file.seek(0)
+            data = upload.file.read(MAX_CFDI_BYTES + 1)
+            if len(data) > MAX_CFDI_BYTES:
+                yield upload.name, CFDIError(f"El CFDI excede el tamaño máximo de {MAX_CFDI_BYTES} bytes")
+            else:
+                yield upload.name, data.lstrip()
+
+
+async def verify_documents(uploads: List[Upload], pool: CFDIWorkerPool,
+                           on_result: Callable[[str, bytes, dict], Awaitable[None]],
+                           concurrency: int = CFDI_BATCH_CONCURRENCY) -> AsyncIterator[bytes]:
+    """Verify every document concurrently and yield NDJSON lines as they finish."""
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def verify(name: str, data: bytes) -> None:
+        try:
+            result = await pool.verify(data)
+            await on_result(name, data, result)
+            line = {"file": name, "ok": True, "result": result}
+        except (CFDIError, PoolSaturated) as e:
+            line = {"file": name, "ok": False, "error": str(e)}
+        except Exception:
+            # A broken worker pool or a failed write must cost this line, not the whole stream
+            logger.exception("CFDI batch verification failed for %s", name)
+            line = {"file": name, "ok": False, "error": "Error interno al verificar, intenta de nuevo"}
+        finally:
+            slots.release()
+        await results.put(line)
+
+    async def produce() -> None:
+        tasks = []
+        documents = iter_documents(uploads)
+        try:
+            while True:
+                await slots.acquire()
+                # Members are read from the spooled file off the event loop
+                item = await asyncio.to_thread(next, documents, None)
+                if item is None:
+                    slots.release()
+                    break
+                name, data = item
+                if isinstance(data, CFDIError):
+                    slots.release()
+                    await results.put({"file": name, "ok": False, "error": str(data)})
+                    continue
+                tasks.append(asyncio.create_task(verify(name, data)))
+            await asyncio.gather(*tasks)
+        except zipfile.BadZipFile as e:
+            await results.put({"file": None, "ok": False, "error": f"ZIP inválido: {e}"})
+        finally:
+            await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            line = await results.get()
+            if line is None:
+                break
+            yield (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        if not producer.done():
+            producer.cancel()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from cfdi import cfdi_cache, document_digest, parse_cfdi
+
+CFDI_POOL_WORKERS = int(os.environ.get('CFDI_POOL_WORKERS', str(min(4, os.cpu_count() or 1))))
+CFDI_POOL_MAX_PENDING = int(os.environ.get('CFDI_POOL_MAX_PENDING', '64'))
+CFDI_POOL_TIMEOUT = float(os.environ.get('CFDI_POOL_TIMEOUT', '10'))
+# Below this size a worker hop costs more than parsing on the loop
+CFDI_INLINE_MAX_BYTES = int(os.environ.get('CFDI_INLINE_MAX_BYTES', '32768'))
+
+
+class PoolSaturated(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CFDIWorkerPool:
+    """Runs CFDI parsing and certificate checks in worker processes."""
+
+    def __init__(self, workers: int = CFDI_POOL_WORKERS, max_pending: int = CFDI_POOL_MAX_PENDING,
+                 timeout: float = CFDI_POOL_TIMEOUT, inline_max_bytes: int = CFDI_INLINE_MAX_BYTES):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.inline_max_bytes = inline_max_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.inline = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def start(self) -> None:
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def verify(self, data: bytes) -> dict:
+        digest = document_digest(data)
+        result = cfdi_cache.get(digest)
+        if result is not None:
+            return result
+
+        if self._executor is None or len(data) <= self.inline_max_bytes:
+            self.inline += 1
+            result = parse_cfdi(data)
+        else:
+            result = await self._submit(data)
+        cfdi_cache.put(digest, result)
+        return result
+
+    async def _submit(self, data: bytes) -> dict:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturated("Demasiadas verificaciones en curso, intenta de nuevo", self.retry_after())
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(parse_cfdi, data)
+        # The slot is freed when the process is done with the job, not when we stop waiting:
+        # a timed-out parse keeps its worker busy and the jobs behind it queued
+        self.pending += 1
+        job.add_done_callback(lambda _: self._job_done(loop))
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            # Counted apart from completed jobs so a hung document does not inflate retry_after()
+            self.timeouts += 1
+            raise PoolSaturated("La verificación tardó demasiado, intenta de nuevo", self.retry_after())
+        except Exception:
+            self._record(started)
+            raise
+        self._record(started)
+        return result
+
+    def _job_done(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called from the executor's thread (or from shutdown once the loop is gone)
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._release)
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+    def _record(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+    def retry_after(self) -> int:
+        # Rough time for the current queue to clear at the observed job latency
+        average = self.total_seconds / self.completed if self.completed else 1.0
+        return max(1, int(average * self.pending / max(self.workers, 1)) + 1)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "inline": self.inline,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+            "max_seconds": self.max_seconds,
+            "cache": cfdi_cache.stats(),
+        }
@@ -0,0 +1,114 @@
+import os
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from cfdi import document_digest
+
+# Batch verification stores payloads in bulk writes of this many documents
+CFDI_STORE_BATCH_SIZE = int(os.environ.get('CFDI_STORE_BATCH_SIZE', '50'))
+
+# Event records keep only these result fields; the full result lives with the payload
+SUMMARY_FIELDS = ("is_valid", "status", "uuid")
+
+
+def result_summary(result: dict) -> dict:
+    return {field: result.get(field) for field in SUMMARY_FIELDS}
+
+
+def seen(count: int, now: datetime) -> dict:
+    return {"$inc": {"ref_count": count, "hit_count": count}, "$set": {"last_seen": now}}
+
+
+def payload_doc(digest: str, data: bytes, result: dict, count: int, now: datetime) -> dict:
+    return {
+        "_id": digest,
+        "uuid": result.get("uuid"),
+        "size": len(data),
+        "xml": zlib.compress(data, 6),
+        "result": result,
+        "ref_count": count,
+        "hit_count": count - 1,
+        "first_seen": now,
+        "last_seen": now,
+    }
+
+
+async def store_payloads(db, documents: List[Tuple[bytes, dict]]) -> List[str]:
+    """Store verified documents once each, keyed by SHA-256; returns the keys in order.
+
+    ref_count is the number of cfdi_verifications records pointing at a payload
+    (archiving them releases it, see release_payloads); hit_count only grows and
+    counts verifications after the first. Documents already stored cost one
+    small update and never resend the XML. The whole list is one lookup plus
+    one bulk write.
+    """
+    if not documents:
+        return []
+    digests = [document_digest(data) for data, _ in documents]
+    counts = Counter(digests)
+    first = {}
+    for digest, document in zip(digests, documents):
+        first.setdefault(digest, document)
+    now = datetime.utcnow()
+    stored = [doc["_id"] async for doc in db.cfdi_payloads.find({"_id": {"$in": list(counts)}}, {"_id": 1})]
+
+    updates = [UpdateOne({"_id": digest}, seen(counts[digest], now)) for digest in stored]
+    inserts = [payload_doc(digest, *first[digest], count, now) for digest, count in counts.items()
+               if digest not in stored]
+    try:
+        result = await db.cfdi_payloads.bulk_write(updates + [InsertOne(doc) for doc in inserts], ordered=False)
+        matched = result.matched_count
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != 11000 for error in errors):
+            raise
+        # A concurrent verification stored these first; count ours as repeats
+        raced = [inserts[error["index"] - len(updates)]["_id"] for error in errors]
+        await db.cfdi_payloads.bulk_write(
+            [UpdateOne({"_id": digest}, seen(counts[digest], now)) for digest in raced], ordered=False)
+        matched = e.details["nMatched"]
+    if matched < len(updates):
+        # sweep_payloads removed some between the lookup and the update: store those again
+        present = {doc["_id"] async for doc in db.cfdi_payloads.find({"_id": {"$in": stored}}, {"_id": 1})}
+        await store_payloads(db, [first[digest] for digest in stored if digest not in present
+                                  for _ in range(counts[digest])])
+    return digests
+
+
+async def store_payload(db, data: bytes, result: dict) -> str:
+    return (await store_payloads(db, [(data, result)]))[0]
+
+
+async def release_payloads(db, verifications: List[dict]) -> None:
+    # Called once verification records are archived or deleted; sweep_payloads removes what is left unused
+    counts: Dict[str, int] = Counter(doc["payload_id"] for doc in verifications if doc.get("payload_id"))
+    if counts:
+        await db.cfdi_payloads.bulk_write(
+            [UpdateOne({"_id": digest}, {"$inc": {"ref_count": -count}}) for digest, count in counts.items()],
+            ordered=False)
+
+
+async def sweep_payloads(db) -> int:
+    # Conditional on the count, so a verification that re-references a payload meanwhile keeps it
+    return (await db.cfdi_payloads.delete_many({"ref_count": {"$lte": 0}})).deleted_count
+
+
+async def invoice_checks(db, uuid: str) -> Optional[dict]:
+    """How often one invoice (by timbre UUID) has been verified, across every byte-level variant."""
+    variants = await db.cfdi_payloads.find(
+        {"uuid": uuid.upper()}, {"hit_count": 1, "first_seen": 1, "last_seen": 1}).to_list(None)
+    if not variants:
+        return None
+    return {
+        "uuid": uuid.upper(),
+        "verifications": sum(doc["hit_count"] + 1 for doc in variants),
+        "repeat_hits": sum(doc["hit_count"] for doc in variants),
+        "variants": len(variants),
+        "first_seen": min(doc["first_seen"] for doc in variants),
+        "last_seen": max(doc["last_seen"] for doc in variants),
+    }
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+import typer
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import with_database
+
+TOTALS_ID = "totals"
+# Set when an increment had to create the totals document: it then holds only that increment,
+# not the requests stored before it, so the next read reconciles from the collections
+NEEDS_RECONCILE = {"$setOnInsert": {"needs_reconcile": True}}
+
+# Dashboard service key -> collection holding that service's requests
+SERVICE_COLLECTIONS: Dict[str, str] = {
+    "cfe": "cfe_requests",
+    "certificates": "certificate_requests",
+    "fiscal": "fiscal_requests",
+    "contacts": "contact_messages",
+    "imss_semanas": "imss_semanas_requests",
+    "email_recovery": "email_recovery_requests",
+}
+
+
+def day_key(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def created_updates(service: str, statuses: Dict[Optional[str], int],
+                    days: Dict[str, int], now: datetime) -> list:
+    total = sum(statuses.values())
+    inc = {f"services.{service}": total}
+    for status, count in statuses.items():
+        if status:
+            inc[f"status.{service}.{status}"] = count
+    updates = [UpdateOne({"_id": TOTALS_ID}, {"$inc": inc, "$set": {"updated_at": now}, **NEEDS_RECONCILE},
+                         upsert=True)]
+    for day, count in days.items():
+        updates.append(UpdateOne(
+            {"_id": f"day:{day}"},
+            {"$inc": {f"services.{service}": count}, "$setOnInsert": {"day": day}},
+            upsert=True,
+        ))
+    return updates
+
+
+async def record_created(db, service: str, documents) -> None:
+    # Totals and the per-day bucket go out in a single bulk round-trip
+    if isinstance(documents, dict):
+        documents = [documents]
+    statuses: Dict[Optional[str], int] = {}
+    days: Dict[str, int] = {}
+    for doc in documents:
+        statuses[doc.get("status")] = statuses.get(doc.get("status"), 0) + 1
+        day = day_key(doc["timestamp"])
+        days[day] = days.get(day, 0) + 1
+    if not days:
+        return
+    await db.counters.bulk_write(created_updates(service, statuses, days, datetime.utcnow()), ordered=False)
+
+
+async def record_status_change(db, service: str, old_status: Optional[str], new_status: str,
+                               count: int = 1) -> None:
+    if old_status == new_status:
+        return
+    inc = {f"status.{service}.{new_status}": count}
+    if old_status:
+        inc[f"status.{service}.{old_status}"] = -count
+    await db.counters.update_one(
+        {"_id": TOTALS_ID}, {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}, **NEEDS_RECONCILE}, upsert=True
+    )
+
+
+async def get_totals(db) -> dict:
+    totals = await db.counters.find_one({"_id": TOTALS_ID})
+    if totals is None or totals.get("needs_reconcile"):
+        totals = await reconcile(db)
+    return totals
+
+
+async def count_service(db, service: str, collection: str) -> tuple:
+    statuses = {}
+    async for row in db[collection].aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]):
+        statuses[row["_id"]] = row["count"]
+    days = {}
+    async for row in db[collection].aggregate([
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            "count": {"$sum": 1},
+        }},
+    ]):
+        days[row["_id"]] = row["count"]
+    return service, statuses, days
+
+
+async def reconcile(db) -> dict:
+    # Recompute every counter from the source collections to correct drift
+    results = await asyncio.gather(*[
+        count_service(db, service, collection) for service, collection in SERVICE_COLLECTIONS.items()
+    ])
+    now = datetime.utcnow()
+    totals = {"_id": TOTALS_ID, "services": {}, "status": {}, "updated_at": now, "reconciled_at": now}
+    day_docs: Dict[str, dict] = {}
+    for service, statuses, days in results:
+        totals["services"][service] = sum(statuses.values())
+        totals["status"][service] = {status: count for status, count in statuses.items() if status}
+        for day, count in days.items():
+            day_docs.setdefault(day, {"_id": f"day:{day}", "day": day, "services": {}})
+            day_docs[day]["services"][service] = count
+
+    # Whole-document upserts, so concurrent reconciles and increments never see a missing document
+    writes = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in [totals, *day_docs.values()]]
+    for _ in range(2):
+        try:
+            await db.counters.bulk_write(writes, ordered=False)
+            break
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != 11000 for error in errors):
+                raise
+            # Another writer inserted these first; replacing them now matches
+            writes = [writes[error["index"]] for error in errors]
+    # Days with no requests left (e.g. after a purge)
+    await db.counters.delete_many({"_id": {"$regex": "^day:", "$nin": [doc["_id"] for doc in day_docs.values()]}})
+    return totals
+
+
+cli = typer.Typer(help="Maintain the dashboard counters")
+
+
+@cli.callback()
+def main():
+    pass
+
+
+@cli.command("reconcile")
+def reconcile_command():
+    """Recompute all counters from the request collections."""
+    totals = asyncio.run(with_database(reconcile))
+    for service, count in totals["services"].items():
+        typer.echo(f"{service}: {count}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,17 @@
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from settings import MongoSettings
+
+
+async def with_database(action):
+    # Standalone connection for CLI commands that run outside the API process
+    load_dotenv(Path(__file__).parent / '.env')
+    settings = MongoSettings.from_env()
+    client = AsyncIOMotorClient(settings.url, **settings.client_kwargs())
+    try:
+        return await action(client[settings.db_name])
+    finally:
+        client.close()
@@ -0,0 +1,256 @@
+"""Streaming CSV / Parquet export of the request collections.
+
+Run from backend/:
+    python export.py cfe --format parquet --output cfe.parquet --since 2024-01-01
+    python export.py imss_semanas --incremental --consumer donantes --output imss.csv
+"""
+import asyncio
+import io
+import os
+import re
+import typing
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Type
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import typer
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+
+from counters import SERVICE_COLLECTIONS
+from database import with_database
+from pagination import PAGE_SORT, encode_cursor, keyset_filter, utc_naive
+
+# Rows per cursor batch, DataFrame chunk and Parquet row group
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '10000'))
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+CONSUMER_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class ExportParams:
+    def __init__(
+        self,
+        format: str = Query("csv", pattern=f"^({'|'.join(MEDIA_TYPES)})$"),
+        since: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+        until: Optional[datetime] = Query(None, description="Created before (ISO 8601)"),
+        incremental: bool = Query(False, description="Only rows added since this consumer's last export"),
+        consumer: str = Query("default", pattern=CONSUMER_PATTERN.pattern),
+    ):
+        # Checked here as well: the Query patterns only apply to HTTP requests, not the CLI
+        if format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown format: {format} (use {' or '.join(MEDIA_TYPES)})")
+        if not CONSUMER_PATTERN.match(consumer):
+            raise HTTPException(status_code=400, detail="consumer must be 1-64 letters, digits, '_' or '-'")
+        self.format = format
+        self.since = utc_naive(since)
+        self.until = utc_naive(until)
+        self.incremental = incremental
+        self.consumer = consumer
+
+
+def columns_for(model: Type[BaseModel]) -> List[str]:
+    return list(model.model_fields)
+
+
+def base_type(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        return next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    return annotation
+
+
+def arrow_type(annotation):
+    annotation = base_type(annotation)
+    if annotation is bool:
+        return pa.bool_()
+    if annotation is int:
+        return pa.int64()
+    if annotation is float:
+        return pa.float64()
+    if annotation is datetime:
+        return pa.timestamp("ms")
+    return pa.string()
+
+
+def arrow_schema(model: Type[BaseModel]):
+    # Fixed from the model so every row group matches, even chunks where a field is always missing
+    return pa.schema([(name, arrow_type(field.annotation)) for name, field in model.model_fields.items()])
+
+
+PANDAS_DTYPES = {bool: "boolean", int: "Int64", float: "float64", datetime: "datetime64[ms]"}
+
+
+def pandas_dtypes(model: Type[BaseModel]) -> Dict[str, str]:
+    return {name: PANDAS_DTYPES.get(base_type(field.annotation), "string")
+            for name, field in model.model_fields.items()}
+
+
+def to_frame(rows: List[dict], model: Type[BaseModel]) -> pd.DataFrame:
+    # Nullable dtypes, so a chunk where a field is always missing keeps its column type
+    frame = pd.DataFrame.from_records(rows, columns=columns_for(model))
+    for name, dtype in pandas_dtypes(model).items():
+        if dtype.startswith("datetime"):
+            frame[name] = pd.to_datetime(frame[name]).astype(dtype)
+        else:
+            frame[name] = frame[name].astype(dtype)
+    return frame
+
+
+def watermark_id(service: str, consumer: str) -> str:
+    return f"{service}:{consumer}"
+
+
+async def export_query(db, service: str, params: ExportParams) -> dict:
+    clauses = []
+    window = {}
+    if params.since is not None:
+        window["$gte"] = params.since
+    if params.until is not None:
+        window["$lt"] = params.until
+    if window:
+        clauses.append({"timestamp": window})
+    if params.incremental:
+        state = await db.export_state.find_one({"_id": watermark_id(service, params.consumer)})
+        if state is not None:
+            clauses.append(keyset_filter(state["cursor"]))
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else {}
+
+
+async def iter_frames(collection, model: Type[BaseModel], query: dict,
+                      chunk_size: int, last: dict) -> AsyncIterator[pd.DataFrame]:
+    projection = {"_id": 0, **{name: 1 for name in columns_for(model)}}
+    cursor = collection.find(query, projection).sort(PAGE_SORT["asc"]).batch_size(chunk_size)
+    rows = []
+    async for doc in cursor:
+        rows.append(doc)
+        if len(rows) >= chunk_size:
+            last["doc"] = rows[-1]
+            yield to_frame(rows, model)
+            rows = []
+    if rows:
+        last["doc"] = rows[-1]
+        yield to_frame(rows, model)
+
+
+class ChunkSink:
+    """Write-only file object that hands Parquet bytes back as soon as a row group is written."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def encode_csv(frame: pd.DataFrame, header: bool) -> bytes:
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=header, index=False, date_format="%Y-%m-%dT%H:%M:%S.%f")
+    return buffer.getvalue().encode("utf-8")
+
+
+def encode_parquet(writer, sink: ChunkSink, schema, frame: pd.DataFrame) -> bytes:
+    writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+    return sink.take()
+
+
+async def stream_export(db, service: str, model: Type[BaseModel], params: ExportParams,
+                        chunk_size: int = EXPORT_CHUNK_SIZE, read_db=None) -> AsyncIterator[bytes]:
+    """Yield the export in chunks; memory stays at one chunk regardless of collection size.
+
+    Rows come from read_db when given; watermarks always use db. The
+    consumer's watermark only moves once the last chunk has been produced,
+    so an interrupted download is simply repeated next time.
+    """
+    query = await export_query(db, service, params)
+    last: Dict[str, dict] = {}
+    source = read_db if read_db is not None else db
+    frames = iter_frames(source[SERVICE_COLLECTIONS[service]], model, query, chunk_size, last)
+
+    if params.format == "csv":
+        header = True
+        async for frame in frames:
+            # Encoding is CPU-bound; keep it off the event loop
+            yield await asyncio.to_thread(encode_csv, frame, header)
+            header = False
+        if header:
+            yield ",".join(columns_for(model)).encode("utf-8") + b"\n"
+    else:
+        schema = arrow_schema(model)
+        sink = ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        async for frame in frames:
+            yield await asyncio.to_thread(encode_parquet, writer, sink, schema, frame)
+        writer.close()
+        yield sink.take()
+
+    if params.incremental and "doc" in last:
+        await db.export_state.update_one(
+            {"_id": watermark_id(service, params.consumer)},
+            {"$set": {"cursor": encode_cursor(last["doc"]), "timestamp": last["doc"]["timestamp"],
+                      "exported_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+
+def export_filename(service: str, params: ExportParams) -> str:
+    return f"{service}-{datetime.utcnow():%Y%m%dT%H%M%S}.{params.format}"
+
+
+def main(
+    service: str = typer.Argument(..., help=f"One of: {', '.join(SERVICE_COLLECTIONS)}"),
+    output: Path = typer.Option(..., help="File to write"),
+    format: str = typer.Option("csv", help="csv or parquet"),
+    since: Optional[datetime] = typer.Option(None, help="Created at or after"),
+    until: Optional[datetime] = typer.Option(None, help="Created before"),
+    incremental: bool = typer.Option(False, help="Only rows added since this consumer's last export"),
+    consumer: str = typer.Option("default", help="Watermark name for incremental exports"),
+    chunk_size: int = typer.Option(EXPORT_CHUNK_SIZE, help="Rows per chunk / row group"),
+):
+    """Export one request collection to CSV or Parquet."""
+    # Models live with the routes; importing server builds no connections
+    from server import EXPORT_MODELS
+
+    if service not in EXPORT_MODELS:
+        raise typer.BadParameter(f"Unknown service: {service}")
+    try:
+        params = ExportParams(format=format, since=since, until=until, incremental=incremental, consumer=consumer)
+    except HTTPException as e:
+        raise typer.BadParameter(str(e.detail))
+
+    async def write(db):
+        with output.open("wb") as handle:
+            async for chunk in stream_export(db, service, EXPORT_MODELS[service], params, chunk_size):
+                handle.write(chunk)
+
+    asyncio.run(with_database(write))
+    typer.echo(f"{service}: wrote {output} ({output.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    typer.run(main)
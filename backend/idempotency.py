@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+# How long an Idempotency-Key is remembered, and how long the same natural key counts as a retry
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+DEDUP_WINDOW = int(os.environ.get('DEDUP_WINDOW', '3600'))
+# A concurrent duplicate waits this long for the first attempt before getting a 409
+PENDING_WAIT = float(os.environ.get('IDEMPOTENCY_PENDING_WAIT', '5'))
+# A pending claim older than this belongs to an attempt that died inside create(); a retry takes it over
+PENDING_LEASE = float(os.environ.get('IDEMPOTENCY_PENDING_LEASE', '30'))
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(payload: dict) -> str:
+    raw = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def claim_ids(service: str, idempotency_key: Optional[str], natural_key: Optional[str]) -> List[Tuple[str, int]]:
+    claims = []
+    if idempotency_key:
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key demasiado largo")
+        claims.append((f"{service}:key:{idempotency_key}", IDEMPOTENCY_KEY_TTL))
+    if natural_key:
+        claims.append((f"{service}:natural:{natural_key.upper()}", DEDUP_WINDOW))
+    return claims
+
+
+def pending_claim(request_hash: str, ttl: int, now: datetime) -> dict:
+    return {"state": "pending", "request_hash": request_hash, "created_at": now,
+            "pending_until": now + timedelta(seconds=PENDING_LEASE), "expires_at": now + timedelta(seconds=ttl)}
+
+
+async def claim(collection, claim_id: str, ttl: int, request_hash: str) -> Optional[dict]:
+    """Claim claim_id for this request; return the existing record when someone already holds it."""
+    now = datetime.utcnow()
+    doc = pending_claim(request_hash, ttl, now)
+    for _ in range(2):
+        try:
+            await collection.insert_one({"_id": claim_id, **doc})
+            return None
+        except DuplicateKeyError:
+            existing = await collection.find_one({"_id": claim_id})
+            if existing is None:
+                continue
+            if existing["expires_at"] <= now:
+                # Expired but not yet removed by the TTL monitor
+                await collection.delete_one({"_id": claim_id, "expires_at": existing["expires_at"]})
+                continue
+            if existing["state"] == "pending" and existing["pending_until"] <= now:
+                # The holder crashed before storing a response. If it did insert, this retry may
+                # duplicate it; that is rarer and cheaper than refusing the request for the whole TTL.
+                result = await collection.replace_one(
+                    {"_id": claim_id, "state": "pending", "pending_until": existing["pending_until"]}, doc)
+                if result.matched_count:
+                    return None
+                continue
+            return existing
+    raise HTTPException(status_code=409, detail="Solicitud en proceso, intenta de nuevo")
+
+
+async def take_over(collection, existing: dict, ttl: int, request_hash: str) -> None:
+    """Re-point a finished natural-key claim at a submission with different details."""
+    if existing["state"] == "pending":
+        raise HTTPException(status_code=409, detail="Otra solicitud con estos datos está en proceso, intenta de nuevo",
+                            headers={"Retry-After": "1"})
+    result = await collection.replace_one(
+        {"_id": existing["_id"], "state": "done", "request_hash": existing["request_hash"]},
+        pending_claim(request_hash, ttl, datetime.utcnow()),
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Solicitud en proceso, intenta de nuevo",
+                            headers={"Retry-After": "1"})
+
+
+async def wait_for_response(collection, existing: dict) -> dict:
+    deadline = asyncio.get_running_loop().time() + PENDING_WAIT
+    while existing is not None and existing["state"] == "pending":
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(status_code=409, detail="Solicitud en proceso, intenta de nuevo",
+                                headers={"Retry-After": "1"})
+        await asyncio.sleep(0.1)
+        existing = await collection.find_one({"_id": existing["_id"]})
+    if existing is None:
+        # The first attempt failed and released its claim
+        raise HTTPException(status_code=409, detail="La solicitud anterior falló, intenta de nuevo")
+    return existing["response"]
+
+
+async def complete(collection, claimed: List[str], response: dict) -> None:
+    if claimed:
+        await collection.update_many({"_id": {"$in": claimed}},
+                                     {"$set": {"state": "done", "response": response}})
+
+
+async def submit_once(db, service: str, payload: dict, create: Callable[[], Awaitable[dict]],
+                      idempotency_key: Optional[str] = None,
+                      natural_key: Optional[str] = None) -> Tuple[dict, bool]:
+    """Run create() at most once per Idempotency-Key and natural key.
+
+    Returns (response, replayed). Replays come from the stored response of the
+    first attempt, so retries never insert or count twice. A natural-key hit
+    only replays when the body is identical; different details (a corrected
+    phone, a later CFE payment) are a new submission.
+    """
+    collection = db.idempotency_keys
+    request_hash = fingerprint(payload)
+    claimed: List[str] = []
+    try:
+        for claim_id, ttl in claim_ids(service, idempotency_key, natural_key):
+            existing = await claim(collection, claim_id, ttl, request_hash)
+            if existing is None:
+                claimed.append(claim_id)
+                continue
+            if existing["request_hash"] != request_hash:
+                if ":key:" in claim_id:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key ya usado con otros datos")
+                await take_over(collection, existing, ttl, request_hash)
+                claimed.append(claim_id)
+                continue
+            response = await wait_for_response(collection, existing)
+            if claimed:
+                # A fresh Idempotency-Key that hit a natural duplicate replays the same record from now on
+                await complete(collection, claimed, response)
+                claimed = []
+            return response, True
+
+        response = await create()
+    except BaseException:
+        if claimed:
+            await collection.delete_many({"_id": {"$in": claimed}})
+        raise
+
+    await complete(collection, claimed, response)
+    return response, False
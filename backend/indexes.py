@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+import typer
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from database import with_database
+from notifications import NOTIFY_CHANNELS
+from retention import TELEMETRY_GROUPS, archive_name
+
+logger = logging.getLogger(__name__)
+
+# Every collection the API writes to and the fields the admin lists filter it by
+COLLECTION_FIELDS: Dict[str, List[str]] = {
+    "status_checks": [],
+    "cfe_requests": ["status", "phone", "service_number", "assignee"],
+    "certificate_requests": ["phone"],
+    "fiscal_requests": ["status", "curp", "phone", "assignee"],
+    "cfdi_verifications": [],
+    "tramite_downloads": [],
+    "contact_messages": [],
+    "imss_semanas_requests": ["status", "curp", "phone", "assignee"],
+    "email_recovery_requests": ["status", "curp", "phone", "assignee"],
+}
+
+# Superseded by the (field, timestamp, id) indexes, which also cover the tie-breaking sort
+RETIRED_INDEXES = ["status_timestamp", "curp_timestamp"]
+
+
+def index_models(fields: List[str]) -> List[IndexModel]:
+    indexes = [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # Keyset pagination order used by the list routes
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+    ]
+    for field in fields:
+        # Equality filter + date range + keyset sort in either direction
+        indexes.append(IndexModel([(field, ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)],
+                                  name=f"{field}_timestamp_id"))
+    if "assignee" in fields:
+        # Work-queue lease sweeper only looks at claimed cases
+        indexes.append(IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+                                  name="status_lease_expires_at"))
+    if "status" in fields:
+        # Rollup refresh re-counts the hours of cases whose status changed since its last run
+        indexes.append(IndexModel([("status_changed_at", ASCENDING)], sparse=True, name="status_changed_at"))
+    return indexes
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    **{name: index_models(fields) for name, fields in COLLECTION_FIELDS.items()},
+    # Idempotency-Key and natural-key claims are looked up by _id and expire on their own
+    "idempotency_keys": [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl")],
+    # Events feed reads in keyset order; each channel's dispatcher looks for due deliveries
+    "notification_outbox": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+        *[IndexModel([(f"deliveries.{channel}.state", ASCENDING), (f"deliveries.{channel}.next_attempt_at", ASCENDING)],
+                     name=f"{channel}_state_next_attempt_at") for channel in NOTIFY_CHANNELS],
+    ],
+    # Shared rate-limit buckets disappear once they would be full again
+    "rate_limits": [IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl")],
+    # Timeseries queries and refresh windows are (service, hour range) scans
+    "rollups_hourly": [IndexModel([("service", ASCENDING), ("hour", ASCENDING)], name="service_hour")],
+    # Cold tier: archive chunks are read and re-summarized by day, summaries by (collection, day)
+    **{archive_name(name): [IndexModel([("day", ASCENDING)], name="day")] for name in TELEMETRY_GROUPS},
+    # Repeat checks of one invoice are summed across its stored byte-level variants
+    "cfdi_payloads": [IndexModel([("uuid", ASCENDING)], name="uuid"),
+                      # Retention sweeps payloads no verification references any more
+                      IndexModel([("ref_count", ASCENDING)], name="ref_count")],
+    "telemetry_daily": [IndexModel([("collection", ASCENDING), ("day", ASCENDING)], name="collection_day")],
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    created = {}
+    for name, indexes in INDEXES.items():
+        created[name] = await db[name].create_indexes(indexes)
+        existing = await db[name].index_information()
+        for retired in RETIRED_INDEXES:
+            if retired in existing:
+                try:
+                    await db[name].drop_index(retired)
+                except OperationFailure as e:
+                    # Every worker runs this at startup; the ones that lose the race find it gone
+                    logger.warning("Could not drop retired index %s.%s: %s", name, retired, e)
+    return created
+
+
+class CollectionScanError(RuntimeError):
+    pass
+
+
+def hot_queries(fields: List[str]) -> List[tuple]:
+    queries = [
+        ({"id": "0"}, None),
+        ({}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ]
+    samples = {"status": "pending", "curp": "AAAA000101HDFXXX00", "phone": "5512345678",
+               "service_number": "123456789012", "assignee": "voluntario"}
+    for field in fields:
+        queries.append(({field: samples[field], "timestamp": {"$gte": datetime(2024, 1, 1)}},
+                        [("timestamp", DESCENDING), ("id", DESCENDING)]))
+    if "assignee" in fields:
+        queries.append(({"status": "in_progress", "lease_expires_at": {"$lte": datetime(2024, 1, 1)}}, None))
+    return queries
+
+
+def plan_stages(plan: dict) -> List[str]:
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+async def check_query_plans(db) -> List[str]:
+    # Raises when any hot query would fall back to a full collection scan
+    failures = []
+    for name, fields in COLLECTION_FIELDS.items():
+        for query, sort in hot_queries(fields):
+            cursor = db[name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = await cursor.explain()
+            winning_plan = explain["queryPlanner"]["winningPlan"]
+            if "COLLSCAN" in plan_stages(winning_plan):
+                failures.append(f"{name}: {query} sort={sort}")
+    if failures:
+        raise CollectionScanError("Queries using COLLSCAN:\n" + "\n".join(failures))
+    return [f"{name}: ok" for name in COLLECTION_FIELDS]
+
+
+cli = typer.Typer(help="Manage MongoDB indexes for the HUMANIDAD UNIDA API")
+
+
+@cli.command()
+def ensure():
+    """Create every declared index (safe to run repeatedly)."""
+    created = asyncio.run(with_database(ensure_indexes))
+    for name, indexes in created.items():
+        typer.echo(f"{name}: {', '.join(indexes)}")
+
+
+@cli.command()
+def check():
+    """Fail if any hot query plan contains a COLLSCAN stage."""
+    try:
+        for line in asyncio.run(with_database(check_query_plans)):
+            typer.echo(line)
+    except CollectionScanError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,291 @@
+import asyncio
+import bisect
+import collections
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self.values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self.values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = collections.defaultdict(float)
+        # pymongo listeners fire from driver threads
+        self._lock = threading.Lock()
+
+    def observe(self, *labels: str, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.counts.get(labels)
+            if counts is None:
+                counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self.sums[labels] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(counts) for labels, counts in self.counts.items()}
+            sums = dict(self.sums)
+        for labels, counts in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = format_labels(self.labels, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = format_labels(self.labels, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {sums[labels]}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+        # Gauges computed at scrape time from other components' stats()
+        self.collectors: List[Tuple[str, str, Tuple[str, ...], Callable[[], Dict[LabelValues, float]]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, help: str, labels: Tuple[str, ...], collect: Callable[[], Dict[LabelValues, float]]):
+        self.collectors.append((name, help, labels, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for name, help, labels, collect in self.collectors:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for label_values, value in sorted(collect().items()):
+                lines.append(f"{name}{format_labels(labels, label_values)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+http_request_size = registry.register(Histogram(
+    "http_request_size_bytes", "HTTP request body size", ("method", "route"), SIZE_BUCKETS))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "HTTP response body size", ("method", "route"), SIZE_BUCKETS))
+phase_latency = registry.register(Histogram(
+    "app_phase_duration_seconds", "Time spent in model validation and serialization phases", ("phase",)))
+mongo_latency = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command",)))
+mongo_failures = registry.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("command",)))
+pool_checkout_wait = registry.register(Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time waiting to check a connection out of the pool"))
+pool_checkout_failures = registry.register(Counter(
+    "mongo_pool_checkout_failures_total", "Failed pool checkouts", ("reason",)))
+pool_in_use = registry.register(Gauge(
+    "mongo_pool_connections_in_use", "Connections currently checked out"))
+loop_lag = registry.register(Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wake-up and the loop running it"))
+
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_latency.observe(phase, value=time.perf_counter() - started)
+
+
+# ========== MONGO LISTENERS ==========
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.observe(event.command_name, value=event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_latency.observe(event.command_name, value=event.duration_micros / 1e6)
+        mongo_failures.inc(event.command_name)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    # Checkout start and finish happen on the same driver thread
+    _local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            pool_checkout_wait.observe(value=time.perf_counter() - started)
+        pool_in_use.inc(amount=1)
+
+    def connection_check_out_failed(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            pool_checkout_wait.observe(value=time.perf_counter() - started)
+        pool_checkout_failures.inc(str(event.reason))
+
+    def connection_checked_in(self, event):
+        pool_in_use.inc(amount=-1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+
+def mongo_listeners() -> list:
+    return [CommandMetrics(), PoolMetrics()]
+
+
+# ========== HTTP MIDDLEWARE ==========
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        request_bytes = 0
+        response_bytes = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal response_bytes, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = scope.get("route")
+            # Route templates keep label cardinality bounded
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, path, str(status))
+            http_latency.observe(method, path, value=time.perf_counter() - started)
+            http_request_size.observe(method, path, value=request_bytes)
+            http_response_size.observe(method, path, value=response_bytes)
+
+
+# ========== EVENT LOOP LAG ==========
+
+async def monitor_loop_lag(interval: float = 0.5) -> None:
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        loop_lag.observe(value=max(0.0, time.perf_counter() - expected))
+
+
+# ========== SAMPLING PROFILER ==========
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005, max_depth: int = 40) -> str:
+    """Sample one thread's stack and return collapsed stacks for flamegraph tools."""
+    counts: Dict[str, int] = collections.Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None and len(stack) < max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+
+
+async def profile_event_loop(seconds: float) -> str:
+    # The sampler runs in a helper thread so the loop keeps serving requests
+    loop_thread = threading.get_ident()
+    return await asyncio.to_thread(sample_stacks, loop_thread, seconds)
+
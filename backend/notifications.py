@@ -0,0 +1,304 @@
+"""Outbox of new-request notifications, its dispatcher and the /api/events feed.
+
+Creators append one outbox document per new request. The dispatcher claims
+due deliveries per channel in batches, sends each batch through the channel's
+transport as a single digest, and retries failures with exponential backoff.
+The same documents, read in (timestamp, id) order, are the events feed.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Callable, Dict, List, Optional
+
+from fastapi import Query
+from pymongo import UpdateOne
+
+from pagination import PAGE_SORT, decode_cursor, encode_cursor, keyset_filter
+
+NOTIFY_CHANNELS = [channel for channel in os.environ.get('NOTIFY_CHANNELS', 'whatsapp,email').split(",") if channel]
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '50'))
+NOTIFY_INTERVAL = float(os.environ.get('NOTIFY_INTERVAL', '5'))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '8'))
+NOTIFY_BACKOFF_BASE = float(os.environ.get('NOTIFY_BACKOFF_BASE', '10'))
+NOTIFY_BACKOFF_MAX = float(os.environ.get('NOTIFY_BACKOFF_MAX', '3600'))
+# A claimed batch whose worker died is retried after this long
+NOTIFY_CLAIM_SECONDS = float(os.environ.get('NOTIFY_CLAIM_SECONDS', '120'))
+NOTIFY_RETENTION_DAYS = int(os.environ.get('NOTIFY_RETENTION_DAYS', '14'))
+# The feed only hands out events at least this old, so a slower concurrent insert
+# with an earlier timestamp is never skipped by a client's cursor
+EVENTS_SETTLE_SECONDS = float(os.environ.get('EVENTS_SETTLE_SECONDS', '1'))
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '1'))
+EVENTS_MAX_WAIT = 30
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(RuntimeError):
+    pass
+
+
+def summary_line(event: dict) -> str:
+    return f"[{event['service']}] {event.get('name') or 'Sin nombre'} - {event['request_id']}"
+
+
+def digest_text(events: List[dict]) -> str:
+    lines = [summary_line(event) for event in events]
+    if len(lines) == 1:
+        return f"Nueva solicitud: {lines[0]}"
+    return f"{len(lines)} solicitudes nuevas:\n" + "\n".join(lines)
+
+
+class LoggingTransport:
+    """Default when a channel has no credentials: the digest goes to the log."""
+
+    async def send(self, channel: str, events: List[dict]) -> None:
+        logger.info("[%s] %s", channel, digest_text(events))
+
+
+class FakeTransport:
+    """Records batches in memory; fail_next makes the next sends raise."""
+
+    def __init__(self):
+        self.batches: List[List[dict]] = []
+        self.fail_next = 0
+
+    async def send(self, channel: str, events: List[dict]) -> None:
+        if self.fail_next:
+            self.fail_next -= 1
+            raise TransportError("fake transport failure")
+        self.batches.append(events)
+
+
+class SMTPTransport:
+    def __init__(self, host: str, port: int, sender: str, recipients: List[str],
+                 username: Optional[str] = None, password: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+
+    def _send(self, events: List[dict]) -> None:
+        message = EmailMessage()
+        message["Subject"] = f"HUMANIDAD UNIDA: {len(events)} solicitud(es) nueva(s)"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(digest_text(events))
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+    async def send(self, channel: str, events: List[dict]) -> None:
+        try:
+            await asyncio.to_thread(self._send, events)
+        except (OSError, smtplib.SMTPException) as e:
+            raise TransportError(str(e)) from e
+
+
+class WhatsAppTransport:
+    """WhatsApp Cloud API text messages to the volunteer numbers."""
+
+    def __init__(self, token: str, phone_number_id: str, recipients: List[str]):
+        self.url = f"https://graph.facebook.com/v19.0/{phone_number_id}/messages"
+        self.token = token
+        self.recipients = recipients
+
+    def _send(self, events: List[dict]) -> None:
+        body = digest_text(events)[:4096]
+        for recipient in self.recipients:
+            payload = {"messaging_product": "whatsapp", "to": recipient, "type": "text", "text": {"body": body}}
+            request = urllib.request.Request(
+                self.url, data=json.dumps(payload).encode(), method="POST",
+                headers={"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"},
+            )
+            # Non-2xx responses raise HTTPError
+            with urllib.request.urlopen(request, timeout=15):
+                pass
+
+    async def send(self, channel: str, events: List[dict]) -> None:
+        try:
+            await asyncio.to_thread(self._send, events)
+        except (OSError, urllib.error.URLError) as e:
+            raise TransportError(str(e)) from e
+
+
+def recipients(name: str) -> List[str]:
+    return [value.strip() for value in os.environ.get(name, "").split(",") if value.strip()]
+
+
+def transports_from_env() -> Dict[str, object]:
+    transports = {}
+    for channel in NOTIFY_CHANNELS:
+        if channel == "email" and os.environ.get('NOTIFY_SMTP_HOST') and recipients('NOTIFY_EMAIL_TO'):
+            transports[channel] = SMTPTransport(
+                os.environ['NOTIFY_SMTP_HOST'], int(os.environ.get('NOTIFY_SMTP_PORT', '587')),
+                os.environ.get('NOTIFY_EMAIL_FROM', 'no-reply@humanidadunida.org'), recipients('NOTIFY_EMAIL_TO'),
+                os.environ.get('NOTIFY_SMTP_USER'), os.environ.get('NOTIFY_SMTP_PASSWORD'))
+        elif channel == "whatsapp" and os.environ.get('NOTIFY_WHATSAPP_TOKEN') and recipients('NOTIFY_WHATSAPP_TO'):
+            transports[channel] = WhatsAppTransport(
+                os.environ['NOTIFY_WHATSAPP_TOKEN'], os.environ.get('NOTIFY_WHATSAPP_PHONE_ID', ''),
+                recipients('NOTIFY_WHATSAPP_TO'))
+        else:
+            transports[channel] = LoggingTransport()
+    return transports
+
+
+def outbox_event(service: str, doc: dict, now: datetime) -> dict:
+    # Only what a volunteer needs to find the case; the request itself stays in its collection
+    return {
+        "id": str(uuid.uuid4()),
+        "type": "request.created",
+        "service": service,
+        "request_id": doc["id"],
+        "name": doc.get("user_name") or doc.get("name"),
+        "status": doc.get("status"),
+        "timestamp": now,
+        "expires_at": now + timedelta(days=NOTIFY_RETENTION_DAYS),
+        "deliveries": {channel: {"state": PENDING, "attempts": 0, "next_attempt_at": now}
+                       for channel in NOTIFY_CHANNELS},
+    }
+
+
+async def enqueue_notifications(db, service: str, documents) -> None:
+    """Append outbox events for newly created requests, one insert per call."""
+    if isinstance(documents, dict):
+        documents = [documents]
+    now = datetime.utcnow()
+    events = [outbox_event(service, doc, now) for doc in documents]
+    if events:
+        await db.notification_outbox.insert_many(events, ordered=False)
+
+
+def backoff(attempts: int) -> float:
+    # Full jitter, so deliveries that failed together do not retry together
+    return random.uniform(0, min(NOTIFY_BACKOFF_MAX, NOTIFY_BACKOFF_BASE * 2 ** (attempts - 1)))
+
+
+async def claim_batch(db, channel: str, batch_size: int) -> List[dict]:
+    now = datetime.utcnow()
+    state = f"deliveries.{channel}"
+    due = {"$or": [
+        {f"{state}.state": PENDING, f"{state}.next_attempt_at": {"$lte": now}},
+        {f"{state}.state": SENDING, f"{state}.claim_expires_at": {"$lte": now}},
+    ]}
+    candidates = await db.notification_outbox.find(due, {"_id": 0, "id": 1}).sort(
+        PAGE_SORT["asc"]).limit(batch_size).to_list(None)
+    if not candidates:
+        return []
+    # Claim by token: when workers race for the same candidates, each keeps only what it set
+    token = str(uuid.uuid4())
+    await db.notification_outbox.update_many(
+        {"id": {"$in": [doc["id"] for doc in candidates]}, **due},
+        {"$set": {f"{state}.state": SENDING, f"{state}.claim": token,
+                  f"{state}.claim_expires_at": now + timedelta(seconds=NOTIFY_CLAIM_SECONDS)}},
+    )
+    return await db.notification_outbox.find({f"{state}.claim": token}, {"_id": 0}).sort(
+        PAGE_SORT["asc"]).to_list(None)
+
+
+async def deliver_batch(db, channel: str, transport, events: List[dict]) -> int:
+    state = f"deliveries.{channel}"
+    # Only touch deliveries still under this batch's claim
+    claimed = {f"{state}.claim": events[0]["deliveries"][channel]["claim"]}
+    release = {f"{state}.claim": "", f"{state}.claim_expires_at": ""}
+    try:
+        await transport.send(channel, events)
+    except Exception as e:
+        logger.warning("Notification batch of %d on %s failed: %s", len(events), channel, e)
+        now = datetime.utcnow()
+        updates = []
+        for event in events:
+            attempts = event["deliveries"][channel]["attempts"] + 1
+            update = {f"{state}.attempts": attempts, f"{state}.last_error": str(e)[:500]}
+            if attempts >= NOTIFY_MAX_ATTEMPTS:
+                update[f"{state}.state"] = FAILED
+            else:
+                update[f"{state}.state"] = PENDING
+                update[f"{state}.next_attempt_at"] = now + timedelta(seconds=backoff(attempts))
+            updates.append(UpdateOne({"id": event["id"], **claimed}, {"$set": update, "$unset": release}))
+        await db.notification_outbox.bulk_write(updates, ordered=False)
+        return 0
+    await db.notification_outbox.update_many(
+        claimed, {"$set": {f"{state}.state": SENT, f"{state}.sent_at": datetime.utcnow()}, "$unset": release})
+    return len(events)
+
+
+async def dispatch_once(db, transports: Dict[str, object], batch_size: int = NOTIFY_BATCH_SIZE) -> Dict[str, int]:
+    sent = {}
+    for channel, transport in transports.items():
+        events = await claim_batch(db, channel, batch_size)
+        if events:
+            sent[channel] = await deliver_batch(db, channel, transport, events)
+    return sent
+
+
+async def run_dispatcher(db, transports: Dict[str, object], interval: float = NOTIFY_INTERVAL) -> None:
+    # Sleeping between rounds is what batches requests that arrive close together
+    while True:
+        try:
+            while True:
+                sent = await dispatch_once(db, transports)
+                if not any(count >= NOTIFY_BATCH_SIZE for count in sent.values()):
+                    break
+        except Exception:
+            logger.exception("Notification dispatch failed")
+        await asyncio.sleep(interval)
+
+
+class EventsQuery:
+    def __init__(
+        self,
+        after: Optional[str] = Query(None, description="Cursor from the previous response"),
+        wait: float = Query(25, ge=0, le=EVENTS_MAX_WAIT, description="Seconds to hold the request open"),
+        service: Optional[List[str]] = Query(None),
+        limit: int = Query(100, ge=1, le=500),
+    ):
+        if after:
+            decode_cursor(after)  # 400 on a malformed cursor before holding the request open
+        self.after = after
+        self.wait = wait
+        self.services = service
+        self.limit = limit
+
+
+async def read_events(db, query: EventsQuery, stopping: Callable[[], bool] = lambda: False) -> dict:
+    """Long-poll: return as soon as there are events after the cursor, or empty after wait seconds.
+
+    Without a cursor the feed starts from now, so a dashboard loads its lists
+    once and then only follows the returned cursor. stopping() ends the wait
+    early so held requests do not delay a worker's shutdown. db must read from the
+    primary; the settle window does not cover replication lag.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + query.wait
+    after = query.after
+    while True:
+        settled = datetime.utcnow() - timedelta(seconds=EVENTS_SETTLE_SECONDS)
+        if after is None:
+            after = encode_cursor({"timestamp": settled, "id": ""})
+        clauses = [{"timestamp": {"$lte": settled}}, keyset_filter(after, "asc")]
+        if query.services:
+            clauses.append({"service": {"$in": query.services}})
+        events = await db.notification_outbox.find(
+            {"$and": clauses},
+            {"_id": 0, "id": 1, "type": 1, "service": 1, "request_id": 1, "name": 1, "status": 1, "timestamp": 1},
+        ).sort(PAGE_SORT["asc"]).limit(query.limit).to_list(None)
+        if events or loop.time() >= deadline or stopping():
+            return {"events": events, "cursor": encode_cursor(events[-1]) if events else after}
+        await asyncio.sleep(min(EVENTS_POLL_INTERVAL, max(0.0, deadline - loop.time())))
@@ -0,0 +1,197 @@
+import base64
+import json
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple, Type
+
+import orjson
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from metrics import timed
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+# Keyset order shared by every list route: timestamp, with id breaking ties
+PAGE_SORT = {
+    "asc": [("timestamp", 1), ("id", 1)],
+    "desc": [("timestamp", -1), ("id", -1)],
+}
+# Exact-match lookups; each is backed by a (field, timestamp, id) index
+FILTER_FIELDS = ("status", "curp", "phone", "service_number", "assignee")
+# Always returned so the next cursor can be built
+CURSOR_FIELDS = ("id", "timestamp")
+
+
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor"),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+        order: str = Query("asc", pattern="^(asc|desc)$"),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    ):
+        self.limit = limit
+        self.after = after
+        self.format = format
+        self.order = order
+        self.fields = tuple(name.strip() for name in fields.split(",") if name.strip()) if fields else None
+
+
+class ListFilters:
+    def __init__(
+        self,
+        status: Optional[str] = Query(None),
+        since: Optional[datetime] = Query(None, description="Created at or after (ISO 8601)"),
+        until: Optional[datetime] = Query(None, description="Created before (ISO 8601)"),
+        curp: Optional[str] = Query(None),
+        phone: Optional[str] = Query(None),
+        service_number: Optional[str] = Query(None),
+        assignee: Optional[str] = Query(None, description="Volunteer holding the case"),
+    ):
+        self.equals = {name: value for name, value in zip(FILTER_FIELDS, (status, curp, phone, service_number, assignee))
+                       if value is not None}
+        if "curp" in self.equals:
+            self.equals["curp"] = self.equals["curp"].upper()
+        self.since = utc_naive(since)
+        self.until = utc_naive(until)
+
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["timestamp"].isoformat(), doc["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_filter(after: Optional[str], order: str = "asc") -> dict:
+    if not after:
+        return {}
+    timestamp, doc_id = decode_cursor(after)
+    op = "$gt" if order == "asc" else "$lt"
+    return {"$or": [
+        {"timestamp": {op: timestamp}},
+        {"timestamp": timestamp, "id": {op: doc_id}},
+    ]}
+
+
+def build_query(model: Type[BaseModel], page: PageParams, filters: Optional[ListFilters] = None) -> dict:
+    clauses = []
+    if filters is not None:
+        unsupported = [name for name in filters.equals if name not in model.model_fields]
+        if unsupported:
+            raise HTTPException(status_code=400, detail=f"Unsupported filter: {', '.join(unsupported)}")
+        if filters.equals:
+            clauses.append(dict(filters.equals))
+        window = {}
+        if filters.since is not None:
+            window["$gte"] = filters.since
+        if filters.until is not None:
+            window["$lt"] = filters.until
+        if window:
+            clauses.append({"timestamp": window})
+    keyset = keyset_filter(page.after, page.order)
+    if keyset:
+        clauses.append(keyset)
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else {}
+
+
+@lru_cache(maxsize=None)
+def model_projection(model: Type[BaseModel]) -> dict:
+    # Only the fields the response model exposes; _id is dropped server-side
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+@lru_cache(maxsize=None)
+def model_defaults(model: Type[BaseModel]) -> dict:
+    # Static defaults for documents written before a field existed
+    return {name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None}
+
+
+def field_projection(model: Type[BaseModel], fields: Optional[Tuple[str, ...]]) -> dict:
+    if not fields:
+        return model_projection(model)
+    unknown = [name for name in fields if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {', '.join(unknown)}")
+    return {"_id": 0, **{name: 1 for name in CURSOR_FIELDS + fields}}
+
+
+def encode_documents(model: Type[BaseModel], docs: List[dict], fields: Optional[Tuple[str, ...]] = None) -> List[dict]:
+    defaults = model_defaults(model)
+    if fields:
+        defaults = {name: value for name, value in defaults.items() if name in fields}
+    if not defaults:
+        return docs
+    return [{**defaults, **doc} for doc in docs]
+
+
+def find_documents(collection, model: Type[BaseModel], page: PageParams, filters: Optional[ListFilters] = None):
+    query = build_query(model, page, filters)
+    return collection.find(query, field_projection(model, page.fields)).sort(PAGE_SORT[page.order])
+
+
+async def fetch_page(collection, model: Type[BaseModel], page: PageParams,
+                     filters: Optional[ListFilters] = None) -> Tuple[List[dict], Optional[str]]:
+    # Ask for one extra document to know whether another page exists
+    docs = await find_documents(collection, model, page, filters).limit(page.limit + 1).to_list(None)
+    if len(docs) <= page.limit:
+        return docs, None
+    docs = docs[:page.limit]
+    return docs, encode_cursor(docs[-1])
+
+
+def encode_ndjson(model: Type[BaseModel], docs: List[dict], fields: Optional[Tuple[str, ...]] = None) -> bytes:
+    with timed("ndjson_serialization"):
+        return b"".join(orjson.dumps(doc) + b"\n" for doc in encode_documents(model, docs, fields))
+
+
+async def stream_ndjson(collection, model: Type[BaseModel], page: PageParams, filters: Optional[ListFilters] = None,
+                        batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[bytes]:
+    cursor = find_documents(collection, model, page, filters).batch_size(batch_size)
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield encode_ndjson(model, batch, page.fields)
+            batch = []
+    if batch:
+        yield encode_ndjson(model, batch, page.fields)
+
+
+async def list_documents(collection, model: Type[BaseModel], page: PageParams,
+                         filters: Optional[ListFilters] = None) -> Response:
+    # Documents go straight from Motor to orjson bytes; they were validated on write
+    if page.format == "ndjson":
+        # Validate filters and fields before the 200 goes out
+        build_query(model, page, filters)
+        field_projection(model, page.fields)
+        return StreamingResponse(stream_ndjson(collection, model, page, filters),
+                                 media_type="application/x-ndjson")
+
+    docs, next_cursor = await fetch_page(collection, model, page, filters)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    with timed("list_serialization"):
+        body = orjson.dumps(encode_documents(model, docs, page.fields))
+    return Response(body, media_type="application/json", headers=headers)
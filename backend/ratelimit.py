@@ -0,0 +1,234 @@
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+import metrics
+
+# Off until the client address is known: behind the ingress every request shares the proxy's socket
+# address, so turn this on together with RATE_LIMIT_PROXY_HOPS or uvicorn --proxy-headers
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+# "memory" keeps buckets per worker; "mongo" shares them across workers and hosts
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Number of trusted proxies that append to X-Forwarded-For (0: use the socket peer, which is also
+# right when uvicorn runs with --proxy-headers --forwarded-allow-ips). Only the entries those proxies
+# added are trusted; anything to their left came from the client and can be forged.
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+
+logger = logging.getLogger(__name__)
+
+rejections = metrics.registry.register(metrics.Counter(
+    "rate_limit_rejections_total", "Requests rejected by per-IP limits (429) or admission control (503)",
+    ("group", "status")))
+in_flight = metrics.registry.register(metrics.Gauge(
+    "admission_in_flight_requests", "API requests currently admitted by this worker"))
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens refilled per second
+    burst: int   # bucket size
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Limit"]:
+        # "<rate>/<burst>", e.g. "0.5/10"; "off" disables the group
+        if value.lower() == "off":
+            return None
+        rate, burst = value.split("/")
+        return cls(float(rate), int(burst))
+
+
+# Route group -> default per-IP limit, overridden with RATE_LIMIT_<GROUP>
+DEFAULT_LIMITS = {
+    "guides": "20/60",
+    "submissions": "0.5/10",
+    "cfdi": "0.5/20",
+    "admin": "10/50",
+}
+
+# Long-poll routes mostly sleep, so they do not count against admission control
+LONG_POLL_PATHS = ("/api/events",)
+
+# Read-only content served from memory
+GUIDE_PATHS = ("/api/", "/api/certificates/links", "/api/tramites/documents", "/api/contact/info")
+
+
+def route_group(method: str, path: str) -> Optional[str]:
+    if not path.startswith("/api/"):
+        return None
+    if path.startswith("/api/cfdi/verify"):
+        return "cfdi"
+    if path.startswith("/api/queue/"):
+        # Volunteers often share one office address; staff actions get the admin budget
+        return "admin"
+    if method in ("GET", "HEAD"):
+        if path in GUIDE_PATHS or path.endswith("guide"):
+            return "guides"
+        return "admin"
+    if method == "OPTIONS":
+        return None
+    return "submissions"
+
+
+def limits_from_env() -> Dict[str, Limit]:
+    limits = {}
+    for group, default in DEFAULT_LIMITS.items():
+        limit = Limit.parse(os.environ.get(f'RATE_LIMIT_{group.upper()}', default))
+        if limit is not None:
+            limits[group] = limit
+    return limits
+
+
+class MemoryBuckets:
+    """Token buckets for one worker process, least recently used keys evicted first."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit) -> float:
+        """Take one token; returns 0 when allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            wait = (1 - tokens) / limit.rate
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # An evicted key starts again with a full bucket, which only errs towards allowing
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class MongoBuckets:
+    """Shared buckets stored as a GCRA theoretical arrival time (the token bucket's equivalent).
+
+    A request costs one or two conditional updates and workers never
+    read-modify-write a bucket. If Mongo is unavailable the request is allowed: limiting must
+    never become the outage.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.time()
+        interval = 1 / limit.rate
+        tolerance = interval * limit.burst
+        expires = datetime.utcnow() + timedelta(seconds=tolerance)
+        try:
+            # Bucket full (or new): the next arrival is one interval from now
+            try:
+                result = await self.collection.update_one(
+                    {"_id": key, "tat": {"$lte": now}},
+                    {"$set": {"tat": now + interval, "expires_at": expires}},
+                    upsert=True,
+                )
+                if result.matched_count or result.upserted_id is not None:
+                    return 0.0
+            except DuplicateKeyError:
+                pass
+            # Partly drained: push the arrival time back while it stays within the burst
+            result = await self.collection.update_one(
+                {"_id": key, "tat": {"$gt": now, "$lte": now + tolerance - interval}},
+                {"$inc": {"tat": interval}, "$set": {"expires_at": expires}},
+            )
+            if result.matched_count:
+                return 0.0
+            doc = await self.collection.find_one({"_id": key})
+        except PyMongoError as e:
+            logger.warning("Rate limit backend unavailable, allowing request: %s", e)
+            return 0.0
+        if doc is None:
+            return 0.0
+        return max(doc["tat"] - now - tolerance + interval, interval / 10)
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Limit], max_in_flight: int, retry_after: int = 2,
+                 proxy_hops: int = RATE_LIMIT_PROXY_HOPS):
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.proxy_hops = proxy_hops
+        self.buckets = MemoryBuckets()
+        self.in_flight = 0
+
+    def bind(self, db) -> None:
+        # Called from the lifespan once the worker has its own Mongo client
+        if RATE_LIMIT_BACKEND == "mongo":
+            self.buckets = MongoBuckets(db.rate_limits)
+
+    def client_ip(self, scope) -> str:
+        if self.proxy_hops:
+            hops = [hop.strip() for name, value in scope["headers"] if name == b"x-forwarded-for"
+                    for hop in value.decode("latin-1").split(",") if hop.strip()]
+            if hops:
+                # The address our outermost trusted proxy saw, counted from the right
+                return hops[max(0, len(hops) - self.proxy_hops)]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+
+async def reject(send, status: int, detail: str, retry_after: int) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"retry-after", str(retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()})
+
+
+class RateLimitMiddleware:
+    """Per-IP token buckets per route group, then a global in-flight cap.
+
+    Both checks run before the request touches Mongo or reads its body, so a
+    client that is being limited costs a dictionary lookup (or a small
+    update with the shared backend).
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limiter = self.limiter
+        group = route_group(scope["method"], scope["path"])
+        if group is None:
+            return await self.app(scope, receive, send)
+
+        limit = limiter.limits.get(group)
+        if limit is not None:
+            wait = await limiter.buckets.take(f"{group}:{limiter.client_ip(scope)}", limit)
+            if wait:
+                rejections.inc(group, "429")
+                return await reject(send, 429, "Demasiadas solicitudes, intenta más tarde", math.ceil(wait))
+
+        if scope["path"] in LONG_POLL_PATHS:
+            return await self.app(scope, receive, send)
+
+        if limiter.in_flight >= limiter.max_in_flight:
+            # Shed here rather than queue on the Motor pool until every request times out
+            rejections.inc(group, "503")
+            return await reject(send, 503, "Servicio temporalmente saturado, intenta de nuevo", limiter.retry_after)
+
+        limiter.in_flight += 1
+        in_flight.set(value=limiter.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight -= 1
+            in_flight.set(value=limiter.in_flight)
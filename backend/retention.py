@@ -0,0 +1,314 @@
+"""Hot/cold tiering for the append-only telemetry collections.
+
+Documents older than TELEMETRY_HOT_DAYS move out of the hot collection into
+zlib-compressed BSON chunks in <collection>_archive, and each archived day
+gets a compact summary in telemetry_daily. /api/analytics/telemetry reads
+summaries for archived days and aggregates the hot collection for the rest.
+Archived CFDI verifications release their cfdi_payloads reference, and
+payloads nothing references any more are deleted; archived records keep
+their result summary, not the XML.
+
+Run from backend/:
+    python retention.py archive
+    python retention.py status
+"""
+import asyncio
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import bson
+import typer
+from fastapi import HTTPException, Query
+from pymongo.errors import DuplicateKeyError
+
+from cfdi_store import release_payloads, sweep_payloads
+from database import with_database
+from pagination import utc_naive
+from rollups import truncate
+
+TELEMETRY_HOT_DAYS = int(os.environ.get('TELEMETRY_HOT_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '5000'))
+RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL', '3600'))
+MAX_TELEMETRY_SPAN = timedelta(days=731)
+
+# Telemetry collection -> field its daily summary is broken down by
+TELEMETRY_GROUPS: Dict[str, str] = {
+    "status_checks": "client_name",
+    "tramite_downloads": "document_type",
+    "cfdi_verifications": "verification_result.is_valid",
+}
+# Run with the documents each archive chunk removed from the hot collection
+ON_ARCHIVE = {
+    "cfdi_verifications": release_payloads,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_name(collection: str) -> str:
+    return f"{collection}_archive"
+
+
+def pack(docs: List[dict]) -> bytes:
+    # BSON keeps datetimes and nested documents exactly as they were stored
+    return zlib.compress(b"".join(bson.encode(doc) for doc in docs), 6)
+
+
+def unpack(payload: bytes) -> List[dict]:
+    return bson.decode_all(zlib.decompress(payload))
+
+
+def group_value(doc: dict, field: str):
+    value = doc
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def count_groups(docs: List[dict], field: str) -> List[dict]:
+    # Stored as a list rather than a dict: values are user input and may contain '.' or '$'
+    counts: Dict = {}
+    for doc in docs:
+        value = group_value(doc, field)
+        counts[value] = counts.get(value, 0) + 1
+    return [{"value": value, "count": count} for value, count in counts.items()]
+
+
+def key_range(first: dict, last: dict) -> dict:
+    # Every hot document between two (timestamp, id) keys, inclusive
+    return {"$and": [
+        {"$or": [{"timestamp": {"$gt": first["timestamp"]}},
+                 {"timestamp": first["timestamp"], "id": {"$gte": first["id"]}}]},
+        {"$or": [{"timestamp": {"$lt": last["timestamp"]}},
+                 {"timestamp": last["timestamp"], "id": {"$lte": last["id"]}}]},
+    ]}
+
+
+async def archive_day(db, collection: str, day: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move one day of hot documents into archive chunks; returns how many moved.
+
+    A chunk is written before its documents are deleted, and its _id is the
+    first document's key, so a run interrupted between the two steps finds
+    the chunk on retry and only finishes the delete.
+    """
+    hot = db[collection]
+    archive = db[archive_name(collection)]
+    window = {"timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}}
+    moved = 0
+    while True:
+        cursor = hot.find(window, {"_id": 0}).sort([("timestamp", 1), ("id", 1)]).limit(batch_size)
+        docs = await cursor.to_list(batch_size)
+        if not docs:
+            return moved
+        first, last = docs[0], docs[-1]
+        chunk = {
+            "_id": f"{day:%Y-%m-%d}:{first['id']}",
+            "day": day,
+            "first": {"timestamp": first["timestamp"], "id": first["id"]},
+            "last": {"timestamp": last["timestamp"], "id": last["id"]},
+            "count": len(docs),
+            "groups": count_groups(docs, TELEMETRY_GROUPS[collection]),
+            "payload": pack(docs),
+            "archived_at": datetime.utcnow(),
+        }
+        try:
+            await archive.insert_one(chunk)
+        except DuplicateKeyError:
+            chunk = await archive.find_one({"_id": chunk["_id"]}, {"payload": 0})
+        await hot.delete_many({**window, **key_range(chunk["first"], chunk["last"])})
+        if collection in ON_ARCHIVE:
+            # After the delete: a crash in between leaks a reference, which is safe, never frees one twice
+            last = (chunk["last"]["timestamp"], chunk["last"]["id"])
+            await ON_ARCHIVE[collection](db, [doc for doc in docs if (doc["timestamp"], doc["id"]) <= last])
+        moved += chunk["count"]
+
+
+async def summarize_day(db, collection: str, day: datetime) -> None:
+    # Rebuilt from the chunks, so re-running after a late straggler is still exact
+    pipeline = [
+        {"$match": {"day": day}},
+        {"$unwind": "$groups"},
+        {"$group": {"_id": "$groups.value", "count": {"$sum": "$groups.count"}}},
+    ]
+    groups = [{"value": row["_id"], "count": row["count"]}
+              async for row in db[archive_name(collection)].aggregate(pipeline)]
+    await db.telemetry_daily.replace_one(
+        {"_id": f"{collection}:{day:%Y-%m-%d}"},
+        {"collection": collection, "day": day, "count": sum(group["count"] for group in groups),
+         "groups": groups, "summarized_at": datetime.utcnow()},
+        upsert=True,
+    )
+
+
+async def close_day(db, collection: str, day: datetime) -> None:
+    await summarize_day(db, collection, day)
+    # Days before the watermark are answered from telemetry_daily alone
+    await db.retention_state.update_one(
+        {"_id": f"watermark:{collection}"},
+        {"$max": {"archived_before": day + timedelta(days=1)}, "$set": {"archived_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+async def unsummarized_days(db, collection: str, before: datetime) -> List[datetime]:
+    # Chunks written by a run that stopped before summarizing their day; that day has no hot
+    # documents left, so the loop below would otherwise move the watermark past it uncounted
+    state = await db.retention_state.find_one({"_id": f"watermark:{collection}"})
+    window = {"$gte": state["archived_before"], "$lt": before} if state else {"$lt": before}
+    return sorted(await db[archive_name(collection)].distinct("day", {"day": window}))
+
+
+async def archive_collection(db, collection: str, hot_days: int = TELEMETRY_HOT_DAYS) -> int:
+    cutoff = day_start(datetime.utcnow()) - timedelta(days=hot_days)
+    moved = 0
+    while True:
+        oldest = await db[collection].find_one({"timestamp": {"$lt": cutoff}}, {"_id": 0, "timestamp": 1},
+                                               sort=[("timestamp", 1), ("id", 1)])
+        for day in await unsummarized_days(db, collection, day_start(oldest["timestamp"]) if oldest else cutoff):
+            await close_day(db, collection, day)
+        if oldest is None:
+            return moved
+        day = day_start(oldest["timestamp"])
+        moved += await archive_day(db, collection, day)
+        await close_day(db, collection, day)
+
+
+async def archive_telemetry(db, hot_days: int = TELEMETRY_HOT_DAYS) -> Dict[str, int]:
+    return {collection: await archive_collection(db, collection, hot_days) for collection in TELEMETRY_GROUPS}
+
+
+async def acquire_archive_lock(db, seconds: float) -> bool:
+    # One worker archives per interval; the others find the lock held and skip
+    now = datetime.utcnow()
+    try:
+        await db.retention_state.update_one(
+            {"_id": "archive_lock", "locked_until": {"$lte": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=seconds), "pid": os.getpid()}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def run_retention(db, interval: float = RETENTION_INTERVAL) -> None:
+    while True:
+        try:
+            if await acquire_archive_lock(db, interval * 0.9):
+                moved = await archive_telemetry(db)
+                if any(moved.values()):
+                    logger.info("Archived telemetry: %s", moved)
+                removed = await sweep_payloads(db)
+                if removed:
+                    logger.info("Removed %d unreferenced CFDI payloads", removed)
+        except Exception:
+            logger.exception("Telemetry archival failed")
+        await asyncio.sleep(interval)
+
+
+class TelemetryQuery:
+    def __init__(
+        self,
+        collection: str = Query(..., pattern=f"^({'|'.join(TELEMETRY_GROUPS)})$"),
+        since: Optional[datetime] = Query(None, description="Range start, UTC (default: 30 days before until)"),
+        until: Optional[datetime] = Query(None, description="Range end, UTC (default: now)"),
+    ):
+        self.collection = collection
+        self.until = utc_naive(until) or datetime.utcnow()
+        self.since = day_start(utc_naive(since) or self.until - timedelta(days=30))
+        if self.since >= self.until:
+            raise HTTPException(status_code=400, detail="since must be before until")
+        if self.until - self.since > MAX_TELEMETRY_SPAN:
+            raise HTTPException(status_code=400, detail="Range too long for day buckets")
+
+
+async def query_telemetry(db, query: TelemetryQuery) -> dict:
+    """Daily counts per group, merged across the summary, archive and hot tiers."""
+    state = await db.retention_state.find_one({"_id": f"watermark:{query.collection}"})
+    watermark = max(query.since, state["archived_before"]) if state else query.since
+    days: Dict[datetime, Dict] = {}
+
+    def add(day: datetime, value, count: int) -> None:
+        groups = days.setdefault(day, {})
+        groups[value] = groups.get(value, 0) + count
+
+    async for summary in db.telemetry_daily.find(
+            {"collection": query.collection, "day": {"$gte": query.since, "$lt": min(watermark, query.until)}}):
+        for group in summary["groups"]:
+            add(summary["day"], group["value"], group["count"])
+
+    if watermark < query.until:
+        # Chunks of a day still being archived, before its summary is written
+        async for row in db[archive_name(query.collection)].aggregate([
+            {"$match": {"day": {"$gte": watermark, "$lt": query.until}}},
+            {"$unwind": "$groups"},
+            {"$group": {"_id": {"day": "$day", "value": "$groups.value"}, "count": {"$sum": "$groups.count"}}},
+        ]):
+            add(row["_id"]["day"], row["_id"]["value"], row["count"])
+        async for row in db[query.collection].aggregate([
+            {"$match": {"timestamp": {"$gte": watermark, "$lt": query.until}}},
+            {"$group": {"_id": {"day": truncate("$timestamp", "day"),
+                                "value": f"${TELEMETRY_GROUPS[query.collection]}"},
+                        "count": {"$sum": 1}}},
+        ]):
+            add(row["_id"]["day"], row["_id"]["value"], row["count"])
+
+    series = []
+    for day in sorted(days):
+        groups = [{"value": value, "count": count} for value, count in days[day].items()]
+        series.append({"day": day, "count": sum(group["count"] for group in groups), "groups": groups})
+    return {
+        "collection": query.collection,
+        "group_by": TELEMETRY_GROUPS[query.collection],
+        "timezone": "UTC",
+        "since": query.since,
+        "until": query.until,
+        "archived_before": state["archived_before"] if state else None,
+        "series": series,
+    }
+
+
+async def retention_status(db) -> Dict[str, dict]:
+    status = {}
+    for collection in TELEMETRY_GROUPS:
+        state = await db.retention_state.find_one({"_id": f"watermark:{collection}"})
+        status[collection] = {
+            "hot": await db[collection].estimated_document_count(),
+            "archived_chunks": await db[archive_name(collection)].estimated_document_count(),
+            "archived_before": state["archived_before"] if state else None,
+        }
+    return status
+
+
+cli = typer.Typer(help="Archive old telemetry out of the hot collections")
+
+
+@cli.command()
+def archive(hot_days: int = typer.Option(TELEMETRY_HOT_DAYS, help="Days kept in the hot collections")):
+    """Move telemetry older than --hot-days into the archive tier."""
+    async def run(db):
+        return await archive_telemetry(db, hot_days), await sweep_payloads(db)
+
+    moved, removed = asyncio.run(with_database(run))
+    for collection, count in moved.items():
+        typer.echo(f"{collection}: archived {count}")
+    typer.echo(f"cfdi_payloads: removed {removed} unreferenced")
+
+
+@cli.command()
+def status():
+    """Show hot document counts, archive chunks and the archive watermark."""
+    for collection, info in asyncio.run(with_database(retention_status)).items():
+        typer.echo(f"{collection}: hot={info['hot']} chunks={info['archived_chunks']} "
+                   f"archived_before={info['archived_before']}")
+
+
+if __name__ == "__main__":
+    cli()
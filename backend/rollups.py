@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import typer
+from fastapi import HTTPException, Query
+from pymongo.errors import DuplicateKeyError
+
+from counters import SERVICE_COLLECTIONS
+from database import with_database
+from pagination import utc_naive
+
+ROLLUP_INTERVAL = float(os.environ.get('ROLLUP_INTERVAL', '300'))
+# Hours before the watermark that are recomputed on every refresh, for writes that land late
+ROLLUP_LATE_HOURS = int(os.environ.get('ROLLUP_LATE_HOURS', '1'))
+MAX_SPAN = {"hour": timedelta(days=31), "day": timedelta(days=731)}
+
+logger = logging.getLogger(__name__)
+
+
+def hour_start(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def truncate(date_expr: str, unit: str) -> dict:
+    # $dateFromParts rather than $dateTrunc so MongoDB < 5.0 works too
+    parts = {"year": {"$year": date_expr}, "month": {"$month": date_expr}, "day": {"$dayOfMonth": date_expr}}
+    if unit == "hour":
+        parts["hour"] = {"$hour": date_expr}
+    return {"$dateFromParts": parts}
+
+
+def hourly_pipeline(service: str, start: datetime, end: datetime) -> List[dict]:
+    return [
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {"service": service, "hour": truncate("$timestamp", "hour"),
+                    "status": "$status", "certificate_type": "$certificate_type"},
+            "count": {"$sum": 1},
+            "donation_sum": {"$sum": {"$ifNull": ["$donation_amount", 0]}},
+            "first_time": {"$sum": {"$cond": [{"$eq": ["$is_first_time", True]}, 1, 0]}},
+            "repeat": {"$sum": {"$cond": [{"$eq": ["$is_first_time", False]}, 1, 0]}},
+        }},
+        # Flat copies of the key so rollups_hourly can be range-scanned by (service, hour)
+        {"$set": {"service": "$_id.service", "hour": "$_id.hour", "status": "$_id.status",
+                  "certificate_type": "$_id.certificate_type"}},
+    ]
+
+
+async def roll_service(db, service: str, start: datetime, end: datetime) -> None:
+    # Buckets in the window are rebuilt whole, so statuses that moved on leave no stale rows
+    await db.rollups_hourly.delete_many({"service": service, "hour": {"$gte": start, "$lt": end}})
+    pipeline = hourly_pipeline(service, start, end) + [
+        {"$merge": {"into": "rollups_hourly", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    await db[SERVICE_COLLECTIONS[service]].aggregate(pipeline).to_list(None)
+
+
+async def changed_hours(db, collection: str, since: datetime, before: datetime) -> List[datetime]:
+    # Hours behind the refresh window holding cases whose status moved since the last run
+    rows = await db[collection].aggregate([
+        {"$match": {"status_changed_at": {"$gte": since}, "timestamp": {"$lt": before}}},
+        {"$group": {"_id": truncate("$timestamp", "hour")}},
+    ]).to_list(None)
+    return sorted(row["_id"] for row in rows)
+
+
+async def earliest_timestamp(db, collection: str) -> Optional[datetime]:
+    doc = await db[collection].find_one({}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1), ("id", 1)])
+    return doc["timestamp"] if doc else None
+
+
+async def refresh_rollups(db, rebuild: bool = False) -> Dict[str, str]:
+    """Roll every service forward from its watermark; rebuild starts from the first document."""
+    now = datetime.utcnow()
+    current_hour = hour_start(now)
+    refreshed = {}
+    for service, collection in SERVICE_COLLECTIONS.items():
+        state = None if rebuild else await db.rollups_state.find_one({"_id": f"watermark:{service}"})
+        if state is not None:
+            start = state["watermark"] - timedelta(hours=ROLLUP_LATE_HOURS)
+            # Otherwise a case verified or completed later keeps counting under its old status
+            for hour in await changed_hours(db, collection, state["refreshed_at"], start):
+                await roll_service(db, service, hour, hour + timedelta(hours=1))
+        else:
+            first = await earliest_timestamp(db, collection)
+            if first is None:
+                continue
+            start = hour_start(first)
+        # The current hour is partial and is recomputed on the next run
+        await roll_service(db, service, start, current_hour + timedelta(hours=1))
+        await db.rollups_state.update_one(
+            {"_id": f"watermark:{service}"},
+            {"$set": {"watermark": current_hour, "refreshed_at": now}},
+            upsert=True,
+        )
+        refreshed[service] = start.isoformat()
+    return refreshed
+
+
+async def acquire_refresh_lock(db, seconds: float) -> bool:
+    # One worker refreshes per interval; the others find the lock held and skip
+    now = datetime.utcnow()
+    try:
+        await db.rollups_state.update_one(
+            {"_id": "refresh_lock", "locked_until": {"$lte": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=seconds), "pid": os.getpid()}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def run_rollups(db, interval: float = ROLLUP_INTERVAL) -> None:
+    while True:
+        try:
+            if await acquire_refresh_lock(db, interval * 0.9):
+                await refresh_rollups(db)
+        except Exception:
+            logger.exception("Rollup refresh failed")
+        await asyncio.sleep(interval)
+
+
+class TimeseriesQuery:
+    def __init__(
+        self,
+        granularity: str = Query("day", pattern="^(hour|day)$"),
+        since: Optional[datetime] = Query(None, description="Range start, UTC (default: 7 days before until)"),
+        until: Optional[datetime] = Query(None, description="Range end, UTC (default: now)"),
+        service: Optional[List[str]] = Query(None),
+        group_by: Optional[str] = Query(None, pattern="^(status|certificate_type)$"),
+    ):
+        self.granularity = granularity
+        self.until = utc_naive(until) or datetime.utcnow()
+        self.since = utc_naive(since) or self.until - timedelta(days=7)
+        if self.since >= self.until:
+            raise HTTPException(status_code=400, detail="since must be before until")
+        if self.until - self.since > MAX_SPAN[granularity]:
+            raise HTTPException(status_code=400, detail=f"Range too long for {granularity} buckets")
+        unknown = [name for name in service or [] if name not in SERVICE_COLLECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown service: {', '.join(unknown)}")
+        self.services = service or list(SERVICE_COLLECTIONS)
+        self.group_by = group_by
+
+
+async def query_timeseries(db, query: TimeseriesQuery) -> dict:
+    bucket = "$hour" if query.granularity == "hour" else truncate("$hour", "day")
+    key = {"bucket": bucket, "service": "$service"}
+    if query.group_by:
+        key[query.group_by] = f"${query.group_by}"
+    pipeline = [
+        {"$match": {"service": {"$in": query.services},
+                    "hour": {"$gte": hour_start(query.since), "$lt": query.until}}},
+        {"$group": {"_id": key, "count": {"$sum": "$count"}, "donation_sum": {"$sum": "$donation_sum"},
+                    "first_time": {"$sum": "$first_time"}, "repeat": {"$sum": "$repeat"}}},
+        {"$sort": {"_id.bucket": 1, "_id.service": 1}},
+    ]
+    series = []
+    async for row in db.rollups_hourly.aggregate(pipeline):
+        point = {**row.pop("_id"), **row}
+        if point["service"] != "cfe":
+            del point["first_time"], point["repeat"]
+        series.append(point)
+
+    states = await db.rollups_state.find({"_id": {"$regex": "^watermark:"}}).to_list(None)
+    return {
+        "granularity": query.granularity,
+        "timezone": "UTC",
+        "since": query.since,
+        "until": query.until,
+        "refreshed_at": min((state["refreshed_at"] for state in states), default=None),
+        "series": series,
+    }
+
+
+cli = typer.Typer(help="Maintain the analytics rollups")
+
+
+@cli.command()
+def refresh():
+    """Roll every service forward from its watermark."""
+    for service, start in asyncio.run(with_database(refresh_rollups)).items():
+        typer.echo(f"{service}: from {start}")
+
+
+@cli.command()
+def rebuild():
+    """Recompute every bucket from the first document (after backfills or status migrations)."""
+    for service, start in asyncio.run(with_database(lambda db: refresh_rollups(db, rebuild=True))).items():
+        typer.echo(f"{service}: from {start}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+import weakref
+from types import FrameType
+from typing import List, Optional
+
+import uvicorn
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import metrics
+from cache import TTLCache
+from cfdi_pool import CFDIWorkerPool
+from indexes import ensure_indexes
+from notifications import run_dispatcher, transports_from_env
+from retention import run_retention
+from rollups import run_rollups
+from settings import MongoSettings
+from work_queue import run_lease_sweeper
+from write_buffer import WriteBuffer
+
+# How long shutdown waits for in-flight requests before flushing and closing anyway
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', '25'))
+
+logger = logging.getLogger(__name__)
+
+
+# Telemetry inserts are batched write-behind instead of one round-trip per click
+def telemetry_buffer(collection):
+    return WriteBuffer(
+        collection,
+        max_batch=int(os.environ.get('WRITE_BUFFER_MAX_BATCH', '500')),
+        flush_interval=float(os.environ.get('WRITE_BUFFER_FLUSH_INTERVAL', '1.0')),
+        max_pending=int(os.environ.get('WRITE_BUFFER_MAX_PENDING', '10000')),
+    )
+
+
+class Resources:
+    """Everything a worker process owns: Mongo client, caches, buffers, pools and tasks.
+
+    Built inside the lifespan, so each forked worker opens its own sockets,
+    threads and CFDI processes instead of inheriting the parent's.
+    """
+
+    def __init__(self, settings: MongoSettings):
+        self.settings = settings
+        self.client = AsyncIOMotorClient(settings.url, event_listeners=metrics.mongo_listeners(),
+                                         **settings.client_kwargs())
+        self.db = self.client[settings.db_name]
+        # Admin lists and analytics tolerate replica lag; submissions read and write through db
+        self.read_db = self.client.get_database(settings.db_name,
+                                                read_preference=settings.admin_read_preference_mode)
+        # Dashboard aggregates are shared by every concurrent viewer for this long
+        self.dashboard_cache = TTLCache("dashboard", float(os.environ.get('DASHBOARD_CACHE_TTL', '5')))
+        self.status_check_buffer = telemetry_buffer(self.db.status_checks)
+        self.download_buffer = telemetry_buffer(self.db.tramite_downloads)
+        # CPU-heavy CFDI parsing runs in worker processes off the event loop
+        self.cfdi_pool = CFDIWorkerPool()
+        # Channel -> transport for the notification dispatcher
+        self.transports = transports_from_env()
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if os.environ.get('ENSURE_INDEXES', 'true').lower() == 'true':
+            await ensure_indexes(self.db)
+        self.status_check_buffer.start()
+        self.download_buffer.start()
+        self.cfdi_pool.start()
+        self.background(metrics.monitor_loop_lag())
+        self.background(run_lease_sweeper(self.db))
+        self.background(run_rollups(self.db))
+        self.background(run_retention(self.db))
+        self.background(run_dispatcher(self.db, self.transports))
+
+    def background(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.append(task)
+        return task
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        await self.status_check_buffer.drain()
+        await self.download_buffer.drain()
+        self.cfdi_pool.shutdown()
+        self.client.close()
+
+
+class RequestDrain:
+    """Counts in-flight HTTP requests and flags the worker as draining once it is told to stop.
+
+    uvicorn waits for (or cancels) running requests before the lifespan
+    shutdown starts, so the flag has to be raised by the signal itself for
+    late keep-alive requests and long-polls to see it in time; DrainingServer
+    does that.
+    """
+
+    # Every drain in this worker process, for DrainingServer to flag
+    instances: "weakref.WeakSet[RequestDrain]" = weakref.WeakSet()
+
+    def __init__(self, retry_after: int = 2):
+        self.in_flight = 0
+        self.draining = False
+        self.retry_after = retry_after
+        RequestDrain.instances.add(self)
+
+    async def wait_idle(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> bool:
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.in_flight:
+            logger.warning("Shutting down with %d request(s) still in flight", self.in_flight)
+        return self.in_flight == 0
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn Server that starts draining on SIGINT/SIGTERM, before uvicorn's own shutdown.
+
+    handle_exit is the callback uvicorn installs for those signals. Under a
+    plain `uvicorn` command the lifespan shutdown still drains, just later.
+    """
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        for drain in RequestDrain.instances:
+            drain.draining = True
+        super().handle_exit(sig, frame)
+
+
+class DrainMiddleware:
+    def __init__(self, app, drain: RequestDrain):
+        self.app = app
+        self.drain = drain
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if self.drain.draining:
+            # Keep-alive connections can still deliver requests after SIGTERM
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(self.drain.retry_after).encode()),
+                (b"connection", b"close"),
+            ]})
+            await send({"type": "http.response.body", "body": b'{"detail":"Servidor reiniciando, intenta de nuevo"}'})
+            return
+
+        self.drain.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.drain.in_flight -= 1
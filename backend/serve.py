@@ -0,0 +1,36 @@
+"""Run the API under uvicorn, one app (and Mongo client) per worker process.
+
+Run from backend/:
+    python serve.py --host 0.0.0.0 --port 8001 --workers 4 --timeout-graceful-shutdown 30
+
+Equivalent to `uvicorn server:create_app --factory ...` except that each
+worker uses DrainingServer, so SIGTERM flags the drain right away instead
+of only once the lifespan shutdown starts.
+"""
+import typer
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from runtime import DrainingServer
+
+
+def main(
+    host: str = typer.Option("127.0.0.1", help="Interface to bind"),
+    port: int = typer.Option(8001, help="Port to bind"),
+    workers: int = typer.Option(1, help="Worker processes"),
+    timeout_graceful_shutdown: int = typer.Option(30, help="Seconds running requests get after SIGTERM"),
+    log_level: str = typer.Option("info", help="uvicorn log level"),
+):
+    """Serve server:create_app with early request draining on SIGINT/SIGTERM."""
+    config = uvicorn.Config("server:create_app", factory=True, host=host, port=port, workers=workers,
+                            timeout_graceful_shutdown=timeout_graceful_shutdown, log_level=log_level)
+    server = DrainingServer(config)
+    if config.workers > 1:
+        # Same supervisor `uvicorn --workers` uses, with our Server in every worker
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,27 +1,47 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body, Header, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ConnectionFailure
 import os
+import json
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, List, Optional
 import uuid
 from datetime import datetime
-import re
+
+from pagination import ListFilters, PageParams, list_documents
+from counters import get_totals, record_created, record_status_change
+from batch import BatchResult, create_batch_once
+from validators import CURP, NSS, BirthDate, Email, format_error_message
+from cfdi import CFDIError, document_digest
+from cfdi_pool import PoolSaturated
+from cfdi_batch import read_uploads, verify_documents
+from cfdi_store import CFDI_STORE_BATCH_SIZE, invoice_checks, result_summary, store_payload, store_payloads
+from static_content import StaticPayload
+from idempotency import REPLAY_HEADER, submit_once
+from rollups import TimeseriesQuery, query_timeseries
+from retention import TelemetryQuery, query_telemetry
+from export import MEDIA_TYPES, ExportParams, export_filename, stream_export
+from notifications import EventsQuery, enqueue_notifications, read_events
+from work_queue import (ClaimRequest, ClaimedCase, Lease, LeaseRequest, VolunteerAction, claim_next,
+                        complete_case, release_lease, renew_lease)
+from settings import MongoSettings
+from runtime import DrainMiddleware, RequestDrain, Resources
+from ratelimit import RATE_LIMIT_ENABLED, RateLimiter, RateLimitMiddleware, limits_from_env
+import metrics
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI(title="HUMANIDAD UNIDA API", description="Sistema integral de ayuda humanitaria")
+# Built per worker process by the lifespan, never at import time
+resources: Optional[Resources] = None
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -46,7 +66,9 @@ class CFERequest(BaseModel):
     phone: str
     donation_amount: float  # 10 or 20
     is_first_time: bool
-    status: str = "pending"  # pending, verified, completed
+    status: str = "pending"  # pending, in_progress, verified, completed
+    assignee: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class CFERequestCreate(BaseModel):
@@ -77,18 +99,21 @@ class FiscalRequest(BaseModel):
     user_name: str
     phone: str
     status: str = "pending"
+    assignee: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class FiscalRequestCreate(BaseModel):
-    curp: str
+    curp: CURP
     user_name: str
     phone: str
 
 # CFDI Models
 class CFDIVerification(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    xml_content: str
-    verification_result: dict
+    payload_id: str  # SHA-256 of the document in cfdi_payloads
+    uuid: Optional[str] = None
+    verification_result: dict  # is_valid/status/uuid only
     user_ip: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -129,13 +154,15 @@ class IMSSSemanasRequest(BaseModel):
     birth_date: str  # Simple string format DD/MM/YYYY
     phone: str
     status: str = "pending"
+    assignee: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class IMSSSemanasRequestCreate(BaseModel):
-    nss: str
-    curp: str
+    nss: NSS
+    curp: CURP
     user_name: str
-    birth_date: str
+    birth_date: BirthDate
     phone: str
 
 # Email Recovery Models (Ultra-Simple for elderly)
@@ -149,14 +176,16 @@ class EmailRecoveryRequest(BaseModel):
     email_provider: str  # Gmail, Outlook, Yahoo, etc.
     additional_info: str = ""  # Any additional info they remember
     status: str = "pending"
+    assignee: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class EmailRecoveryRequestCreate(BaseModel):
-    email_to_recover: str
+    email_to_recover: Email
     user_name: str
-    birth_date: str
+    birth_date: BirthDate
     phone: str
-    curp: str
+    curp: CURP
     email_provider: str
     additional_info: Optional[str] = ""
 
@@ -172,150 +201,243 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    await resources.status_check_buffer.put(status_obj.dict())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(page: PageParams = Depends(), filters: ListFilters = Depends()):
+    return await list_documents(resources.read_db.status_checks, StatusCheck, page, filters)
 
 # ========== CFE ROUTES ==========
-@api_router.post("/cfe/request", response_model=CFERequest)
-async def create_cfe_request(request: CFERequestCreate):
+def build_cfe_request(request: CFERequestCreate) -> CFERequest:
     # Determine donation amount based on whether it's first time
     donation_amount = 10.0 if request.is_first_time else 20.0
     
     cfe_dict = request.dict()
     cfe_dict['donation_amount'] = donation_amount
-    cfe_obj = CFERequest(**cfe_dict)
-    
-    await db.cfe_requests.insert_one(cfe_obj.dict())
-    return cfe_obj
+    return CFERequest(**cfe_dict)
+
+@api_router.post("/cfe/request", response_model=CFERequest)
+async def create_cfe_request(request: CFERequestCreate, response: Response,
+                             idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        cfe_obj = build_cfe_request(request)
+        cfe_doc = cfe_obj.dict()
+        await resources.db.cfe_requests.insert_one(cfe_doc)
+        await record_created(resources.db, "cfe", cfe_doc)
+        await enqueue_notifications(resources.db, "cfe", cfe_doc)
+        return cfe_obj.dict()
+
+    # Repeated taps for the same service number inside the window return the first request
+    result, replayed = await submit_once(resources.db, "cfe", request.dict(), create,
+                                         idempotency_key, natural_key=request.service_number)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
+@api_router.post("/cfe/requests:batch", response_model=BatchResult)
+async def create_cfe_requests_batch(response: Response, items: List[Any] = Body(...),
+                                    idempotency_key: Optional[str] = Header(None)):
+    result, replayed = await create_batch_once(resources.db, "cfe_requests", "cfe", items,
+                                               CFERequestCreate, build_cfe_request, idempotency_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
 
 @api_router.get("/cfe/requests", response_model=List[CFERequest])
-async def get_cfe_requests():
-    requests = await db.cfe_requests.find().to_list(1000)
-    return [CFERequest(**req) for req in requests]
+async def get_cfe_requests(page: PageParams = Depends(), filters: ListFilters = Depends()):
+    return await list_documents(resources.read_db.cfe_requests, CFERequest, page, filters)
 
 @api_router.put("/cfe/request/{request_id}/verify")
 async def verify_cfe_request(request_id: str):
-    result = await db.cfe_requests.update_one(
+    previous = await resources.db.cfe_requests.find_one_and_update(
         {"id": request_id},
-        {"$set": {"status": "verified"}}
+        {"$set": {"status": "verified", "status_changed_at": datetime.utcnow()}},
+        projection={"_id": 0, "status": 1}
     )
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Request not found")
+    await record_status_change(resources.db, "cfe", previous.get("status"), "verified")
     return {"message": "Request verified successfully"}
 
 # ========== CERTIFICADOS ROUTES ==========
+def build_certificate_request(request: CertificateRequestCreate) -> CertificateRequest:
+    cert_dict = request.dict()
+    return CertificateRequest(**cert_dict)
+
 @api_router.post("/certificates/request", response_model=CertificateRequest)
 async def create_certificate_request(request: CertificateRequestCreate):
-    cert_dict = request.dict()
-    cert_obj = CertificateRequest(**cert_dict)
+    cert_obj = build_certificate_request(request)
     
-    await db.certificate_requests.insert_one(cert_obj.dict())
+    cert_doc = cert_obj.dict()
+    await resources.db.certificate_requests.insert_one(cert_doc)
+    await record_created(resources.db, "certificates", cert_doc)
+    await enqueue_notifications(resources.db, "certificates", cert_doc)
     return cert_obj
 
+@api_router.post("/certificates/requests:batch", response_model=BatchResult)
+async def create_certificate_requests_batch(response: Response, items: List[Any] = Body(...),
+                                            idempotency_key: Optional[str] = Header(None)):
+    result, replayed = await create_batch_once(resources.db, "certificate_requests", "certificates", items,
+                                               CertificateRequestCreate, build_certificate_request, idempotency_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
 @api_router.get("/certificates/requests", response_model=List[CertificateRequest])
-async def get_certificate_requests():
-    requests = await db.certificate_requests.find().to_list(1000)
-    return [CertificateRequest(**req) for req in requests]
+async def get_certificate_requests(page: PageParams = Depends(), filters: ListFilters = Depends()):
+    return await list_documents(resources.read_db.certificate_requests, CertificateRequest, page, filters)
+
+CERTIFICATE_LINKS = StaticPayload({
+    "SEP": "https://www.gob.mx/sep",
+    "INEA": "https://certificados.inea.gob.mx/Consulta",
+    "CDMX": "https://certificacion.cdmx.gob.mx/",
+    "Puebla": "https://sisep.puebla.gob.mx/certificados"
+})
 
 @api_router.get("/certificates/links")
-async def get_certificate_links():
-    return {
-        "SEP": "https://www.gob.mx/sep",
-        "INEA": "https://certificados.inea.gob.mx/Consulta",
-        "CDMX": "https://certificacion.cdmx.gob.mx/",
-        "Puebla": "https://sisep.puebla.gob.mx/certificados"
-    }
+async def get_certificate_links(request: Request):
+    return CERTIFICATE_LINKS.response(request)
 
 # ========== FISCAL ROUTES ==========
+def build_fiscal_request(request: FiscalRequestCreate) -> FiscalRequest:
+    # CURP is validated and upper-cased by FiscalRequestCreate
+    fiscal_dict = request.dict()
+    return FiscalRequest(**fiscal_dict)
+
 @api_router.post("/fiscal/request", response_model=FiscalRequest)
 async def create_fiscal_request(request: FiscalRequestCreate):
-    # Validate CURP format
-    curp_pattern = r'^[A-Z]{4}[0-9]{6}[HM][A-Z]{5}[0-9A-Z][0-9]$'
-    if not re.match(curp_pattern, request.curp.upper()):
-        raise HTTPException(status_code=400, detail="CURP format is invalid")
-    
-    fiscal_dict = request.dict()
-    fiscal_dict['curp'] = fiscal_dict['curp'].upper()
-    fiscal_obj = FiscalRequest(**fiscal_dict)
+    fiscal_obj = build_fiscal_request(request)
     
-    await db.fiscal_requests.insert_one(fiscal_obj.dict())
+    fiscal_doc = fiscal_obj.dict()
+    await resources.db.fiscal_requests.insert_one(fiscal_doc)
+    await record_created(resources.db, "fiscal", fiscal_doc)
+    await enqueue_notifications(resources.db, "fiscal", fiscal_doc)
     return fiscal_obj
 
+@api_router.post("/fiscal/requests:batch", response_model=BatchResult)
+async def create_fiscal_requests_batch(response: Response, items: List[Any] = Body(...),
+                                       idempotency_key: Optional[str] = Header(None)):
+    result, replayed = await create_batch_once(resources.db, "fiscal_requests", "fiscal", items,
+                                               FiscalRequestCreate, build_fiscal_request, idempotency_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
 @api_router.get("/fiscal/requests", response_model=List[FiscalRequest])
-async def get_fiscal_requests():
-    requests = await db.fiscal_requests.find().to_list(1000)
-    return [FiscalRequest(**req) for req in requests]
+async def get_fiscal_requests(page: PageParams = Depends(), filters: ListFilters = Depends()):
+    return await list_documents(resources.read_db.fiscal_requests, FiscalRequest, page, filters)
+
+SAT_GUIDE = StaticPayload({
+    "steps": [
+        "Ingresa a www.sat.gob.mx",
+        "Selecciona 'Personas Físicas'",
+        "Busca 'Constancia de Situación Fiscal'",
+        "Ingresa tu CURP y datos personales",
+        "Descarga tu constancia en PDF"
+    ],
+    "sat_url": "https://www.sat.gob.mx/personas/constancia-de-situacion-fiscal",
+    "requirements": ["CURP", "Correo electrónico", "Datos personales actualizados"]
+})
 
 @api_router.get("/fiscal/sat-guide")
-async def get_sat_guide():
-    return {
-        "steps": [
-            "Ingresa a www.sat.gob.mx",
-            "Selecciona 'Personas Físicas'",
-            "Busca 'Constancia de Situación Fiscal'",
-            "Ingresa tu CURP y datos personales",
-            "Descarga tu constancia en PDF"
-        ],
-        "sat_url": "https://www.sat.gob.mx/personas/constancia-de-situacion-fiscal",
-        "requirements": ["CURP", "Correo electrónico", "Datos personales actualizados"]
-    }
+async def get_sat_guide(request: Request):
+    return SAT_GUIDE.response(request)
 
 # ========== CFDI ROUTES ==========
 @api_router.post("/cfdi/verify")
 async def verify_cfdi(request: CFDIVerificationCreate, user_ip: str = ""):
-    # This is a simplified CFDI verification - in production you'd integrate with SAT
+    # Parses the Comprobante and TimbreFiscalDigital nodes; SAT cancellation status is not queried
     try:
-        # Basic XML validation
-        if not request.xml_content.strip().startswith('<?xml'):
-            raise HTTPException(status_code=400, detail="Invalid XML format")
-        
-        # Simulate verification result
-        verification_result = {
-            "is_valid": True,
-            "status": "Activo",
-            "rfc_emisor": "XAXX010101000",
-            "rfc_receptor": "XAXX010101000",
-            "fecha_emision": datetime.utcnow().isoformat(),
-            "warnings": ["Este es un ejemplo de verificación"]
-        }
-        
-        cfdi_obj = CFDIVerification(
-            xml_content=request.xml_content[:1000],  # Store only first 1000 chars
-            verification_result=verification_result,
-            user_ip=user_ip
-        )
-        
-        await db.cfdi_verifications.insert_one(cfdi_obj.dict())
-        return verification_result
-        
-    except Exception as e:
+        # Pasted XML often starts with a blank line, which the parser rejects before the declaration
+        data = request.xml_content.lstrip().encode("utf-8")
+        verification_result = await resources.cfdi_pool.verify(data)
+    except CFDIError as e:
         raise HTTPException(status_code=400, detail=f"Error processing CFDI: {str(e)}")
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    cfdi_obj = CFDIVerification(
+        payload_id=await store_payload(resources.db, data, verification_result),
+        uuid=verification_result.get("uuid"),
+        verification_result=result_summary(verification_result),
+        user_ip=user_ip
+    )
+    
+    await resources.db.cfdi_verifications.insert_one(cfdi_obj.dict())
+    return verification_result
+
+@api_router.post("/cfdi/verify/batch")
+async def verify_cfdi_batch(request: Request, user_ip: str = ""):
+    # Multipart XML/ZIP parts or a raw ZIP body; results stream back as NDJSON
+    uploads, close_uploads = await read_uploads(request)
+    verifications = []
+    payloads = []
+    
+    async def store_pending():
+        batch = payloads[:]
+        payloads.clear()
+        await store_payloads(resources.db, batch)
+    
+    async def collect(name: str, data: bytes, result: dict):
+        verifications.append(CFDIVerification(
+            payload_id=document_digest(data),
+            uuid=result.get("uuid"),
+            verification_result=result_summary(result),
+            user_ip=user_ip
+        ).dict())
+        payloads.append((data, result))
+        if len(payloads) >= CFDI_STORE_BATCH_SIZE:
+            await store_pending()
+    
+    async def stream():
+        try:
+            async for line in verify_documents(uploads, resources.cfdi_pool, collect):
+                yield line
+        finally:
+            await close_uploads()
+        await store_pending()
+        if verifications:
+            await resources.db.cfdi_verifications.insert_many(verifications, ordered=False)
+        valid = sum(1 for v in verifications if v["verification_result"].get("is_valid"))
+        yield (json.dumps({"summary": {"verified": len(verifications), "valid": valid}}) + "\n").encode()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@api_router.get("/cfdi/checks/{cfdi_uuid}")
+async def get_cfdi_checks(cfdi_uuid: str):
+    # Repeat checks of one invoice are a fraud signal
+    checks = await invoice_checks(resources.read_db, cfdi_uuid)
+    if checks is None:
+        raise HTTPException(status_code=404, detail="CFDI no verificado")
+    return checks
+
+@api_router.get("/cfdi/pool-stats")
+async def get_cfdi_pool_stats():
+    return resources.cfdi_pool.stats()
+
+FRAUD_GUIDE = StaticPayload({
+    "common_frauds": [
+        "Facturas falsas con sellos inexistentes",
+        "Empresas fantasma sin domicilio real",
+        "CFDIs con datos fiscales incorrectos",
+        "Solicitudes de dinero para 'activar' facturas"
+    ],
+    "verification_tips": [
+        "Siempre verifica el sello digital en el SAT",
+        "Confirma que la empresa emisora existe",
+        "No compartas tu RFC con desconocidos",
+        "Nunca pagues por servicios gratuitos del SAT"
+    ],
+    "official_links": {
+        "sat_verification": "https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx",
+        "rfc_validation": "https://www.sat.gob.mx/consulta/23487/consulta-tu-clave-de-rfc"
+    }
+})
 
 @api_router.get("/cfdi/fraud-guide")
-async def get_fraud_guide():
-    return {
-        "common_frauds": [
-            "Facturas falsas con sellos inexistentes",
-            "Empresas fantasma sin domicilio real",
-            "CFDIs con datos fiscales incorrectos",
-            "Solicitudes de dinero para 'activar' facturas"
-        ],
-        "verification_tips": [
-            "Siempre verifica el sello digital en el SAT",
-            "Confirma que la empresa emisora existe",
-            "No compartas tu RFC con desconocidos",
-            "Nunca pagues por servicios gratuitos del SAT"
-        ],
-        "official_links": {
-            "sat_verification": "https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx",
-            "rfc_validation": "https://www.sat.gob.mx/consulta/23487/consulta-tu-clave-de-rfc"
-        }
-    }
+async def get_fraud_guide(request: Request):
+    return FRAUD_GUIDE.response(request)
 
 # ========== TRAMITES ROUTES ==========
 @api_router.post("/tramites/download")
@@ -325,215 +447,279 @@ async def register_download(request: TramiteDownloadCreate, user_ip: str = ""):
         user_ip=user_ip
     )
     
-    await db.tramite_downloads.insert_one(download_obj.dict())
+    await resources.download_buffer.put(download_obj.dict())
     return {"message": f"Download registered for {request.document_type}"}
 
+AVAILABLE_DOCUMENTS = StaticPayload({
+    "formats": [
+        {
+            "type": "CURP",
+            "name": "Formato de CURP",
+            "description": "Formato oficial para obtener tu CURP",
+            "url": "https://www.gob.mx/curp/"
+        },
+        {
+            "type": "NSS",
+            "name": "Número de Seguridad Social",
+            "description": "Consulta tu NSS del IMSS",
+            "url": "http://www.imss.gob.mx/servicios/consultanss"
+        },
+        {
+            "type": "ACTA",
+            "name": "Acta de Nacimiento",
+            "description": "Solicitud de acta de nacimiento",
+            "url": "https://www.gob.mx/ActaNacimiento/"
+        },
+        {
+            "type": "AFORE",
+            "name": "Estado de Cuenta AFORE",
+            "description": "Consulta tu cuenta de AFORE",
+            "url": "https://www.gob.mx/consar/acciones-y-programas/estado-de-cuenta-afore"
+        },
+        {
+            "type": "SEMANAS",
+            "name": "Semanas Cotizadas",
+            "description": "Consulta semanas cotizadas IMSS",
+            "url": "http://www.imss.gob.mx/servicios/semanascotizadas"
+        }
+    ]
+})
+
 @api_router.get("/tramites/documents")
-async def get_available_documents():
-    return {
-        "formats": [
-            {
-                "type": "CURP",
-                "name": "Formato de CURP",
-                "description": "Formato oficial para obtener tu CURP",
-                "url": "https://www.gob.mx/curp/"
-            },
-            {
-                "type": "NSS",
-                "name": "Número de Seguridad Social",
-                "description": "Consulta tu NSS del IMSS",
-                "url": "http://www.imss.gob.mx/servicios/consultanss"
-            },
-            {
-                "type": "ACTA",
-                "name": "Acta de Nacimiento",
-                "description": "Solicitud de acta de nacimiento",
-                "url": "https://www.gob.mx/ActaNacimiento/"
-            },
-            {
-                "type": "AFORE",
-                "name": "Estado de Cuenta AFORE",
-                "description": "Consulta tu cuenta de AFORE",
-                "url": "https://www.gob.mx/consar/acciones-y-programas/estado-de-cuenta-afore"
-            },
-            {
-                "type": "SEMANAS",
-                "name": "Semanas Cotizadas",
-                "description": "Consulta semanas cotizadas IMSS",
-                "url": "http://www.imss.gob.mx/servicios/semanascotizadas"
-            }
-        ]
-    }
+async def get_available_documents(request: Request):
+    return AVAILABLE_DOCUMENTS.response(request)
 
 # ========== CONTACT ROUTES ==========
+def build_contact_message(request: ContactMessageCreate) -> ContactMessage:
+    return ContactMessage(**request.dict())
+
 @api_router.post("/contact/message", response_model=ContactMessage)
 async def create_contact_message(request: ContactMessageCreate):
-    contact_obj = ContactMessage(**request.dict())
-    await db.contact_messages.insert_one(contact_obj.dict())
+    contact_obj = build_contact_message(request)
+    contact_doc = contact_obj.dict()
+    await resources.db.contact_messages.insert_one(contact_doc)
+    await record_created(resources.db, "contacts", contact_doc)
+    await enqueue_notifications(resources.db, "contacts", contact_doc)
     return contact_obj
 
+@api_router.post("/contact/messages:batch", response_model=BatchResult)
+async def create_contact_messages_batch(response: Response, items: List[Any] = Body(...),
+                                        idempotency_key: Optional[str] = Header(None)):
+    result, replayed = await create_batch_once(resources.db, "contact_messages", "contacts", items,
+                                               ContactMessageCreate, build_contact_message, idempotency_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
+CONTACT_INFO = StaticPayload({
+    "whatsapp": "525659952408",
+    "whatsapp_url": "https://wa.me/525659952408",
+    "email": "luisgomez92ux5@gmail.com",
+    "business_hours": "Lunes a Viernes 9:00 AM - 6:00 PM",
+    "response_time": "24 horas máximo"
+})
+
 @api_router.get("/contact/info")
-async def get_contact_info():
-    return {
-        "whatsapp": "525659952408",
-        "whatsapp_url": "https://wa.me/525659952408",
-        "email": "luisgomez92ux5@gmail.com",
-        "business_hours": "Lunes a Viernes 9:00 AM - 6:00 PM",
-        "response_time": "24 horas máximo"
-    }
+async def get_contact_info(request: Request):
+    return CONTACT_INFO.response(request)
 
 # ========== IMSS SEMANAS ROUTES (Ultra-Simple for Elderly) ==========
-@api_router.post("/imss/semanas/request", response_model=IMSSSemanasRequest)
-async def create_imss_semanas_request(request: IMSSSemanasRequestCreate):
-    # Validate NSS format (11 digits)
-    if not re.match(r'^\d{11}$', request.nss):
-        raise HTTPException(status_code=400, detail="NSS debe tener exactamente 11 números")
-    
-    # Validate CURP format
-    curp_pattern = r'^[A-Z]{4}[0-9]{6}[HM][A-Z]{5}[0-9A-Z][0-9]$'
-    if not re.match(curp_pattern, request.curp.upper()):
-        raise HTTPException(status_code=400, detail="CURP inválida")
-    
-    # Validate birth date format DD/MM/YYYY
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', request.birth_date):
-        raise HTTPException(status_code=400, detail="Fecha debe ser DD/MM/YYYY")
-    
+def build_imss_semanas_request(request: IMSSSemanasRequestCreate) -> IMSSSemanasRequest:
+    # NSS, CURP and birth date are validated by IMSSSemanasRequestCreate
     imss_dict = request.dict()
-    imss_dict['curp'] = imss_dict['curp'].upper()
-    imss_obj = IMSSSemanasRequest(**imss_dict)
-    
-    await db.imss_semanas_requests.insert_one(imss_obj.dict())
-    return imss_obj
+    return IMSSSemanasRequest(**imss_dict)
+
+@api_router.post("/imss/semanas/request", response_model=IMSSSemanasRequest)
+async def create_imss_semanas_request(request: IMSSSemanasRequestCreate, response: Response,
+                                      idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        imss_obj = build_imss_semanas_request(request)
+        imss_doc = imss_obj.dict()
+        await resources.db.imss_semanas_requests.insert_one(imss_doc)
+        await record_created(resources.db, "imss_semanas", imss_doc)
+        await enqueue_notifications(resources.db, "imss_semanas", imss_doc)
+        return imss_obj.dict()
+
+    result, replayed = await submit_once(resources.db, "imss_semanas", request.dict(), create,
+                                         idempotency_key, natural_key=request.curp)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
+@api_router.post("/imss/semanas/requests:batch", response_model=BatchResult)
+async def create_imss_semanas_requests_batch(response: Response, items: List[Any] = Body(...),
+                                             idempotency_key: Optional[str] = Header(None)):
+    result, replayed = await create_batch_once(resources.db, "imss_semanas_requests", "imss_semanas", items,
+                                               IMSSSemanasRequestCreate, build_imss_semanas_request, idempotency_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
+IMSS_SEMANAS_GUIDE = StaticPayload({
+    "title": "Consultar Semanas Cotizadas IMSS - Guía Súper Simple",
+    "what_you_need": [
+        "Tu Número de Seguridad Social (NSS) - 11 números",
+        "Tu CURP - 18 letras y números",
+        "Tu nombre completo como aparece en documentos",
+        "Tu fecha de nacimiento DD/MM/YYYY"
+    ],
+    "simple_steps": [
+        "1. Ingresa SOLO tu NSS (11 números sin espacios)",
+        "2. Escribe tu CURP completa (18 caracteres)",
+        "3. Pon tu nombre igual que en tu INE",
+        "4. Escribe tu fecha de nacimiento DD/MM/YYYY",
+        "5. Da clic en 'CONSULTAR MIS SEMANAS'",
+        "6. Te ayudaremos por WhatsApp si tienes dudas"
+    ],
+    "official_link": "http://www.imss.gob.mx/servicios/semanascotizadas",
+    "help_message": "📱 Si necesitas ayuda, mándanos mensaje por WhatsApp: +52 5659 952408",
+    "important_notes": [
+        "🔴 NUNCA pagues por esta consulta - es GRATIS en el IMSS",
+        "🔴 NO des datos a personas que te llamen por teléfono",
+        "✅ Solo usa el sitio oficial del IMSS: imss.gob.mx",
+        "✅ Te ayudamos gratis, no cobramos nada"
+    ]
+})
 
 @api_router.get("/imss/semanas/guide")
-async def get_imss_semanas_guide():
-    return {
-        "title": "Consultar Semanas Cotizadas IMSS - Guía Súper Simple",
-        "what_you_need": [
-            "Tu Número de Seguridad Social (NSS) - 11 números",
-            "Tu CURP - 18 letras y números",
-            "Tu nombre completo como aparece en documentos",
-            "Tu fecha de nacimiento DD/MM/YYYY"
-        ],
-        "simple_steps": [
-            "1. Ingresa SOLO tu NSS (11 números sin espacios)",
-            "2. Escribe tu CURP completa (18 caracteres)",
-            "3. Pon tu nombre igual que en tu INE",
-            "4. Escribe tu fecha de nacimiento DD/MM/YYYY",
-            "5. Da clic en 'CONSULTAR MIS SEMANAS'",
-            "6. Te ayudaremos por WhatsApp si tienes dudas"
-        ],
-        "official_link": "http://www.imss.gob.mx/servicios/semanascotizadas",
-        "help_message": "📱 Si necesitas ayuda, mándanos mensaje por WhatsApp: +52 5659 952408",
-        "important_notes": [
-            "🔴 NUNCA pagues por esta consulta - es GRATIS en el IMSS",
-            "🔴 NO des datos a personas que te llamen por teléfono",
-            "✅ Solo usa el sitio oficial del IMSS: imss.gob.mx",
-            "✅ Te ayudamos gratis, no cobramos nada"
-        ]
-    }
+async def get_imss_semanas_guide(request: Request):
+    return IMSS_SEMANAS_GUIDE.response(request)
 
 @api_router.get("/imss/semanas/requests", response_model=List[IMSSSemanasRequest])
-async def get_imss_semanas_requests():
-    requests = await db.imss_semanas_requests.find().to_list(1000)
-    return [IMSSSemanasRequest(**req) for req in requests]
+async def get_imss_semanas_requests(page: PageParams = Depends(), filters: ListFilters = Depends()):
+    return await list_documents(resources.read_db.imss_semanas_requests, IMSSSemanasRequest, page, filters)
 
 # ========== EMAIL RECOVERY ROUTES (Ultra-Simple for Elderly) ==========
-@api_router.post("/email/recovery/request", response_model=EmailRecoveryRequest)
-async def create_email_recovery_request(request: EmailRecoveryRequestCreate):
-    # Validate email format
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(email_pattern, request.email_to_recover):
-        raise HTTPException(status_code=400, detail="Formato de email inválido")
-    
-    # Validate CURP format
-    curp_pattern = r'^[A-Z]{4}[0-9]{6}[HM][A-Z]{5}[0-9A-Z][0-9]$'
-    if not re.match(curp_pattern, request.curp.upper()):
-        raise HTTPException(status_code=400, detail="CURP inválida")
-    
-    # Validate birth date format DD/MM/YYYY
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', request.birth_date):
-        raise HTTPException(status_code=400, detail="Fecha debe ser DD/MM/YYYY")
-    
+def build_email_recovery_request(request: EmailRecoveryRequestCreate) -> EmailRecoveryRequest:
+    # Email, CURP and birth date are validated by EmailRecoveryRequestCreate
     recovery_dict = request.dict()
-    recovery_dict['curp'] = recovery_dict['curp'].upper()
-    recovery_obj = EmailRecoveryRequest(**recovery_dict)
-    
-    await db.email_recovery_requests.insert_one(recovery_obj.dict())
-    return recovery_obj
+    return EmailRecoveryRequest(**recovery_dict)
 
-@api_router.get("/email/recovery/guide")
-async def get_email_recovery_guide():
-    return {
-        "title": "Recuperar Contraseña de Email - Para Adultos Mayores",
-        "what_you_need": [
-            "El email que quieres recuperar (ejemplo@gmail.com)",
-            "Tu nombre completo",
-            "Tu fecha de nacimiento DD/MM/YYYY",
-            "Tu CURP",
-            "Tu número de teléfono",
-            "Cualquier información extra que recuerdes"
-        ],
-        "email_providers": {
-            "Gmail": {
-                "name": "Gmail (Google)",
-                "how_to_identify": "Si tu email termina en @gmail.com",
-                "recovery_url": "https://accounts.google.com/signin/recovery",
-                "simple_steps": [
-                    "Ve a gmail.com",
-                    "Da clic en '¿Olvidaste tu contraseña?'",
-                    "Escribe tu email completo",
-                    "Sigue las instrucciones en pantalla"
-                ]
-            },
-            "Outlook": {
-                "name": "Outlook (Microsoft)",
-                "how_to_identify": "Si tu email termina en @outlook.com, @hotmail.com, @live.com",
-                "recovery_url": "https://account.live.com/password/reset",
-                "simple_steps": [
-                    "Ve a outlook.com",
-                    "Da clic en '¿Olvidaste tu contraseña?'",
-                    "Escribe tu email completo",
-                    "Sigue las instrucciones en pantalla"
-                ]
-            },
-            "Yahoo": {
-                "name": "Yahoo Mail",
-                "how_to_identify": "Si tu email termina en @yahoo.com, @yahoo.com.mx",
-                "recovery_url": "https://login.yahoo.com/forgot-password",
-                "simple_steps": [
-                    "Ve a yahoo.com",
-                    "Da clic en 'Iniciar sesión'",
-                    "Da clic en '¿Olvidaste tu contraseña?'",
-                    "Escribe tu email completo"
-                ]
-            }
+@api_router.post("/email/recovery/request", response_model=EmailRecoveryRequest)
+async def create_email_recovery_request(request: EmailRecoveryRequestCreate, response: Response,
+                                        idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        recovery_obj = build_email_recovery_request(request)
+        recovery_doc = recovery_obj.dict()
+        await resources.db.email_recovery_requests.insert_one(recovery_doc)
+        await record_created(resources.db, "email_recovery", recovery_doc)
+        await enqueue_notifications(resources.db, "email_recovery", recovery_doc)
+        return recovery_obj.dict()
+
+    natural_key = f"{request.curp}:{request.email_to_recover}"
+    result, replayed = await submit_once(resources.db, "email_recovery", request.dict(), create,
+                                         idempotency_key, natural_key=natural_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
+@api_router.post("/email/recovery/requests:batch", response_model=BatchResult)
+async def create_email_recovery_requests_batch(response: Response, items: List[Any] = Body(...),
+                                               idempotency_key: Optional[str] = Header(None)):
+    result, replayed = await create_batch_once(resources.db, "email_recovery_requests", "email_recovery", items,
+                                               EmailRecoveryRequestCreate, build_email_recovery_request, idempotency_key)
+    if replayed:
+        response.headers[REPLAY_HEADER] = "true"
+    return result
+
+EMAIL_RECOVERY_GUIDE = StaticPayload({
+    "title": "Recuperar Contraseña de Email - Para Adultos Mayores",
+    "what_you_need": [
+        "El email que quieres recuperar (ejemplo@gmail.com)",
+        "Tu nombre completo",
+        "Tu fecha de nacimiento DD/MM/YYYY",
+        "Tu CURP",
+        "Tu número de teléfono",
+        "Cualquier información extra que recuerdes"
+    ],
+    "email_providers": {
+        "Gmail": {
+            "name": "Gmail (Google)",
+            "how_to_identify": "Si tu email termina en @gmail.com",
+            "recovery_url": "https://accounts.google.com/signin/recovery",
+            "simple_steps": [
+                "Ve a gmail.com",
+                "Da clic en '¿Olvidaste tu contraseña?'",
+                "Escribe tu email completo",
+                "Sigue las instrucciones en pantalla"
+            ]
         },
-        "important_security": [
-            "🔴 NUNCA des tu contraseña nueva a extraños por teléfono",
-            "🔴 Las empresas oficiales NUNCA te piden contraseñas por teléfono",
-            "✅ Solo recupera desde los sitios oficiales",
-            "✅ Pide ayuda a familiares de confianza o contáctanos",
-            "📱 WhatsApp de ayuda: +52 5659 952408"
-        ],
-        "help_message": "Si tienes dudas o no puedes solo, llámanos por WhatsApp y te ayudamos paso a paso GRATIS"
-    }
+        "Outlook": {
+            "name": "Outlook (Microsoft)",
+            "how_to_identify": "Si tu email termina en @outlook.com, @hotmail.com, @live.com",
+            "recovery_url": "https://account.live.com/password/reset",
+            "simple_steps": [
+                "Ve a outlook.com",
+                "Da clic en '¿Olvidaste tu contraseña?'",
+                "Escribe tu email completo",
+                "Sigue las instrucciones en pantalla"
+            ]
+        },
+        "Yahoo": {
+            "name": "Yahoo Mail",
+            "how_to_identify": "Si tu email termina en @yahoo.com, @yahoo.com.mx",
+            "recovery_url": "https://login.yahoo.com/forgot-password",
+            "simple_steps": [
+                "Ve a yahoo.com",
+                "Da clic en 'Iniciar sesión'",
+                "Da clic en '¿Olvidaste tu contraseña?'",
+                "Escribe tu email completo"
+            ]
+        }
+    },
+    "important_security": [
+        "🔴 NUNCA des tu contraseña nueva a extraños por teléfono",
+        "🔴 Las empresas oficiales NUNCA te piden contraseñas por teléfono",
+        "✅ Solo recupera desde los sitios oficiales",
+        "✅ Pide ayuda a familiares de confianza o contáctanos",
+        "📱 WhatsApp de ayuda: +52 5659 952408"
+    ],
+    "help_message": "Si tienes dudas o no puedes solo, llámanos por WhatsApp y te ayudamos paso a paso GRATIS"
+})
+
+@api_router.get("/email/recovery/guide")
+async def get_email_recovery_guide(request: Request):
+    return EMAIL_RECOVERY_GUIDE.response(request)
 
 @api_router.get("/email/recovery/requests", response_model=List[EmailRecoveryRequest])
-async def get_email_recovery_requests():
-    requests = await db.email_recovery_requests.find().to_list(1000)
-    return [EmailRecoveryRequest(**req) for req in requests]
+async def get_email_recovery_requests(page: PageParams = Depends(), filters: ListFilters = Depends()):
+    return await list_documents(resources.read_db.email_recovery_requests, EmailRecoveryRequest, page, filters)
+
+# ========== EXPORT ROUTES ==========
+EXPORT_MODELS = {
+    "cfe": CFERequest,
+    "certificates": CertificateRequest,
+    "fiscal": FiscalRequest,
+    "contacts": ContactMessage,
+    "imss_semanas": IMSSSemanasRequest,
+    "email_recovery": EmailRecoveryRequest,
+}
+
+@api_router.get("/export/{service}")
+async def export_requests(service: str, params: ExportParams = Depends()):
+    if service not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {service}")
+    return StreamingResponse(
+        stream_export(resources.db, service, EXPORT_MODELS[service], params, read_db=resources.read_db),
+        media_type=MEDIA_TYPES[params.format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(service, params)}"'},
+    )
 
 # ========== ANALYTICS ROUTES ==========
 @api_router.get("/analytics/dashboard")
 async def get_dashboard_analytics():
-    # Get basic statistics
-    total_cfe = await db.cfe_requests.count_documents({})
-    total_certificates = await db.certificate_requests.count_documents({})
-    total_fiscal = await db.fiscal_requests.count_documents({})
-    total_contacts = await db.contact_messages.count_documents({})
-    total_imss_semanas = await db.imss_semanas_requests.count_documents({})
-    total_email_recovery = await db.email_recovery_requests.count_documents({})
+    return await resources.dashboard_cache.get_or_load("dashboard", build_dashboard_analytics)
+
+async def build_dashboard_analytics():
+    # Answered from the incrementally maintained counters document
+    totals = await get_totals(resources.read_db)
+    services = totals.get("services", {})
+    total_cfe = services.get("cfe", 0)
+    total_certificates = services.get("certificates", 0)
+    total_fiscal = services.get("fiscal", 0)
+    total_contacts = services.get("contacts", 0)
+    total_imss_semanas = services.get("imss_semanas", 0)
+    total_email_recovery = services.get("email_recovery", 0)
     
     return {
         "total_requests": {
@@ -546,19 +732,94 @@ async def get_dashboard_analytics():
         },
         "total_helped": total_cfe + total_certificates + total_fiscal + total_imss_semanas + total_email_recovery,
         "elderly_specific": total_imss_semanas + total_email_recovery,
+        "by_status": totals.get("status", {}),
         "last_updated": datetime.utcnow().isoformat()
     }
 
-# Include the router in the main app
-app.include_router(api_router)
+@api_router.get("/analytics/timeseries")
+async def get_analytics_timeseries(query: TimeseriesQuery = Depends()):
+    # Served from the hourly rollups, never from the request collections
+    return await query_timeseries(resources.read_db, query)
+
+@api_router.get("/analytics/telemetry")
+async def get_analytics_telemetry(query: TelemetryQuery = Depends()):
+    # Archived days come from telemetry_daily, recent ones from the hot collection
+    return await query_telemetry(resources.read_db, query)
+
+# ========== EVENTS ROUTES ==========
+@api_router.get("/events")
+async def get_events(request: Request, query: EventsQuery = Depends()):
+    # Long-poll feed of new requests; dashboards follow it instead of re-fetching lists. Read from
+    # the primary: on a lagging secondary the cursor could pass events that replicate later.
+    return await read_events(resources.db, query, lambda: request.app.state.drain.draining)
+
+# ========== WORK QUEUE ROUTES ==========
+@api_router.post("/queue/claim", response_model=ClaimedCase, responses={204: {"description": "Queue empty"}})
+async def claim_next_case(claim: ClaimRequest):
+    case = await claim_next(resources.db, claim)
+    if case is None:
+        return Response(status_code=204)
+    return case
+
+@api_router.post("/queue/{service}/{request_id}/renew", response_model=Lease)
+async def renew_case_lease(service: str, request_id: str, lease: LeaseRequest):
+    return await renew_lease(resources.db, service, request_id, lease)
+
+@api_router.post("/queue/{service}/{request_id}/release")
+async def release_case(service: str, request_id: str, action: VolunteerAction):
+    await release_lease(resources.db, service, request_id, action)
+    return {"message": "Request returned to the queue"}
+
+@api_router.post("/queue/{service}/{request_id}/complete")
+async def complete_queue_case(service: str, request_id: str, action: VolunteerAction):
+    await complete_case(resources.db, service, request_id, action)
+    return {"message": "Request completed successfully"}
+
+@api_router.get("/analytics/cache-stats")
+async def get_cache_stats():
+    return resources.dashboard_cache.stats()
+
+async def field_format_exception_handler(request: Request, exc: RequestValidationError):
+    # CURP/NSS/date/email format errors keep the 400 + message contract the forms expect
+    message = format_error_message(exc.errors())
+    if message is None:
+        return await request_validation_exception_handler(request, exc)
+    return JSONResponse(status_code=400, content={"detail": message})
+
+async def database_unavailable_handler(request: Request, exc: ConnectionFailure):
+    # Pool checkout or server selection timed out: shed load instead of queueing forever
+    logger.warning("MongoDB unavailable for %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servicio temporalmente saturado, intenta de nuevo"},
+        headers={"Retry-After": str(request.app.state.settings.retry_after)},
+    )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# ========== METRICS ==========
+metrics.registry.collector(
+    "dashboard_cache_events", "Dashboard cache hits, misses and coalesced loads", ("event",),
+    lambda: {(event,): resources.dashboard_cache.stats()[event] for event in ("hits", "misses", "coalesced")})
+metrics.registry.collector(
+    "write_buffer_documents", "Write-behind buffer document counts", ("collection", "state"),
+    lambda: {(stats["collection"], state): stats[state]
+             for stats in (resources.status_check_buffer.stats(), resources.download_buffer.stats())
+             for state in ("pending", "written", "dropped")})
+metrics.registry.collector(
+    "cfdi_pool_jobs", "CFDI worker pool job counts", ("state",),
+    lambda: {(state,): resources.cfdi_pool.stats()[state] for state in ("pending", "completed", "inline", "rejected", "timeouts")})
+
+metrics_router = APIRouter()
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@metrics_router.get("/metrics/profile", include_in_schema=False)
+async def get_profile(seconds: float = 5.0):
+    # Sampling profiler of the event loop thread, collapsed-stack output
+    if os.environ.get('PROFILER_ENABLED', 'false').lower() != 'true':
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+    return PlainTextResponse(await metrics.profile_event_loop(min(seconds, 60.0)))
 
 # Configure logging
 logging.basicConfig(
@@ -567,6 +828,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# ========== APP FACTORY ==========
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker after the fork, so no socket, thread or process is shared between workers
+    global resources
+    resources = Resources(app.state.settings)
+    await resources.start()
+    app.state.rate_limiter.bind(resources.db)
+    logger.info("Worker %d ready", os.getpid())
+    yield
+    # Under serve.py the signal already flagged the drain and uvicorn has waited for (or cancelled)
+    # running requests; this only matters under servers that start the lifespan shutdown first
+    await app.state.drain.wait_idle()
+    await resources.close()
+    logger.info("Worker %d stopped", os.getpid())
+
+def create_app(settings: Optional[MongoSettings] = None) -> FastAPI:
+    app = FastAPI(title="HUMANIDAD UNIDA API", description="Sistema integral de ayuda humanitaria",
+                  lifespan=lifespan)
+    app.state.settings = settings or MongoSettings.from_env()
+    app.state.drain = RequestDrain(retry_after=app.state.settings.retry_after)
+    # Past twice the pool size, extra requests would only wait on a Mongo connection
+    app.state.rate_limiter = RateLimiter(
+        limits_from_env() if RATE_LIMIT_ENABLED else {},
+        max_in_flight=int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', str(2 * app.state.settings.max_pool_size))),
+        retry_after=app.state.settings.retry_after,
+    )
+
+    app.include_router(api_router)
+    app.include_router(metrics_router)
+
+    app.add_exception_handler(RequestValidationError, field_format_exception_handler)
+    app.add_exception_handler(ConnectionFailure, database_unavailable_handler)
+
+    app.add_middleware(RateLimitMiddleware, limiter=app.state.rate_limiter)
+    app.add_middleware(DrainMiddleware, drain=app.state.drain)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", REPLAY_HEADER],
+    )
+    return app
+
+# `uvicorn server:app` keeps working; deployments use `python serve.py --workers N` (see serve.py)
+app = create_app()
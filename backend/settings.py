@@ -0,0 +1,81 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from pymongo import ReadPreference
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    url: str
+    db_name: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_connecting: int = 2
+    max_idle_time_ms: Optional[int] = None
+    # Bounded checkout wait: a saturated pool fails fast and surfaces as a 503
+    wait_queue_timeout_ms: Optional[int] = 2000
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = None
+    compressors: str = ""
+    app_name: str = "humanidad-unida-api"
+    # Admin lists and analytics may read from secondaries; submissions always use the primary
+    admin_read_preference: str = "secondaryPreferred"
+    # Seconds clients are told to wait after a pool or server-selection timeout
+    retry_after: int = 2
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        read_preference = os.environ.get('MONGO_ADMIN_READ_PREFERENCE', cls.admin_read_preference)
+        if read_preference not in READ_PREFERENCES:
+            raise ValueError(f"MONGO_ADMIN_READ_PREFERENCE must be one of {', '.join(READ_PREFERENCES)}")
+        return cls(
+            url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            max_pool_size=env_int('MONGO_MAX_POOL_SIZE', cls.max_pool_size),
+            min_pool_size=env_int('MONGO_MIN_POOL_SIZE', cls.min_pool_size),
+            max_connecting=env_int('MONGO_MAX_CONNECTING', cls.max_connecting),
+            max_idle_time_ms=env_int('MONGO_MAX_IDLE_TIME_MS', cls.max_idle_time_ms),
+            wait_queue_timeout_ms=env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', cls.wait_queue_timeout_ms),
+            server_selection_timeout_ms=env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', cls.server_selection_timeout_ms),
+            connect_timeout_ms=env_int('MONGO_CONNECT_TIMEOUT_MS', cls.connect_timeout_ms),
+            socket_timeout_ms=env_int('MONGO_SOCKET_TIMEOUT_MS', cls.socket_timeout_ms),
+            compressors=os.environ.get('MONGO_COMPRESSORS', cls.compressors),
+            app_name=os.environ.get('MONGO_APP_NAME', cls.app_name),
+            admin_read_preference=read_preference,
+            retry_after=env_int('MONGO_RETRY_AFTER', cls.retry_after),
+        )
+
+    def client_kwargs(self) -> dict:
+        kwargs = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxConnecting": self.max_connecting,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "appname": self.app_name,
+        }
+        if self.compressors:
+            kwargs["compressors"] = self.compressors
+        return kwargs
+
+    @property
+    def admin_read_preference_mode(self):
+        return READ_PREFERENCES[self.admin_read_preference]
@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+import json
+import os
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '3600'))
+
+
+def accepted_encodings(header: str) -> set:
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 0.0
+        if name.strip() and quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class StaticPayload:
+    """A JSON payload encoded and compressed once, served with strong ETags.
+
+    Each encoding is a different byte sequence, so each gets its own ETag
+    ("<hash>", "<hash>-gzip", "<hash>-br"); caches never hand a client an
+    encoding it did not ask for on revalidation.
+    """
+
+    def __init__(self, payload: dict, max_age: int = STATIC_MAX_AGE):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encoded = {None: self.body, "gzip": gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body, quality=11)
+        self.etags = {encoding: f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+                      for encoding in self.encoded}
+        self.headers = {
+            "Cache-Control": f"public, max-age={max_age}",
+            "Vary": "Accept-Encoding",
+        }
+
+    def encoding_for(self, request: Request):
+        encodings = accepted_encodings(request.headers.get("accept-encoding", ""))
+        return next((name for name in ("br", "gzip") if name in self.encoded and name in encodings), None)
+
+    def response(self, request: Request) -> Response:
+        encoding = self.encoding_for(request)
+        headers = {**self.headers, "ETag": self.etags[encoding]}
+        if etag_matches(request.headers.get("if-none-match", ""), self.etags[encoding]):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(self.encoded[encoding], media_type="application/json", headers=headers)
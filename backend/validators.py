@@ -0,0 +1,82 @@
+import re
+from datetime import date
+from typing import Annotated, List, Optional
+
+from pydantic import AfterValidator
+
+CURP_PATTERN = re.compile(r'^[A-Z]{4}[0-9]{6}[HM][A-Z]{5}[0-9A-Z][0-9]$')
+NSS_PATTERN = re.compile(r'^\d{11}$')
+BIRTH_DATE_PATTERN = re.compile(r'^(\d{2})/(\d{2})/(\d{4})$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# RENAPO alphabet used to compute the CURP verification digit
+CURP_ALPHABET = {char: value for value, char in enumerate("0123456789ABCDEFGHIJKLMNÑOPQRSTUVWXYZ")}
+
+
+class FieldFormatError(ValueError):
+    """Input format error reported to clients as a 400 with a plain message."""
+
+
+def curp_check_digit(curp: str) -> int:
+    total = sum(CURP_ALPHABET[char] * (18 - position) for position, char in enumerate(curp[:17]))
+    return (10 - total % 10) % 10
+
+
+def is_real_date(year: int, month: int, day: int) -> bool:
+    try:
+        date(year, month, day)
+    except ValueError:
+        return False
+    return True
+
+
+def validate_curp(value: str) -> str:
+    curp = value.strip().upper()
+    if not CURP_PATTERN.match(curp):
+        raise FieldFormatError("CURP inválida")
+    # Position 17 is a digit for people born before 2000 and a letter after
+    century = 1900 if curp[16].isdigit() else 2000
+    if not is_real_date(century + int(curp[4:6]), int(curp[6:8]), int(curp[8:10])):
+        raise FieldFormatError("CURP inválida")
+    if curp_check_digit(curp) != int(curp[17]):
+        raise FieldFormatError("CURP inválida")
+    return curp
+
+
+def validate_nss(value: str) -> str:
+    if not NSS_PATTERN.match(value):
+        raise FieldFormatError("NSS debe tener exactamente 11 números")
+    return value
+
+
+def validate_birth_date(value: str) -> str:
+    match = BIRTH_DATE_PATTERN.match(value)
+    if not match:
+        raise FieldFormatError("Fecha debe ser DD/MM/YYYY")
+    day, month, year = (int(part) for part in match.groups())
+    if not is_real_date(year, month, day) or date(year, month, day) > date.today():
+        raise FieldFormatError("Fecha de nacimiento no existe")
+    return value
+
+
+def validate_email(value: str) -> str:
+    if not EMAIL_PATTERN.match(value):
+        raise FieldFormatError("Formato de email inválido")
+    return value
+
+
+CURP = Annotated[str, AfterValidator(validate_curp)]
+NSS = Annotated[str, AfterValidator(validate_nss)]
+BirthDate = Annotated[str, AfterValidator(validate_birth_date)]
+Email = Annotated[str, AfterValidator(validate_email)]
+
+
+def format_error_message(errors: List[dict]) -> Optional[str]:
+    # Only collapse to a single message when every error is one of ours
+    messages = []
+    for error in errors:
+        cause = error.get("ctx", {}).get("error")
+        if not isinstance(cause, FieldFormatError):
+            return None
+        messages.append(str(cause))
+    return messages[0] if messages else None
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+from counters import record_status_change
+
+DEFAULT_LEASE_SECONDS = int(os.environ.get('QUEUE_LEASE_SECONDS', '900'))
+MAX_LEASE_SECONDS = int(os.environ.get('QUEUE_MAX_LEASE_SECONDS', '7200'))
+LEASE_SWEEP_INTERVAL = float(os.environ.get('QUEUE_SWEEP_INTERVAL', '30'))
+
+# Services volunteers work through the queue (dashboard service key -> collection)
+QUEUE_COLLECTIONS: Dict[str, str] = {
+    "cfe": "cfe_requests",
+    "fiscal": "fiscal_requests",
+    "imss_semanas": "imss_semanas_requests",
+    "email_recovery": "email_recovery_requests",
+}
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseRequest(BaseModel):
+    volunteer: str = Field(..., min_length=1, max_length=100)
+    lease_seconds: int = Field(DEFAULT_LEASE_SECONDS, ge=30, le=MAX_LEASE_SECONDS)
+
+
+class ClaimRequest(LeaseRequest):
+    services: Optional[List[str]] = None
+
+
+class VolunteerAction(BaseModel):
+    volunteer: str = Field(..., min_length=1, max_length=100)
+
+
+class Lease(BaseModel):
+    service: str
+    request_id: str
+    assignee: str
+    lease_expires_at: datetime
+
+
+class ClaimedCase(Lease):
+    request: dict
+
+
+def queue_collection(db, service: str):
+    if service not in QUEUE_COLLECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown queue service: {service}")
+    return db[QUEUE_COLLECTIONS[service]]
+
+
+async def oldest_pending(db, service: str) -> Optional[datetime]:
+    doc = await queue_collection(db, service).find_one(
+        {"status": PENDING}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1), ("id", 1)])
+    return doc["timestamp"] if doc else None
+
+
+async def claim_next(db, claim: ClaimRequest) -> Optional[ClaimedCase]:
+    """Lease the oldest pending case across the requested services, or None when all are empty."""
+    services = claim.services or list(QUEUE_COLLECTIONS)
+    heads = await asyncio.gather(*[oldest_pending(db, service) for service in services])
+    candidates = sorted((timestamp, service) for timestamp, service in zip(heads, services) if timestamp)
+
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=claim.lease_seconds)
+    lease = {"status": IN_PROGRESS, "assignee": claim.volunteer, "claimed_at": now, "lease_expires_at": expires,
+             "status_changed_at": now}
+    for _, service in candidates:
+        # Atomic: two volunteers racing for the same head get different cases
+        doc = await queue_collection(db, service).find_one_and_update(
+            {"status": PENDING},
+            {"$set": lease},
+            sort=[("timestamp", 1), ("id", 1)],
+            projection={"_id": 0},
+        )
+        if doc is not None:
+            await record_status_change(db, service, PENDING, IN_PROGRESS)
+            return ClaimedCase(service=service, request_id=doc["id"], assignee=claim.volunteer,
+                               lease_expires_at=expires, request={**doc, **lease})
+    return None
+
+
+async def held_update(db, service: str, request_id: str, volunteer: str, update: dict) -> None:
+    # Only the current lease holder, and only while the lease is still live
+    result = await queue_collection(db, service).update_one(
+        {"id": request_id, "status": IN_PROGRESS, "assignee": volunteer,
+         "lease_expires_at": {"$gt": datetime.utcnow()}},
+        update,
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="La solicitud no está asignada a ti o tu turno expiró")
+
+
+async def renew_lease(db, service: str, request_id: str, lease: LeaseRequest) -> Lease:
+    expires = datetime.utcnow() + timedelta(seconds=lease.lease_seconds)
+    await held_update(db, service, request_id, lease.volunteer, {"$set": {"lease_expires_at": expires}})
+    return Lease(service=service, request_id=request_id, assignee=lease.volunteer, lease_expires_at=expires)
+
+
+async def release_lease(db, service: str, request_id: str, action: VolunteerAction) -> None:
+    await held_update(db, service, request_id, action.volunteer, {
+        "$set": {"status": PENDING, "status_changed_at": datetime.utcnow()},
+        "$unset": {"assignee": "", "claimed_at": "", "lease_expires_at": ""},
+    })
+    await record_status_change(db, service, IN_PROGRESS, PENDING)
+
+
+async def complete_case(db, service: str, request_id: str, action: VolunteerAction) -> None:
+    now = datetime.utcnow()
+    await held_update(db, service, request_id, action.volunteer, {
+        "$set": {"status": COMPLETED, "completed_by": action.volunteer, "completed_at": now,
+                 "status_changed_at": now},
+        "$unset": {"lease_expires_at": ""},
+    })
+    await record_status_change(db, service, IN_PROGRESS, COMPLETED)
+
+
+async def sweep_expired_leases(db) -> Dict[str, int]:
+    # Abandoned cases go back to the front of the queue (they keep their original timestamp)
+    now = datetime.utcnow()
+    released = {}
+    for service, collection in QUEUE_COLLECTIONS.items():
+        result = await db[collection].update_many(
+            {"status": IN_PROGRESS, "lease_expires_at": {"$lte": now}},
+            {"$set": {"status": PENDING, "status_changed_at": now},
+             "$unset": {"assignee": "", "claimed_at": "", "lease_expires_at": ""}},
+        )
+        if result.modified_count:
+            await record_status_change(db, service, IN_PROGRESS, PENDING, count=result.modified_count)
+            released[service] = result.modified_count
+    return released
+
+
+async def run_lease_sweeper(db, interval: float = LEASE_SWEEP_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = await sweep_expired_leases(db)
+            if released:
+                logger.info("Released expired leases: %s", released)
+        except Exception:
+            logger.exception("Lease sweep failed")
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """Write-behind buffer that batches fire-and-forget inserts.
+
+    put() only waits when max_pending documents are already queued, which
+    pushes back on callers while Mongo is slow instead of growing memory.
+    """
+
+    def __init__(self, collection, max_batch: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 10000, max_retries: int = 3):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, document: dict) -> None:
+        if self._closing:
+            raise RuntimeError(f"Write buffer for {self.collection.name} is shutting down")
+        await self._queue.put(document)
+        self.enqueued += 1
+
+    async def drain(self) -> None:
+        # Flush everything still queued, then stop the worker
+        self._closing = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _next_batch(self) -> List[dict]:
+        batch: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except BulkWriteError as e:
+                # Unordered inserts keep going past bad rows; count what landed
+                written = e.details.get("nInserted", 0)
+                self.written += written
+                self.dropped += len(batch) - written
+                self.batches += 1
+                logger.warning("Write buffer %s dropped %d documents: %s",
+                               self.collection.name, len(batch) - written, e.details.get("writeErrors", [])[:1])
+                return
+            except PyMongoError as e:
+                if attempt == self.max_retries:
+                    self.dropped += len(batch)
+                    logger.error("Write buffer %s dropped %d documents after %d retries: %s",
+                                 self.collection.name, len(batch), self.max_retries, e)
+                    return
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 5.0))
+            except Exception:
+                # Not a server error (e.g. bson.errors.InvalidDocument), so retrying won't help.
+                # Drop the batch but keep the worker alive, or put() would block once the queue fills.
+                self.dropped += len(batch)
+                logger.exception("Write buffer %s dropped %d documents", self.collection.name, len(batch))
+                return
+
+    def stats(self) -> dict:
+        return {
+            "collection": self.collection.name,
+            "pending": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
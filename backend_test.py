@@ -15,7 +15,7 @@ BACKEND_URL = "https://cb10174b-a80f-4d50-b43e-0c40e043587b.preview.emergentagen
 
 # Test data as specified in requirements
 TEST_DATA = {
-    "curp_valid": "ABCD123456HDFGHI01",
+    "curp_valid": "HEGG560427MVZRRL04",
     "cfe_service_number": "12345678901",
     "xml_content": "<?xml version='1.0'?><cfdi>test</cfdi>",
     "whatsapp": "525659952408",
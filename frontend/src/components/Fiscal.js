@@ -49,8 +49,9 @@ const Fiscal = () => {
       setSubmitted(true);
     } catch (error) {
       console.error('Error submitting fiscal request:', error);
-      if (error.response?.data?.detail?.includes('CURP format')) {
-        setCurpError('Formato de CURP inválido. Verifica que sea correcto.');
+      // The API also checks the birth date and verification digit, which the pattern above cannot
+      if (error.response?.data?.detail?.includes('CURP')) {
+        setCurpError('CURP inválida. Verifica tu fecha de nacimiento y el último dígito.');
       }
     } finally {
       setLoading(false);
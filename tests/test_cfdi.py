@@ -0,0 +1,53 @@
+import pytest
+
+from cfdi import CFDIError, extract_cfdi_nodes, parse_cfdi
+
+UUID = "6F5F2A3B-1111-2222-3333-444455556666"
+
+
+def cfdi(addenda: str = "") -> bytes:
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital"
+    Version="4.0" Fecha="2024-01-01T10:00:00" Total="116.00" Moneda="MXN">
+  <cfdi:Emisor Rfc="AAA010101AAA" Nombre="Emisor SA"/>
+  <cfdi:Receptor Rfc="XAXX010101000" Nombre="Publico"/>
+  <cfdi:Complemento>
+    <tfd:TimbreFiscalDigital Version="1.1" UUID="{UUID}" FechaTimbrado="2024-01-01T10:01:00"/>
+  </cfdi:Complemento>
+  {addenda}
+</cfdi:Comprobante>'''.encode("utf-8")
+
+
+def test_extracts_cfdi_nodes():
+    comprobante, emisor, receptor, timbre = extract_cfdi_nodes(cfdi())
+    assert comprobante["Version"] == "4.0"
+    assert emisor["Rfc"] == "AAA010101AAA"
+    assert receptor["Rfc"] == "XAXX010101000"
+    assert timbre["UUID"] == UUID
+
+
+@pytest.mark.parametrize("prefix", [b"\n", b"   ", b"\r\n\t "])
+def test_leading_whitespace_is_accepted(prefix):
+    assert extract_cfdi_nodes(prefix + cfdi()) == extract_cfdi_nodes(cfdi())
+
+
+def test_stops_after_timbre():
+    # Malformed addenda after the Complemento is never read
+    _, _, _, timbre = extract_cfdi_nodes(cfdi("<cfdi:Addenda><broken></cfdi:Addenda>"))
+    assert timbre["UUID"] == UUID
+
+
+@pytest.mark.parametrize("data", [b"", b"not xml", b"<cfdi:Comprobante", cfdi()[:200]])
+def test_malformed_xml_is_rejected(data):
+    with pytest.raises(CFDIError):
+        extract_cfdi_nodes(data)
+
+
+def test_dtd_is_rejected():
+    with pytest.raises(CFDIError):
+        extract_cfdi_nodes(b'<?xml version="1.0"?><!DOCTYPE x [<!ENTITY a "b">]><x>&a;</x>')
+
+
+def test_document_without_cfdi_nodes():
+    assert extract_cfdi_nodes(b"<factura/>") == (None, {}, {}, None)
+    assert parse_cfdi(b"<factura/>")["is_valid"] is False
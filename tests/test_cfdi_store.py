@@ -0,0 +1,76 @@
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from cfdi import document_digest
+from cfdi_store import invoice_checks, release_payloads, store_payload, store_payloads, sweep_payloads
+from retention import archive_day, day_start
+
+pytestmark = pytest.mark.anyio
+
+UUID = "6F5F2A3B-1111-2222-3333-444455556666"
+
+
+def document(variant: str = "") -> bytes:
+    return f'<cfdi:Comprobante Version="4.0" Total="116.00"{variant}/>'.encode()
+
+
+def result(uuid: str = UUID) -> dict:
+    return {"is_valid": True, "status": "Timbrado", "uuid": uuid}
+
+
+async def test_first_store_keeps_compressed_xml(db):
+    digest = await store_payload(db, document(), result())
+    assert digest == document_digest(document())
+    payload = await db.cfdi_payloads.find_one({"_id": digest})
+    assert zlib.decompress(payload["xml"]) == document()
+    assert (payload["ref_count"], payload["hit_count"], payload["uuid"]) == (1, 0, UUID)
+
+
+async def test_repeats_add_references_without_resending_xml(db):
+    await store_payload(db, document(), result())
+    await store_payload(db, document(), result())
+    payload = await db.cfdi_payloads.find_one({"_id": document_digest(document())})
+    assert (payload["ref_count"], payload["hit_count"]) == (2, 1)
+
+
+async def test_batch_counts_duplicates_within_and_across_calls(db):
+    await store_payload(db, document(), result())
+    digests = await store_payloads(db, [(document(), result()), (document(' Serie="B"'), result()),
+                                        (document(), result()), (document(' Serie="B"'), result())])
+    assert digests[0] == digests[2] and digests[1] == digests[3]
+    first = await db.cfdi_payloads.find_one({"_id": digests[0]})
+    second = await db.cfdi_payloads.find_one({"_id": digests[1]})
+    assert (first["ref_count"], first["hit_count"]) == (3, 2)
+    assert (second["ref_count"], second["hit_count"]) == (2, 1)
+
+    checks = await invoice_checks(db, UUID.lower())
+    assert (checks["verifications"], checks["repeat_hits"], checks["variants"]) == (5, 3, 2)
+
+
+async def test_sweep_removes_only_unreferenced_payloads(db):
+    kept = await store_payload(db, document(), result())
+    await store_payload(db, document(), result())
+    released = await store_payload(db, document(' Serie="B"'), result())
+    await release_payloads(db, [{"payload_id": kept}, {"payload_id": released}])
+
+    assert await sweep_payloads(db) == 1
+    assert await db.cfdi_payloads.find_one({"_id": released}) is None
+    assert (await db.cfdi_payloads.find_one({"_id": kept}))["ref_count"] == 1
+    # Seen again after the sweep: stored afresh
+    await store_payload(db, document(' Serie="B"'), result())
+    assert (await db.cfdi_payloads.find_one({"_id": released}))["ref_count"] == 1
+
+
+async def test_archiving_verifications_releases_their_payloads(db):
+    day = day_start(datetime.utcnow() - timedelta(days=60))
+    digest = await store_payload(db, document(), result())
+    await store_payload(db, document(), result())
+    await db.cfdi_verifications.insert_many([
+        {"id": f"v{i}", "payload_id": digest, "timestamp": day + timedelta(hours=i),
+         "verification_result": {"is_valid": True}} for i in range(2)])
+
+    assert await archive_day(db, "cfdi_verifications", day) == 2
+    assert (await db.cfdi_payloads.find_one({"_id": digest}))["ref_count"] == 0
+    assert await sweep_payloads(db) == 1
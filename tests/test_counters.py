@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from counters import TOTALS_ID, get_totals, reconcile, record_created, record_status_change
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 1, 1)
+
+
+def requests(count, status="pending", start=START):
+    return [{"id": f"{status}-{i}", "status": status, "timestamp": start + timedelta(hours=i)}
+            for i in range(count)]
+
+
+async def test_first_write_after_deploy_reconciles_existing_requests(db):
+    # Requests stored before the counters existed
+    await db.cfe_requests.insert_many(requests(50))
+    new = requests(1, status="verified")
+    await db.cfe_requests.insert_many([dict(doc) for doc in new])
+    await record_created(db, "cfe", new)
+
+    totals = await get_totals(db)
+    assert totals["services"]["cfe"] == 51
+    assert totals["status"]["cfe"] == {"pending": 50, "verified": 1}
+    assert "needs_reconcile" not in await db.counters.find_one({"_id": TOTALS_ID})
+
+
+async def test_increments_after_reconcile(db):
+    await db.fiscal_requests.insert_many(requests(3))
+    await reconcile(db)
+    new = requests(2, status="pending", start=START + timedelta(days=1))
+    await record_created(db, "fiscal", new)
+    await record_status_change(db, "fiscal", "pending", "completed")
+
+    totals = await get_totals(db)
+    assert totals["services"]["fiscal"] == 5
+    assert totals["status"]["fiscal"] == {"pending": 4, "completed": 1}
+    day = await db.counters.find_one({"_id": "day:2024-01-02"})
+    assert day["services"]["fiscal"] == 2
+
+
+async def test_reconcile_rebuilds_days_and_drops_empty_ones(db):
+    await db.counters.insert_one({"_id": "day:2023-12-31", "day": "2023-12-31", "services": {"cfe": 9}})
+    await db.cfe_requests.insert_many(requests(30))
+    totals = await reconcile(db)
+    assert totals["services"]["cfe"] == 30
+    days = {doc["day"]: doc["services"]["cfe"] async for doc in db.counters.find({"_id": {"$regex": "^day:"}})}
+    assert days == {"2024-01-01": 24, "2024-01-02": 6}
+
+
+async def test_concurrent_reconciles(db):
+    await db.cfe_requests.insert_many(requests(10))
+    results = await asyncio.gather(*[reconcile(db) for _ in range(4)])
+    assert all(totals["services"]["cfe"] == 10 for totals in results)
+    assert await db.counters.count_documents({}) == 2
@@ -0,0 +1,94 @@
+import io
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import typer
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from export import ExportParams, main, stream_export
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 1, 1)
+
+
+class Row(BaseModel):
+    id: str
+    timestamp: datetime
+    donation_amount: Optional[float] = None
+    is_first_time: Optional[bool] = None
+
+
+def params(**kwargs) -> ExportParams:
+    values = {"format": "csv", "since": None, "until": None, "incremental": False, "consumer": "default"}
+    values.update(kwargs)
+    return ExportParams(**values)
+
+
+async def insert_rows(db, first: int, count: int):
+    await db.cfe_requests.insert_many([
+        {"id": f"c{i:03d}", "timestamp": START + timedelta(hours=i), "donation_amount": float(i),
+         "is_first_time": i % 2 == 0, "phone": "5555555555"} for i in range(first, first + count)])
+
+
+async def export(db, chunk_size: int = 2, **kwargs) -> bytes:
+    return b"".join([chunk async for chunk in stream_export(db, "cfe", Row, params(**kwargs), chunk_size)])
+
+
+async def test_csv_has_one_header_across_chunks(db):
+    await insert_rows(db, 0, 5)
+    frame = pd.read_csv(io.BytesIO(await export(db)))
+    assert list(frame.columns) == ["id", "timestamp", "donation_amount", "is_first_time"]
+    assert list(frame["id"]) == [f"c{i:03d}" for i in range(5)]
+
+
+async def test_empty_csv_still_has_header(db):
+    assert await export(db) == b"id,timestamp,donation_amount,is_first_time\n"
+
+
+async def test_parquet_keeps_types_for_missing_fields(db):
+    await insert_rows(db, 0, 3)
+    await db.cfe_requests.insert_many([{"id": f"n{i}", "timestamp": START + timedelta(days=1, hours=i)}
+                                       for i in range(2)])
+    table = pq.read_table(io.BytesIO(await export(db, format="parquet")))
+    assert table.num_rows == 5
+    assert str(table.schema.field("donation_amount").type) == "double"
+    assert str(table.schema.field("is_first_time").type) == "bool"
+    assert table.column("donation_amount").null_count == 2
+
+
+async def test_since_until_window(db):
+    await insert_rows(db, 0, 5)
+    frame = pd.read_csv(io.BytesIO(await export(db, since=START + timedelta(hours=1),
+                                                until=START + timedelta(hours=3))))
+    assert list(frame["id"]) == ["c001", "c002"]
+
+
+async def test_incremental_export_resumes_per_consumer(db):
+    await insert_rows(db, 0, 3)
+    assert len(pd.read_csv(io.BytesIO(await export(db, incremental=True, consumer="a")))) == 3
+    await insert_rows(db, 3, 2)
+    again = pd.read_csv(io.BytesIO(await export(db, incremental=True, consumer="a")))
+    assert list(again["id"]) == ["c003", "c004"]
+    # Another consumer has its own watermark
+    assert len(pd.read_csv(io.BytesIO(await export(db, incremental=True, consumer="b")))) == 5
+
+
+@pytest.mark.parametrize("kwargs", [{"format": "xlsx"}, {"consumer": "a/b"}, {"consumer": ""}])
+def test_invalid_params_are_rejected(kwargs):
+    with pytest.raises(HTTPException) as e:
+        params(**kwargs)
+    assert e.value.status_code == 400
+
+
+def test_cli_rejects_unknown_format(tmp_path: Path):
+    output = tmp_path / "cfe.xlsx"
+    with pytest.raises(typer.BadParameter):
+        main("cfe", output=output, format="xlsx", since=None, until=None, incremental=False,
+             consumer="default", chunk_size=10)
+    assert not output.exists()
@@ -0,0 +1,147 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+from batch import create_batch_once
+import idempotency
+from idempotency import submit_once
+
+pytestmark = pytest.mark.anyio
+
+
+class Creator:
+    """Stands in for a route's insert: counts calls and returns a new record each time."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("insert failed")
+        return {"id": str(uuid.uuid4())}
+
+
+async def test_idempotency_key_replays_first_response(db):
+    create = Creator()
+    first, replayed = await submit_once(db, "cfe", {"amount": 10}, create, idempotency_key="k1")
+    assert not replayed
+    again, replayed = await submit_once(db, "cfe", {"amount": 10}, create, idempotency_key="k1")
+    assert replayed
+    assert again == first
+    assert create.calls == 1
+
+
+async def test_idempotency_key_with_other_body_is_422(db):
+    await submit_once(db, "cfe", {"amount": 10}, Creator(), idempotency_key="k1")
+    with pytest.raises(HTTPException) as error:
+        await submit_once(db, "cfe", {"amount": 20}, Creator(), idempotency_key="k1")
+    assert error.value.status_code == 422
+
+
+async def test_natural_key_replays_identical_body(db):
+    create = Creator()
+    first, _ = await submit_once(db, "cfe", {"amount": 10}, create, natural_key="123456789012")
+    again, replayed = await submit_once(db, "cfe", {"amount": 10}, create, natural_key="123456789012")
+    assert replayed
+    assert again == first
+    assert create.calls == 1
+
+
+async def test_natural_key_with_new_details_is_a_new_submission(db):
+    create = Creator()
+    first, _ = await submit_once(db, "cfe", {"amount": 10}, create, natural_key="123456789012")
+    second, replayed = await submit_once(db, "cfe", {"amount": 20}, create, natural_key="123456789012")
+    assert not replayed
+    assert second != first
+    # Retrying the corrected submission now replays it, not the original
+    retry, replayed = await submit_once(db, "cfe", {"amount": 20}, create, natural_key="123456789012")
+    assert replayed
+    assert retry == second
+    assert create.calls == 2
+
+
+async def test_failed_create_releases_claim(db):
+    with pytest.raises(RuntimeError):
+        await submit_once(db, "cfe", {"amount": 10}, Creator(fail=True), idempotency_key="k1")
+    _, replayed = await submit_once(db, "cfe", {"amount": 10}, Creator(), idempotency_key="k1")
+    assert not replayed
+    assert await db.idempotency_keys.count_documents({}) == 1
+
+
+async def crash_holder(db, claim_id):
+    # What a worker that died inside create() leaves behind, once its lease has run out
+    await db.idempotency_keys.update_one(
+        {"_id": claim_id}, {"$set": {"pending_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+async def test_crashed_holder_is_taken_over_by_identical_retry(db):
+    await db.idempotency_keys.insert_one(
+        {**idempotency.pending_claim(idempotency.fingerprint({"amount": 10}), 3600, datetime.utcnow()),
+         "_id": "cfe:key:k1"})
+    await crash_holder(db, "cfe:key:k1")
+    create = Creator()
+    first, replayed = await submit_once(db, "cfe", {"amount": 10}, create, idempotency_key="k1")
+    assert not replayed
+    again, replayed = await submit_once(db, "cfe", {"amount": 10}, create, idempotency_key="k1")
+    assert (again, replayed) == (first, True)
+    assert create.calls == 1
+
+
+async def test_crashed_natural_key_holder_is_taken_over_by_other_body(db):
+    claim_id = "cfe:natural:123456789012"
+    await db.idempotency_keys.insert_one(
+        {**idempotency.pending_claim(idempotency.fingerprint({"amount": 10}), 3600, datetime.utcnow()),
+         "_id": claim_id})
+    await crash_holder(db, claim_id)
+    _, replayed = await submit_once(db, "cfe", {"amount": 20}, Creator(), natural_key="123456789012")
+    assert not replayed
+    assert (await db.idempotency_keys.find_one({"_id": claim_id}))["state"] == "done"
+
+
+async def test_live_pending_claim_is_not_taken_over(db, monkeypatch):
+    monkeypatch.setattr(idempotency, "PENDING_WAIT", 0.2)
+    await db.idempotency_keys.insert_one(
+        {**idempotency.pending_claim(idempotency.fingerprint({"amount": 10}), 3600, datetime.utcnow()),
+         "_id": "cfe:key:k1"})
+    create = Creator()
+    with pytest.raises(HTTPException) as error:
+        await submit_once(db, "cfe", {"amount": 10}, create, idempotency_key="k1")
+    assert error.value.status_code == 409
+    assert create.calls == 0
+
+
+class ItemCreate(BaseModel):
+    name: str = Field(..., min_length=1)
+
+
+class Item(ItemCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "pending"
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
+def build_item(obj: ItemCreate) -> Item:
+    return Item(**obj.dict())
+
+
+async def test_batch_with_same_key_replays_without_inserting(db):
+    items = [{"name": f"n{i}"} for i in range(5)] + [{"name": ""}]
+    first, replayed = await create_batch_once(db, "items", "items", items, ItemCreate, build_item, "batch-1")
+    assert not replayed
+    assert (first["inserted"], first["failed"]) == (5, 1)
+    again, replayed = await create_batch_once(db, "items", "items", items, ItemCreate, build_item, "batch-1")
+    assert replayed
+    assert again == first
+    assert await db["items"].count_documents({}) == 5
+
+
+async def test_batch_key_with_other_items_is_422(db):
+    await create_batch_once(db, "items", "items", [{"name": "a"}], ItemCreate, build_item, "batch-1")
+    with pytest.raises(HTTPException) as error:
+        await create_batch_once(db, "items", "items", [{"name": "b"}], ItemCreate, build_item, "batch-1")
+    assert error.value.status_code == 422
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import notifications
+from notifications import (NOTIFY_BACKOFF_BASE, NOTIFY_BACKOFF_MAX, FakeTransport, backoff, claim_batch,
+                           deliver_batch, dispatch_once, enqueue_notifications)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def transports():
+    return {"whatsapp": FakeTransport(), "email": FakeTransport()}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Retries become due immediately; the backoff itself is covered separately
+    monkeypatch.setattr(notifications, "backoff", lambda attempts: 0)
+
+
+async def enqueue(db, count, service="cfe"):
+    docs = [{"id": f"{service}-{i}", "user_name": f"Persona {i}", "status": "pending"} for i in range(count)]
+    await enqueue_notifications(db, service, docs)
+
+
+async def delivery(db, request_id, channel="whatsapp"):
+    return (await db.notification_outbox.find_one({"request_id": request_id}))["deliveries"][channel]
+
+
+async def test_pending_events_go_out_as_one_batch_per_channel(db, transports):
+    await enqueue(db, 3)
+    await enqueue(db, 2, service="fiscal")
+    assert await dispatch_once(db, transports) == {"whatsapp": 5, "email": 5}
+    for transport in transports.values():
+        assert len(transport.batches) == 1
+        assert {event["request_id"] for event in transport.batches[0]} == {
+            "cfe-0", "cfe-1", "cfe-2", "fiscal-0", "fiscal-1"}
+    assert (await delivery(db, "cfe-0"))["state"] == "sent"
+    # Nothing is due any more
+    assert await dispatch_once(db, transports) == {}
+
+
+async def test_batch_size_caps_each_send(db, transports):
+    await enqueue(db, 5)
+    assert await dispatch_once(db, transports, batch_size=2) == {"whatsapp": 2, "email": 2}
+    assert await dispatch_once(db, transports, batch_size=2) == {"whatsapp": 2, "email": 2}
+    assert await dispatch_once(db, transports, batch_size=2) == {"whatsapp": 1, "email": 1}
+    assert [len(batch) for batch in transports["email"].batches] == [2, 2, 1]
+
+
+async def test_failed_send_is_retried_and_channels_are_independent(db, transports):
+    await enqueue(db, 2)
+    transports["whatsapp"].fail_next = 1
+    assert await dispatch_once(db, transports) == {"whatsapp": 0, "email": 2}
+    whatsapp = await delivery(db, "cfe-0")
+    assert (whatsapp["state"], whatsapp["attempts"]) == ("pending", 1)
+    assert "fake transport failure" in whatsapp["last_error"]
+    assert "claim" not in whatsapp
+    assert (await delivery(db, "cfe-0", "email"))["state"] == "sent"
+
+    assert await dispatch_once(db, transports) == {"whatsapp": 2}
+    assert (await delivery(db, "cfe-0"))["state"] == "sent"
+
+
+async def test_gives_up_after_max_attempts(db, transports, monkeypatch):
+    monkeypatch.setattr(notifications, "NOTIFY_MAX_ATTEMPTS", 3)
+    await enqueue(db, 1)
+    transports["whatsapp"].fail_next = 10
+    for _ in range(3):
+        await dispatch_once(db, transports)
+    whatsapp = await delivery(db, "cfe-0")
+    assert (whatsapp["state"], whatsapp["attempts"]) == ("failed", 3)
+    assert await dispatch_once(db, transports) == {}
+    assert transports["whatsapp"].fail_next == 7
+
+
+async def test_retry_waits_for_backoff(db, transports, monkeypatch):
+    monkeypatch.setattr(notifications, "backoff", lambda attempts: 600)
+    await enqueue(db, 1)
+    transports["whatsapp"].fail_next = 1
+    await dispatch_once(db, transports)
+    whatsapp = await delivery(db, "cfe-0")
+    assert whatsapp["next_attempt_at"] > datetime.utcnow() + timedelta(seconds=500)
+    assert await dispatch_once(db, transports) == {}
+
+
+def test_backoff_is_jittered_and_capped():
+    for attempts in range(1, 30):
+        assert 0 <= backoff(attempts) <= min(NOTIFY_BACKOFF_MAX, NOTIFY_BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+async def test_expired_claim_is_reclaimed(db, transports):
+    await enqueue(db, 2)
+    # A dispatcher that claimed the batch and died before delivering
+    abandoned = await claim_batch(db, "whatsapp", 10)
+    assert len(abandoned) == 2
+    assert await dispatch_once(db, {"whatsapp": transports["whatsapp"]}) == {}
+
+    await db.notification_outbox.update_many(
+        {}, {"$set": {"deliveries.whatsapp.claim_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert await dispatch_once(db, {"whatsapp": transports["whatsapp"]}) == {"whatsapp": 2}
+    assert (await delivery(db, "cfe-1"))["state"] == "sent"
+
+
+async def test_stale_claim_cannot_overwrite_new_claim(db, transports):
+    await enqueue(db, 1)
+    stale = await claim_batch(db, "whatsapp", 10)
+    await db.notification_outbox.update_many(
+        {}, {"$set": {"deliveries.whatsapp.claim_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    fresh = await claim_batch(db, "whatsapp", 10)
+    assert fresh[0]["deliveries"]["whatsapp"]["claim"] != stale[0]["deliveries"]["whatsapp"]["claim"]
+
+    # The first dispatcher wakes up late: its updates no longer match anything
+    await deliver_batch(db, "whatsapp", transports["whatsapp"], stale)
+    assert (await delivery(db, "cfe-0"))["state"] == "sending"
+    await deliver_batch(db, "whatsapp", transports["whatsapp"], fresh)
+    assert (await delivery(db, "cfe-0"))["state"] == "sent"
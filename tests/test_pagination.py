@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from pagination import ListFilters, PageParams, decode_cursor, encode_cursor, fetch_page
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 1, 1)
+
+
+class Item(BaseModel):
+    id: str
+    timestamp: datetime
+    status: str = "pending"
+
+
+def page(limit=2, after=None, order="asc"):
+    return PageParams(limit=limit, after=after, format="json", order=order, fields=None)
+
+
+def filters(status=None):
+    return ListFilters(status=status, since=None, until=None, curp=None, phone=None,
+                       service_number=None, assignee=None)
+
+
+async def seed(db):
+    # Pairs share a timestamp so the id tie-breaker is exercised on every page boundary
+    docs = [{"id": f"{i:02d}", "timestamp": START + timedelta(minutes=i // 2),
+             "status": "completed" if i % 3 == 0 else "pending"} for i in range(9)]
+    await db.items.insert_many([dict(doc) for doc in docs])
+    return docs
+
+
+async def walk(db, params, list_filters=None):
+    seen, after = [], None
+    while True:
+        params.after = after
+        docs, after = await fetch_page(db.items, Item, params, list_filters)
+        seen.extend(doc["id"] for doc in docs)
+        if after is None:
+            return seen
+
+
+async def test_pages_cover_every_document_once_in_order(db):
+    docs = await seed(db)
+    assert await walk(db, page(limit=2)) == [doc["id"] for doc in docs]
+
+
+async def test_descending_pages(db):
+    docs = await seed(db)
+    assert await walk(db, page(limit=4, order="desc")) == [doc["id"] for doc in reversed(docs)]
+
+
+async def test_last_full_page_has_no_cursor(db):
+    await seed(db)
+    docs, cursor = await fetch_page(db.items, Item, page(limit=9))
+    assert len(docs) == 9
+    assert cursor is None
+
+
+async def test_filters_combine_with_cursor(db):
+    docs = await seed(db)
+    expected = [doc["id"] for doc in docs if doc["status"] == "pending"]
+    assert await walk(db, page(limit=2), filters(status="pending")) == expected
+
+
+async def test_cursor_round_trip():
+    cursor = encode_cursor({"id": "abc", "timestamp": START})
+    assert decode_cursor(cursor) == (START, "abc")
+
+
+async def test_malformed_cursor_is_400(db):
+    with pytest.raises(HTTPException) as error:
+        await fetch_page(db.items, Item, page(after="not-a-cursor"))
+    assert error.value.status_code == 400
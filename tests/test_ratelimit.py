@@ -0,0 +1,144 @@
+import httpx
+import pytest
+from pymongo.errors import AutoReconnect
+
+import ratelimit
+from ratelimit import Limit, MemoryBuckets, MongoBuckets, RateLimiter, RateLimitMiddleware, route_group
+
+pytestmark = pytest.mark.anyio
+
+LIMIT = Limit(rate=0.5, burst=3)
+
+
+class Clock:
+    def __init__(self, start: float = 1_700_000_000.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    monotonic = time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+class Down:
+    name = "rate_limits"
+
+    async def update_one(self, *args, **kwargs):
+        raise AutoReconnect("no primary")
+
+
+def test_limit_parse():
+    assert Limit.parse("0.5/10") == Limit(0.5, 10)
+    assert Limit.parse("OFF") is None
+
+
+@pytest.mark.parametrize("method, path, group", [
+    ("GET", "/api/", "guides"),
+    ("GET", "/api/cfe/guide", "guides"),
+    ("GET", "/api/cfe", "admin"),
+    ("POST", "/api/queue/claim", "admin"),
+    ("POST", "/api/cfdi/verify/batch", "cfdi"),
+    ("POST", "/api/cfe", "submissions"),
+    ("OPTIONS", "/api/cfe", None),
+    ("GET", "/metrics", None),
+])
+def test_route_group(method, path, group):
+    assert route_group(method, path) == group
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def buckets(request, db):
+    return MemoryBuckets() if request.param == "memory" else MongoBuckets(db.rate_limits)
+
+
+async def test_burst_then_one_request_per_interval(buckets, clock):
+    assert [await buckets.take("ip", LIMIT) for _ in range(LIMIT.burst)] == [0.0] * LIMIT.burst
+    assert await buckets.take("ip", LIMIT) == pytest.approx(2.0)
+    clock.now += 1
+    assert await buckets.take("ip", LIMIT) == pytest.approx(1.0)
+    clock.now += 1
+    assert await buckets.take("ip", LIMIT) == 0.0
+    assert await buckets.take("ip", LIMIT) > 0
+
+
+async def test_idle_bucket_refills_only_to_burst(buckets, clock):
+    for _ in range(LIMIT.burst):
+        await buckets.take("ip", LIMIT)
+    clock.now += 3600
+    allowed = [await buckets.take("ip", LIMIT) == 0.0 for _ in range(LIMIT.burst + 1)]
+    assert allowed == [True] * LIMIT.burst + [False]
+
+
+async def test_keys_are_independent(buckets, clock):
+    for _ in range(LIMIT.burst):
+        await buckets.take("a", LIMIT)
+    assert await buckets.take("a", LIMIT) > 0
+    assert await buckets.take("b", LIMIT) == 0.0
+
+
+async def test_mongo_buckets_share_state_between_workers(db, clock):
+    first, second = MongoBuckets(db.rate_limits), MongoBuckets(db.rate_limits)
+    for buckets in (first, second, first):
+        assert await buckets.take("ip", LIMIT) == 0.0
+    assert await second.take("ip", LIMIT) > 0
+
+
+async def test_mongo_outage_allows_requests(clock):
+    assert await MongoBuckets(Down()).take("ip", LIMIT) == 0.0
+
+
+async def test_memory_buckets_evict_least_recently_used(clock):
+    buckets = MemoryBuckets(max_keys=2)
+    for _ in range(LIMIT.burst):
+        await buckets.take("a", LIMIT)
+    await buckets.take("b", LIMIT)
+    await buckets.take("c", LIMIT)
+    # "a" was evicted, so it starts again with a full bucket
+    assert await buckets.take("a", LIMIT) == 0.0
+
+
+def scope(forwarded=(), client=("10.0.0.9", 5000)):
+    return {"headers": [(b"x-forwarded-for", value.encode()) for value in forwarded], "client": client}
+
+
+def test_client_ip_without_proxies_ignores_forwarded_header():
+    assert RateLimiter({}, 10, proxy_hops=0).client_ip(scope(["1.1.1.1"])) == "10.0.0.9"
+
+
+@pytest.mark.parametrize("hops, forwarded, ip", [
+    (1, ["6.6.6.6, 203.0.113.7"], "203.0.113.7"),
+    (2, ["6.6.6.6, 203.0.113.7, 10.0.0.2"], "203.0.113.7"),
+    (2, ["6.6.6.6", "203.0.113.7, 10.0.0.2"], "203.0.113.7"),
+    # Fewer entries than trusted hops: the leftmost is the best we have
+    (3, ["203.0.113.7, 10.0.0.2"], "203.0.113.7"),
+])
+def test_client_ip_counts_trusted_hops_from_the_right(hops, forwarded, ip):
+    assert RateLimiter({}, 10, proxy_hops=hops).client_ip(scope(forwarded)) == ip
+
+
+def test_client_ip_falls_back_to_the_socket_peer():
+    limiter = RateLimiter({}, 10, proxy_hops=1)
+    assert limiter.client_ip(scope()) == "10.0.0.9"
+    assert limiter.client_ip(scope(client=None)) == "unknown"
+
+
+async def test_middleware_answers_429_with_retry_after(clock):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    limiter = RateLimiter({"submissions": Limit(rate=0.25, burst=1)}, max_in_flight=10)
+    transport = httpx.ASGITransport(app=RateLimitMiddleware(app, limiter))
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        assert (await client.post("/api/cfe")).status_code == 200
+        limited = await client.post("/api/cfe")
+        assert limited.status_code == 429 and limited.headers["retry-after"] == "4"
+        # Other groups have their own budget (none configured here)
+        assert (await client.get("/api/cfe")).status_code == 200
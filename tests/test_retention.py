@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from retention import (TELEMETRY_HOT_DAYS, TelemetryQuery, acquire_archive_lock, archive_collection,
+                       archive_day, day_start, query_telemetry, unpack)
+
+pytestmark = pytest.mark.anyio
+
+TODAY = day_start(datetime.utcnow())
+OLD = TODAY - timedelta(days=TELEMETRY_HOT_DAYS + 5)
+
+
+def checks(day: datetime, count: int, client: str = "web", first: int = 0):
+    # Millisecond timestamps: BSON drops anything finer
+    return [{"id": f"s{day:%m%d}-{i:03d}", "client_name": client,
+             "timestamp": day + timedelta(minutes=i, milliseconds=123)} for i in range(first, first + count)]
+
+
+def query(**kwargs) -> TelemetryQuery:
+    params = {"collection": "status_checks", "since": OLD - timedelta(days=2), "until": None}
+    params.update(kwargs)
+    return TelemetryQuery(**params)
+
+
+def counts(result: dict) -> dict:
+    return {(point["day"], group["value"]): group["count"]
+            for point in result["series"] for group in point["groups"]}
+
+
+async def test_archive_day_moves_documents_into_chunks(db):
+    docs = checks(OLD, 5) + checks(OLD + timedelta(days=1), 2)
+    await db.status_checks.insert_many([dict(doc) for doc in docs])
+
+    assert await archive_day(db, "status_checks", OLD, batch_size=2) == 5
+    assert await db.status_checks.count_documents({}) == 2
+    chunks = await db.status_checks_archive.find({}).sort("_id", 1).to_list(None)
+    assert [chunk["count"] for chunk in chunks] == [2, 2, 1]
+    assert [doc for chunk in chunks for doc in unpack(chunk["payload"])] == docs[:5]
+
+
+async def test_interrupted_archive_only_finishes_the_delete(db):
+    docs = checks(OLD, 3)
+    await db.status_checks.insert_many([dict(doc) for doc in docs])
+    await archive_day(db, "status_checks", OLD)
+    # As if the previous run had crashed after writing the chunk
+    await db.status_checks.insert_many([dict(doc) for doc in docs])
+
+    assert await archive_day(db, "status_checks", OLD) == 3
+    assert await db.status_checks.count_documents({}) == 0
+    assert await db.status_checks_archive.count_documents({}) == 1
+
+
+async def test_archive_collection_keeps_hot_days_and_moves_the_watermark(db):
+    await db.status_checks.insert_many(checks(OLD, 3) + checks(OLD, 1, client="app", first=3)
+                                       + checks(TODAY, 2))
+    assert await archive_collection(db, "status_checks") == 4
+    assert await db.status_checks.count_documents({}) == 2
+
+    summary = await db.telemetry_daily.find_one({"_id": f"status_checks:{OLD:%Y-%m-%d}"})
+    assert summary["count"] == 4
+    assert {group["value"]: group["count"] for group in summary["groups"]} == {"web": 3, "app": 1}
+    state = await db.retention_state.find_one({"_id": "watermark:status_checks"})
+    assert state["archived_before"] == OLD + timedelta(days=1)
+
+
+async def test_query_is_the_same_before_during_and_after_archiving(db):
+    await db.status_checks.insert_many(checks(OLD, 3) + checks(OLD + timedelta(days=1), 2, client="app")
+                                       + checks(TODAY, 1))
+    expected = {(OLD, "web"): 3, (OLD + timedelta(days=1), "app"): 2, (TODAY, "web"): 1}
+    assert counts(await query_telemetry(db, query())) == expected
+
+    # Chunks written but no summary or watermark yet
+    await archive_day(db, "status_checks", OLD)
+    assert counts(await query_telemetry(db, query())) == expected
+
+    await archive_collection(db, "status_checks")
+    result = await query_telemetry(db, query())
+    assert counts(result) == expected
+    assert result["archived_before"] == OLD + timedelta(days=2)
+
+
+async def test_archive_lock_is_held_by_one_worker(db):
+    assert await acquire_archive_lock(db, 60)
+    assert not await acquire_archive_lock(db, 60)
+
+
+def test_timezone_aware_range_is_normalized_to_utc():
+    offset = timezone(timedelta(hours=-6))
+    parsed = query(since=datetime(2024, 1, 1, 20, 0, tzinfo=offset), until=datetime(2024, 1, 3, 0, 0, tzinfo=offset))
+    assert (parsed.since, parsed.until) == (datetime(2024, 1, 2), datetime(2024, 1, 3, 6, 0))
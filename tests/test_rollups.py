@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import rollups
+from rollups import TimeseriesQuery, hour_start, query_timeseries, refresh_rollups
+from work_queue import ClaimRequest, VolunteerAction, claim_next, complete_case
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def roll_without_merge(monkeypatch):
+    # mongomock has no $merge; same pipeline, results written back by _id
+    async def roll_service(db, service, start, end):
+        await db.rollups_hourly.delete_many({"service": service, "hour": {"$gte": start, "$lt": end}})
+        collection = db[rollups.SERVICE_COLLECTIONS[service]]
+        async for row in collection.aggregate(rollups.hourly_pipeline(service, start, end)):
+            await db.rollups_hourly.replace_one({"_id": row["_id"]}, row, upsert=True)
+
+    monkeypatch.setattr(rollups, "roll_service", roll_service)
+
+
+def query(**kwargs):
+    params = {"granularity": "day", "since": None, "until": None, "service": None, "group_by": None}
+    params.update(kwargs)
+    return TimeseriesQuery(**params)
+
+
+async def status_counts(db, since):
+    result = await query_timeseries(db, query(since=since, service=["fiscal"], group_by="status"))
+    return {point["status"]: point["count"] for point in result["series"]}
+
+
+async def test_refresh_counts_requests_per_hour(db):
+    now = datetime.utcnow()
+    await db.cfe_requests.insert_many([
+        {"id": f"c{i}", "status": "pending", "timestamp": now - timedelta(hours=2), "donation_amount": 10,
+         "is_first_time": i == 0} for i in range(3)])
+    await refresh_rollups(db)
+    result = await query_timeseries(db, query(granularity="hour", since=now - timedelta(hours=5), service=["cfe"]))
+    assert [(point["bucket"], point["count"], point["donation_sum"], point["first_time"], point["repeat"])
+            for point in result["series"]] == [(hour_start(now - timedelta(hours=2)), 3, 30, 1, 2)]
+
+
+async def test_status_change_outside_the_late_window_moves_the_bucket(db):
+    created = datetime.utcnow() - timedelta(days=3)
+    await db.fiscal_requests.insert_many([{"id": f"f{i}", "status": "pending", "timestamp": created}
+                                          for i in range(2)])
+    await refresh_rollups(db)
+    assert await status_counts(db, created - timedelta(days=1)) == {"pending": 2}
+
+    claimed = await claim_next(db, ClaimRequest(volunteer="ana", services=["fiscal"]))
+    await complete_case(db, "fiscal", claimed.request_id, VolunteerAction(volunteer="ana"))
+    await refresh_rollups(db)
+    assert await status_counts(db, created - timedelta(days=1)) == {"pending": 1, "completed": 1}
+
+
+async def test_unchanged_old_hours_are_not_rebuilt(db, monkeypatch):
+    created = datetime.utcnow() - timedelta(days=3)
+    await db.fiscal_requests.insert_one({"id": "f1", "status": "pending", "timestamp": created})
+    await refresh_rollups(db)
+    windows = []
+    rolled = rollups.roll_service
+
+    async def record(db, service, start, end):
+        windows.append(start)
+        await rolled(db, service, start, end)
+
+    monkeypatch.setattr(rollups, "roll_service", record)
+    await refresh_rollups(db)
+    assert all(start >= hour_start(datetime.utcnow()) - timedelta(hours=rollups.ROLLUP_LATE_HOURS)
+               for start in windows)
+
+
+def test_timezone_aware_range_is_normalized_to_utc():
+    offset = timezone(timedelta(hours=-6))
+    parsed = query(since=datetime(2024, 1, 1, 0, 0, tzinfo=offset), until=datetime(2024, 1, 2, 0, 0, tzinfo=offset))
+    assert (parsed.since, parsed.until) == (datetime(2024, 1, 1, 6, 0), datetime(2024, 1, 2, 6, 0))
@@ -0,0 +1,19 @@
+import signal
+
+import uvicorn
+
+from runtime import DrainingServer, RequestDrain
+
+
+def test_stop_signal_flags_the_drain_before_uvicorn_exits():
+    drain = RequestDrain()
+    server = DrainingServer(uvicorn.Config(app=None))
+    server.handle_exit(signal.SIGTERM, None)
+    assert drain.draining and server.should_exit
+
+
+def test_second_sigint_still_forces_exit():
+    server = DrainingServer(uvicorn.Config(app=None))
+    server.handle_exit(signal.SIGINT, None)
+    server.handle_exit(signal.SIGINT, None)
+    assert server.force_exit
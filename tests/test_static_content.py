@@ -0,0 +1,59 @@
+import gzip
+import json
+
+import pytest
+from starlette.requests import Request
+
+from static_content import StaticPayload
+
+PAYLOAD = {"servicios": ["cfe", "imss"], "mensaje": "Atención gratuita"}
+
+
+def request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_identity_body_and_headers():
+    response = StaticPayload(PAYLOAD).response(request())
+    assert json.loads(response.body) == PAYLOAD
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_gzip_has_its_own_etag():
+    static = StaticPayload(PAYLOAD)
+    plain = static.response(request())
+    zipped = static.response(request(accept_encoding="gzip, deflate"))
+    assert gzip.decompress(zipped.body) == plain.body
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+
+def test_brotli_is_preferred_when_available():
+    pytest.importorskip("brotli")
+    response = StaticPayload(PAYLOAD).response(request(accept_encoding="gzip, br"))
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"].endswith('-br"')
+
+
+def test_refused_encoding_falls_back_to_identity():
+    response = StaticPayload(PAYLOAD).response(request(accept_encoding="gzip;q=0"))
+    assert "content-encoding" not in response.headers
+
+
+def test_revalidation_matches_only_the_same_encoding():
+    static = StaticPayload(PAYLOAD)
+    etag = static.response(request(accept_encoding="gzip")).headers["etag"]
+    assert static.response(request(accept_encoding="gzip", if_none_match=etag)).status_code == 304
+    assert static.response(request(accept_encoding="gzip", if_none_match=f"W/{etag}")).status_code == 304
+    # Same ETag from a client that now wants the identity body: send it
+    assert static.response(request(if_none_match=etag)).status_code == 200
+
+
+def test_revalidation_accepts_lists_and_wildcard():
+    static = StaticPayload(PAYLOAD)
+    etag = static.response(request()).headers["etag"]
+    assert static.response(request(if_none_match=f'"stale", {etag}')).status_code == 304
+    assert static.response(request(if_none_match="*")).status_code == 304
+    assert static.response(request(if_none_match='"stale"')).status_code == 200
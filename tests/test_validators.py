@@ -0,0 +1,48 @@
+import pytest
+
+from validators import FieldFormatError, curp_check_digit, validate_curp
+
+# RENAPO's published example CURP
+KNOWN_VALID = "HEGG560427MVZRRL04"
+
+
+def with_check_digit(first17: str) -> str:
+    return first17 + str(curp_check_digit(first17))
+
+
+def test_known_valid_curp():
+    assert validate_curp(KNOWN_VALID) == KNOWN_VALID
+
+
+def test_curp_is_normalized():
+    assert validate_curp(f"  {KNOWN_VALID.lower()} ") == KNOWN_VALID
+
+
+def test_check_digit_matches_published_curp():
+    assert curp_check_digit(KNOWN_VALID) == 4
+
+
+@pytest.mark.parametrize("digit", [d for d in "0123456789" if d != "4"])
+def test_wrong_check_digit_is_rejected(digit):
+    with pytest.raises(FieldFormatError):
+        validate_curp(KNOWN_VALID[:17] + digit)
+
+
+@pytest.mark.parametrize("birth", ["560230", "561301", "560400", "560431"])
+def test_impossible_birth_date_is_rejected(birth):
+    # Correct check digit, so only the date can fail
+    with pytest.raises(FieldFormatError):
+        validate_curp(with_check_digit(f"HEGG{birth}MVZRRL0"))
+
+
+def test_century_comes_from_position_17():
+    # 29 Feb exists in 2000 (a letter at position 17) but not in 1900 (a digit)
+    assert validate_curp(with_check_digit("HEGG000229MVZRRLA"))
+    with pytest.raises(FieldFormatError):
+        validate_curp(with_check_digit("HEGG000229MVZRRL0"))
+
+
+@pytest.mark.parametrize("value", ["", "HEGG560427MVZRRL0", "HEGG560427XVZRRL04", "1EGG560427MVZRRL04"])
+def test_malformed_curp_is_rejected(value):
+    with pytest.raises(FieldFormatError):
+        validate_curp(value)
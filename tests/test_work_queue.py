@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from work_queue import (ClaimRequest, LeaseRequest, VolunteerAction, claim_next, complete_case, renew_lease,
+                        sweep_expired_leases)
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 1, 1)
+
+
+async def seed(db):
+    await db.cfe_requests.insert_many([
+        {"id": "cfe-1", "status": "pending", "timestamp": START + timedelta(minutes=2)},
+        {"id": "cfe-2", "status": "pending", "timestamp": START + timedelta(minutes=3)},
+    ])
+    await db.fiscal_requests.insert_one({"id": "fiscal-1", "status": "pending", "timestamp": START})
+
+
+async def test_claims_oldest_case_across_services(db):
+    await seed(db)
+    first = await claim_next(db, ClaimRequest(volunteer="ana"))
+    second = await claim_next(db, ClaimRequest(volunteer="luis"))
+    assert (first.service, first.request_id) == ("fiscal", "fiscal-1")
+    assert (second.service, second.request_id) == ("cfe", "cfe-1")
+    doc = await db.fiscal_requests.find_one({"id": "fiscal-1"})
+    assert (doc["status"], doc["assignee"]) == ("in_progress", "ana")
+
+
+async def test_claim_limited_to_services(db):
+    await seed(db)
+    claimed = await claim_next(db, ClaimRequest(volunteer="ana", services=["cfe"]))
+    assert claimed.request_id == "cfe-1"
+
+
+async def test_empty_queue_returns_none(db):
+    assert await claim_next(db, ClaimRequest(volunteer="ana")) is None
+
+
+async def test_holder_renews_lease(db):
+    await seed(db)
+    claimed = await claim_next(db, ClaimRequest(volunteer="ana", lease_seconds=60))
+    lease = await renew_lease(db, claimed.service, claimed.request_id,
+                              LeaseRequest(volunteer="ana", lease_seconds=600))
+    assert lease.lease_expires_at > claimed.lease_expires_at
+    doc = await db.fiscal_requests.find_one({"id": claimed.request_id})
+    assert doc["lease_expires_at"] > claimed.lease_expires_at
+
+
+async def test_only_holder_renews_or_completes(db):
+    await seed(db)
+    claimed = await claim_next(db, ClaimRequest(volunteer="ana"))
+    with pytest.raises(HTTPException) as error:
+        await renew_lease(db, claimed.service, claimed.request_id, LeaseRequest(volunteer="luis"))
+    assert error.value.status_code == 409
+    with pytest.raises(HTTPException):
+        await complete_case(db, claimed.service, claimed.request_id, VolunteerAction(volunteer="luis"))
+
+
+async def test_sweep_returns_expired_leases_to_queue(db):
+    await seed(db)
+    expired = await claim_next(db, ClaimRequest(volunteer="ana"))
+    live = await claim_next(db, ClaimRequest(volunteer="luis"))
+    await db.fiscal_requests.update_one({"id": expired.request_id},
+                                        {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    assert await sweep_expired_leases(db) == {"fiscal": 1}
+    doc = await db.fiscal_requests.find_one({"id": expired.request_id})
+    assert doc["status"] == "pending"
+    assert "assignee" not in doc and "lease_expires_at" not in doc
+    assert (await db.cfe_requests.find_one({"id": live.request_id}))["status"] == "in_progress"
+
+    # The abandoned case keeps its timestamp, so it is first in line again
+    reclaimed = await claim_next(db, ClaimRequest(volunteer="maria"))
+    assert reclaimed.request_id == expired.request_id
+
+
+async def test_expired_holder_cannot_complete(db):
+    await seed(db)
+    claimed = await claim_next(db, ClaimRequest(volunteer="ana"))
+    await db.fiscal_requests.update_one({"id": claimed.request_id},
+                                        {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    with pytest.raises(HTTPException) as error:
+        await complete_case(db, claimed.service, claimed.request_id, VolunteerAction(volunteer="ana"))
+    assert error.value.status_code == 409
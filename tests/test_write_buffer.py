@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from bson.errors import InvalidDocument
+from pymongo.errors import AutoReconnect
+
+from write_buffer import WriteBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+class Flaky:
+    """Collection stand-in that fails the first insert_many calls with the given errors."""
+
+    def __init__(self, collection, *errors):
+        self.collection = collection
+        self.name = collection.name
+        self.errors = list(errors)
+
+    async def insert_many(self, documents, ordered=True):
+        if self.errors:
+            raise self.errors.pop(0)
+        return await self.collection.insert_many(documents, ordered=ordered)
+
+
+async def fill(buffer: WriteBuffer, first: int, count: int):
+    for i in range(first, first + count):
+        await buffer.put({"_id": i})
+
+
+async def test_drain_writes_everything_in_batches(db):
+    buffer = WriteBuffer(db.events, max_batch=4, flush_interval=0.05)
+    buffer.start()
+    await fill(buffer, 0, 10)
+    await buffer.drain()
+    assert await db.events.count_documents({}) == 10
+    assert buffer.stats() == {"collection": "events", "pending": 0, "enqueued": 10, "written": 10,
+                              "dropped": 0, "batches": 3}
+
+
+async def test_duplicates_drop_only_the_bad_rows(db):
+    await db.events.insert_one({"_id": 1})
+    buffer = WriteBuffer(db.events, max_batch=10, flush_interval=0.05)
+    buffer.start()
+    await fill(buffer, 0, 3)
+    await buffer.drain()
+    assert (buffer.written, buffer.dropped) == (2, 1)
+
+
+async def test_transient_errors_are_retried(db):
+    buffer = WriteBuffer(Flaky(db.events, AutoReconnect("primary stepped down")), flush_interval=0.05)
+    buffer.start()
+    await fill(buffer, 0, 3)
+    await buffer.drain()
+    assert await db.events.count_documents({}) == 3
+    assert buffer.dropped == 0
+
+
+async def test_unexpected_error_drops_the_batch_and_keeps_writing(db):
+    buffer = WriteBuffer(Flaky(db.events, InvalidDocument("cannot encode object")),
+                         max_batch=2, flush_interval=0.05, max_pending=2)
+    buffer.start()
+    # More than max_pending: put() would block forever if the worker had died
+    await asyncio.wait_for(fill(buffer, 0, 6), timeout=2)
+    await buffer.drain()
+    assert (buffer.written, buffer.dropped) == (4, 2)
+    assert await db.events.count_documents({}) == 4
+
+
+async def test_put_after_drain_is_refused(db):
+    buffer = WriteBuffer(db.events, flush_interval=0.05)
+    buffer.start()
+    await buffer.drain()
+    with pytest.raises(RuntimeError):
+        await buffer.put({"_id": 1})